@@ -281,6 +281,51 @@ void* ShmemClient::get(int& index, int& size)
 ** --
 */
 
+int ShmemClient::get(void** bufs, int* indices, int& size, int max)
+{
+  int n = 0;
+  int timeout = -1;
+  size = 0;
+
+  while (n < max) {
+    int nfds = ::poll(_pfd, _nfd, timeout);
+    if (nfds == 0)  // nothing more ready
+      break;
+    if (nfds < 0) { // as get(), keep waiting for the first buffer
+      if (n)
+        break;
+      continue;
+    }
+    void* buf;
+    bool transition = false;
+    if (_pfd[0].revents & POLLIN) { // Transition
+      buf = _handler->transition(indices[n],size);
+      transition = true;
+    }
+    else if (_pfd[1].revents & POLLIN) { // Event
+      buf = _handler->event(indices[n],size);
+    }
+    else if (n)
+      break;
+    else
+      continue;
+    if (!buf)
+      break;
+    bufs[n++] = buf;
+    if (transition)
+      break;
+    timeout = 0;
+  }
+  return n;
+}
+
+/*
+** ++
+**
+**
+** --
+*/
+
 int ShmemClient::connect(const char* tag, int tr_index) {
   int error = 0;
   char* qname             = new char[128];
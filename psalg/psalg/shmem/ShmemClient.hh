@@ -27,6 +27,11 @@ namespace psalg {
       //
       int connect(const char* tag, int tr_index=0);
       void* get(int& index,int& size);
+      //
+      //  waits for a buffer, then returns up to max buffers that are ready
+      //  (stopping after a transition) and the number of buffers
+      //
+      int get(void** bufs, int* indices, int& size, int max);
       void free(int index, int size);
     
     private:
@@ -25,6 +25,11 @@ void* ShmemClient::get(int& index, int& size)
   return 0;
 }
 
+int ShmemClient::get(void** bufs, int* indices, int& size, int max)
+{
+  return 0;
+}
+
 int ShmemClient::connect(const char* tag, int tr_index)
 {
   return 1;
@@ -0,0 +1,322 @@
+"""
+psbench - synthetic xtc2 run generator and psana throughput benchmark
+
+Usage::
+
+    # generate run 1 of experiment xpptut15 with 4 streams in ./bench
+    psbench generate ./bench -n 4 --events 100000 --payload 4096 --step-every 10000 --epics-every 1000
+
+    # run serial, single-file and (if mpirun is available) MPI benchmarks,
+    # results are saved in ./bench-results/psbench-<time>.json
+    psbench run ./bench --modes serial singlefile mpi --ranks 6 --filter-ratio 0.5 -o ./bench-results
+
+    # compare two results, e.g. from a reference and a new build
+    psbench compare ./bench-results/psbench-ref.json ./bench-results/psbench-new.json
+
+Each benchmark runs in its own python process (psana selects serial/MPI mode
+at import time from PS_PARALLEL) and reports events/s, bytes/s and the time
+spent in each stage of the job:
+
+    datasource  - DataSource construction (file discovery, opening smd files)
+    configure   - getting the run (Configure and BeginRun transitions)
+    first_event - latency of the first event
+    events      - the whole event loop, including first_event and detector access
+    detector    - time spent in detector access in the event loop
+
+and the psana internal stages (smd_read, event_build, mpi_wait, bd_read, see
+psana.psexp.perf_stats), per rank for the mpi mode.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import subprocess
+import numpy as np
+
+EXP = 'xpptut15'
+RUN = 1
+DETNAME = 'benchcam'
+
+# subset of TransitionId.hh enum
+_configure, _beginrun, _endrun, _beginstep, _endstep, _enable, _disable, _slowupdate, _l1accept = \
+    2, 4, 5, 6, 7, 8, 9, 10, 12
+
+#----------
+
+def _names(dc, stream):
+    """Returns (nameinfo, alg) for detectors used in the synthetic streams."""
+    return {
+        # fakecam_raw_2_0_0 detector interface returns array_raw of segment 0
+        'det'    : (dc.nameinfo(DETNAME, 'fakecam', 'bench_%02d' % stream, 0), dc.alg('raw', [2,0,0])),
+        'runinfo': (dc.nameinfo('runinfo', 'runinfo', '', 1), dc.alg('runinfo', [0,0,1])),
+        'epics'  : (dc.nameinfo('epics', 'epics', '', 2), dc.alg('raw', [2,0,0])),
+        'scan'   : (dc.nameinfo('scan', 'scan', '', 3), dc.alg('raw', [2,0,0])),
+    }
+
+
+def write_stream(filename, stream, nevents, payload, step_every=0, epics_every=0):
+    """Writes one bigdata stream file. Stream 0 also carries epics (SlowUpdate)
+       and scan (BeginStep) data. Returns number of bytes written.
+    """
+    import dgramCreate as dc
+    names = _names(dc, stream)
+    cydgram = dc.CyDgram()
+    image = np.arange(max(payload, 1), dtype=np.uint8)
+    runinfo = {'expt': EXP, 'runnum': RUN}
+    epics = {'HX2:DVD:GCC:01:PMON': 41.0}
+    scan = {'motor1': 0.0}
+    with_env = stream == 0
+    ts = 0
+
+    def add(key, data):
+        cydgram.addDet(names[key][0], names[key][1], data)
+
+    def put(f, transition_id):
+        nonlocal ts
+        ts += 1
+        f.write(cydgram.get(ts, transition_id))
+
+    with open(filename, 'wb') as f:
+        # names of all detectors are declared in Configure
+        add('det', {'array_raw': image})
+        add('runinfo', runinfo)
+        if with_env:
+            add('epics', epics)
+            add('scan', scan)
+        put(f, _configure)
+        add('runinfo', runinfo)
+        put(f, _beginrun)
+
+        nsteps = 1 if step_every <= 0 else (nevents + step_every - 1) // step_every
+        ievt = 0
+        for istep in range(nsteps):
+            if with_env:
+                add('scan', {'motor1': float(istep)})
+            put(f, _beginstep)
+            put(f, _enable)
+            nstep_events = nevents - ievt if step_every <= 0 else min(step_every, nevents - ievt)
+            for _ in range(nstep_events):
+                if epics_every > 0 and ievt % epics_every == 0:
+                    # transitions are written to all streams to keep timestamps aligned
+                    if with_env: add('epics', epics)
+                    put(f, _slowupdate)
+                image[0] = ievt & 0xff
+                add('det', {'array_raw': image})
+                put(f, _l1accept)
+                ievt += 1
+            put(f, _disable)
+            put(f, _endstep)
+        put(f, _endrun)
+        return f.tell()
+
+
+def generate(xtc_dir, nfiles=2, nevents=1000, payload=1024, step_every=0, epics_every=0):
+    """Generates a multi-stream run in xtc_dir (bigdata) and xtc_dir/smalldata (smd, made by smdwriter).
+       All streams have the same timestamps, so every event is built from nfiles dgrams.
+       Returns dict of run parameters, which is saved in xtc_dir/psbench-run.json.
+    """
+    smd_dir = os.path.join(xtc_dir, 'smalldata')
+    os.makedirs(smd_dir, exist_ok=True)
+    nbytes = 0
+    for i in range(nfiles):
+        filename = os.path.join(xtc_dir, 'data-r%04d-s%02d.xtc2' % (RUN, i))
+        smd_filename = os.path.join(smd_dir, 'data-r%04d-s%02d.smd.xtc2' % (RUN, i))
+        nbytes += write_stream(filename, i, nevents, payload, step_every, epics_every)
+        subprocess.check_call(['smdwriter', '-f', filename, '-o', smd_filename])
+    pars = {'nfiles': nfiles, 'nevents': nevents, 'payload': payload, 'step_every': step_every,
+            'epics_every': epics_every, 'bigdata_bytes': nbytes}
+    with open(os.path.join(xtc_dir, 'psbench-run.json'), 'w') as f:
+        json.dump(pars, f, indent=2)
+    return pars
+
+#----------
+
+def _worker(xtc_dir, mode, filter_ratio=1.0, batch_size=1, max_events=0):
+    """Runs the event loop in this process and returns dict of measured times and counts.
+       For mpi mode counts are summed over ranks and returned on rank 0 only.
+    """
+    t0 = time.monotonic()
+    from psana import DataSource
+    kwargs = {'batch_size': batch_size, 'max_events': max_events}
+    if filter_ratio < 1.0:
+        # deterministic selection of a fraction of events by timestamp
+        period = 1000
+        accepted = int(round(filter_ratio * period))
+        kwargs['filter'] = lambda evt: evt.timestamp % period < accepted
+    if mode == 'singlefile':
+        ds = DataSource(files=os.path.join(xtc_dir, 'data-r%04d-s00.xtc2' % RUN), **kwargs)
+    else:
+        ds = DataSource(exp=EXP, run=RUN, dir=xtc_dir, **kwargs)
+    times = {'datasource': time.monotonic() - t0}
+
+    t1 = time.monotonic()
+    nevents, nbytes = 0, 0
+    t_configure, t_first, t_loop, t_det = 0.0, 0.0, 0.0, 0.0
+    for run in ds.runs():
+        t_configure += time.monotonic() - t1
+        t_start = time.monotonic()
+        det = run.Detector(DETNAME)
+        for evt in run.events():
+            if nevents == 0:
+                t_first = time.monotonic() - t_start
+            td = time.monotonic()
+            det.raw.raw(evt)
+            t_det += time.monotonic() - td
+            nbytes += sum(d._size for d in evt._dgrams if d)
+            nevents += 1
+        t_loop += time.monotonic() - t_start
+        t1 = time.monotonic()
+    times.update({'configure': t_configure, 'first_event': t_first, 'events': t_loop, 'detector': t_det})
+    times['total'] = time.monotonic() - t0
+    from psana.psexp.perf_stats import perf
+    stages = perf.summary()
+
+    if mode == 'mpi':
+        from mpi4py import MPI
+        comm = MPI.COMM_WORLD
+        nevents = comm.reduce(nevents, op=MPI.SUM, root=0)
+        nbytes = comm.reduce(nbytes, op=MPI.SUM, root=0)
+        times = {k: comm.reduce(v, op=MPI.MAX, root=0) for k, v in times.items()}
+        stages = comm.gather(stages, root=0)
+        if comm.Get_rank() != 0: return None
+        times['ranks'] = comm.Get_size()
+
+    times.update({'nevents': nevents, 'nbytes': nbytes, 'stages': stages})
+    return times
+
+
+def run_benchmark(xtc_dir, mode, filter_ratio=1.0, batch_size=1, max_events=0, ranks=4, mpirun='mpirun'):
+    """Runs one benchmark in a separate process and returns dict of results,
+       or None if the mode is not available (e.g. no mpirun).
+    """
+    env = dict(os.environ)
+    cmd = [sys.executable, '-m', 'psana.app.psbench', '_worker', xtc_dir, mode,
+           '--filter-ratio', str(filter_ratio), '--batch-size', str(batch_size), '--max-events', str(max_events)]
+    if mode == 'mpi':
+        if shutil.which(mpirun) is None:
+            return None
+        cmd = [mpirun, '-n', str(ranks)] + cmd
+        env['PS_PARALLEL'] = 'mpi'
+    else:
+        # serial and singlefile modes should not initialize MPI
+        env['PS_PARALLEL'] = 'none'
+    out = subprocess.check_output(cmd, env=env).decode()
+    res = json.loads(out.strip().splitlines()[-1])
+    t = res['events']
+    res['events_per_sec'] = res['nevents']/t if t > 0 else 0.0
+    res['bytes_per_sec'] = res['nbytes']/t if t > 0 else 0.0
+    res.update({'mode': mode, 'filter_ratio': filter_ratio, 'batch_size': batch_size})
+    return res
+
+
+def run_suite(xtc_dir, modes=('serial', 'singlefile'), filter_ratios=(1.0,), batch_size=1,
+              max_events=0, ranks=4, repeat=1):
+    """Runs benchmarks for all modes and filter ratios and returns dict ready to be saved as json."""
+    run_pars = {}
+    pars_file = os.path.join(xtc_dir, 'psbench-run.json')
+    if os.path.exists(pars_file):
+        with open(pars_file) as f: run_pars = json.load(f)
+    results = []
+    for mode in modes:
+        for ratio in filter_ratios:
+            for _ in range(repeat):
+                res = run_benchmark(xtc_dir, mode, ratio, batch_size, max_events, ranks)
+                if res is None:
+                    print('psbench: mode %s is not available, skipped' % mode, file=sys.stderr)
+                    break
+                results.append(res)
+                print('%-10s filter=%.2f events=%8d  %10.1f evt/s  %8.2f MB/s' % \
+                      (mode, ratio, res['nevents'], res['events_per_sec'], res['bytes_per_sec']/1e6))
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'host': socket.gethostname(),
+            'xtc_dir': os.path.abspath(xtc_dir), 'run': run_pars, 'results': results}
+
+
+def compare(fname_ref, fname_new, threshold=0.1):
+    """Prints events/s of matching benchmarks in two result files.
+       Returns list of (mode, filter_ratio, ratio) for benchmarks slower by more than threshold.
+    """
+    def load(fname):
+        with open(fname) as f: d = json.load(f)
+        return {(r['mode'], r['filter_ratio'], r['batch_size']): r for r in d['results']}
+    ref, new = load(fname_ref), load(fname_new)
+    regressions = []
+    for key in sorted(set(ref) & set(new)):
+        r, n = ref[key]['events_per_sec'], new[key]['events_per_sec']
+        ratio = n/r if r > 0 else float('inf')
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(key[:2] + (ratio,))
+            flag = '  REGRESSION'
+        print('%-10s filter=%.2f batch=%-4d %10.1f -> %10.1f evt/s (x%.2f)%s' % (key + (r, n, ratio, flag)))
+    return regressions
+
+#----------
+
+def main():
+    parser = argparse.ArgumentParser(description='psana throughput benchmark')
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('generate', help='generate synthetic run')
+    p.add_argument('xtc_dir')
+    p.add_argument('-n', '--nfiles', type=int, default=2, help='number of bigdata/smd streams')
+    p.add_argument('--events', type=int, default=1000, help='number of L1Accept events')
+    p.add_argument('--payload', type=int, default=1024, help='detector payload per event per stream (bytes)')
+    p.add_argument('--step-every', type=int, default=0, help='events per step, 0 - single step')
+    p.add_argument('--epics-every', type=int, default=0, help='events between epics SlowUpdates, 0 - none')
+
+    p = sub.add_parser('run', help='run benchmarks')
+    p.add_argument('xtc_dir')
+    p.add_argument('--modes', nargs='+', default=['serial', 'singlefile'], choices=['serial', 'singlefile', 'mpi'])
+    p.add_argument('--filter-ratio', nargs='+', type=float, default=[1.0], help='fraction(s) of accepted events')
+    p.add_argument('--batch-size', type=int, default=1)
+    p.add_argument('--max-events', type=int, default=0)
+    p.add_argument('--ranks', type=int, default=4, help='number of MPI ranks for mpi mode')
+    p.add_argument('--repeat', type=int, default=1)
+    p.add_argument('-o', '--outdir', default=None, help='directory for psbench-<time>.json result file')
+
+    p = sub.add_parser('compare', help='compare two result files')
+    p.add_argument('ref')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as regression')
+
+    p = sub.add_parser('_worker')
+    p.add_argument('xtc_dir')
+    p.add_argument('mode')
+    p.add_argument('--filter-ratio', type=float, default=1.0)
+    p.add_argument('--batch-size', type=int, default=1)
+    p.add_argument('--max-events', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        print(json.dumps(generate(args.xtc_dir, args.nfiles, args.events, args.payload,
+                                  args.step_every, args.epics_every), indent=2))
+
+    elif args.command == 'run':
+        summary = run_suite(args.xtc_dir, args.modes, args.filter_ratio, args.batch_size,
+                            args.max_events, args.ranks, args.repeat)
+        if args.outdir is not None:
+            os.makedirs(args.outdir, exist_ok=True)
+            fname = os.path.join(args.outdir, 'psbench-%s.json' % time.strftime('%Y%m%dT%H%M%S'))
+            with open(fname, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print('psbench: results saved in %s' % fname)
+
+    elif args.command == 'compare':
+        if compare(args.ref, args.new, args.threshold):
+            sys.exit(1)
+
+    elif args.command == '_worker':
+        res = _worker(args.xtc_dir, args.mode, args.filter_ratio, args.batch_size, args.max_events)
+        if res is not None:
+            print(json.dumps(res))
+
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
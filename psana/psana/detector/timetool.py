@@ -35,7 +35,7 @@ class ttdet_ttalg_0_0_1(DetectorImpl):
     
     def parsed_frame(self,evt):
         pFrame = timeToolParser()
-        p = self._segments(evt)[0].data.tobytes()
+        p = self._segments(evt)[0].data
         pFrame._parseData(p)
 
         return pFrame
@@ -48,12 +48,39 @@ class ttdet_ttalg_0_0_1(DetectorImpl):
     #def edge_uncertainty(self,evt):        #needs _(underscore) to hide things AMI doesn't need to see.
     #
 
+_FOOTER_WIDTH = 16
+
+def _frame_layout(view, header_width):
+    """ Walks the AXI-stream frame footers of view (memoryview of bytes) once
+    from the end and returns a list of (start, end, tdest) of frames in reverse order.
+    """
+    nbytes = len(view)
+    layout = []
+    end = nbytes - _FOOTER_WIDTH
+    parsed_size = 0
+    while True:
+        size = view[end] | (view[end+1] << 8)
+        start = end - size
+        layout.append((start, end, view[end+4]))
+        parsed_size += size
+        if nbytes < parsed_size + (len(layout)+2)*header_width: break
+        end = start - _FOOTER_WIDTH
+
+    return layout
+
+def _first_index(tdest):
+    """ Returns dict {tdest: index of the first frame with this tdest} in one pass."""
+    d = {}
+    for i,t in enumerate(tdest):
+        if t not in d: d[t] = i
+    return d
+
 class eventBuilderParser():
-    def __init__(self):        
+    def __init__(self):
         return
 
     def _frames_to_position(self,frame_bytearray,position):
-        return int('0b'+'{0:08b}'.format(frame_bytearray[position+1])+'{0:08b}'.format(frame_bytearray[position]),2)
+        return frame_bytearray[position] | (frame_bytearray[position+1] << 8)
     
     def _checkForSubframes(self):
         self._sub_is_fullframe = [False]*len(self._frame_list)
@@ -78,7 +105,7 @@ class eventBuilderParser():
     
     def print_info(self):
         for i in self.__dict__:
-            if i != "_frame_list" and type(self.__dict__[i]) is not bytearray:
+            if i != "_frame_list" and type(self.__dict__[i]) not in (bytearray, memoryview):
                 print(i," = ",self.__dict__[i])
                 
         for i in range(len(self._sub_is_fullframe)):
@@ -88,74 +115,50 @@ class eventBuilderParser():
                 
         return
         
-    def _parseArray(self,frame_bytearray:bytearray):
-        self._frame_bytes     = len(frame_bytearray)
-        self._main_header     = frame_bytearray[0:16]
+    def _parseArray(self,frame_bytearray):
+        """ Parses frame_bytearray (bytes, bytearray, memoryview or numpy array)
+        without copying: frames in self._frame_list are memoryviews of it.
+        """
+        view = memoryview(frame_bytearray)
+        if view.format != 'B' or view.ndim != 1: view = view.cast('B')
 
-        self._version                = self._main_header[0] & int('00001111', 2)
+        self._frame_bytes     = len(view)
+        self._main_header     = view[0:16]
+
+        self._version                = self._main_header[0] & 0xf
         self._axi_stream_bit_width   = 8*2**((self._main_header[0] >> 4) + 1)
         self.sequence_count         = self._main_header[1]
-        self._HEADER_WIDTH           = int(self._axi_stream_bit_width/8)
-        
-        
-        self._frame_sizes_reversed         = [self._frames_to_position(frame_bytearray,-16)]
-        self._frame_positions_reversed     = [[self._frame_bytes-16-self._frame_sizes_reversed[0],self._frame_bytes-16]] #[start, and]
-        self._frame_list                   = [frame_bytearray[self._frame_positions_reversed[-1][0]:self._frame_positions_reversed[-1][1]]]
-        
-        self._tdest                        = [frame_bytearray[-12]]
-        
-        
-        parsed_frame_size = sum(self._frame_sizes_reversed) +(len(self._frame_sizes_reversed)+1)*self._HEADER_WIDTH
-        #print("parsing")
-        while len(frame_bytearray)>=(parsed_frame_size+self._HEADER_WIDTH):
-            #print(len(frame_bytearray))
-            self._frame_sizes_reversed.append(self._frames_to_position(frame_bytearray,self._frame_positions_reversed[-1][0]-16))
-            
-            self._frame_positions_reversed.append([self._frame_positions_reversed[-1][0]-16-self._frame_sizes_reversed[-1],self._frame_positions_reversed[-1][0]-16]) #[start, and]            
-            
-            self._frame_list.append(frame_bytearray[self._frame_positions_reversed[-1][0]:self._frame_positions_reversed[-1][1]])
-            self._tdest.append(frame_bytearray[self._frame_positions_reversed[-1][1]+4])
-            
-            
-          
-            parsed_frame_size = sum(self._frame_sizes_reversed) +(len(self._frame_sizes_reversed)+1)*self._HEADER_WIDTH
+        self._HEADER_WIDTH           = self._axi_stream_bit_width//8
+
+        layout = _frame_layout(view, self._HEADER_WIDTH)
+        self._frame_positions_reversed = [[s,e] for s,e,t in layout] #[start, and]
+        self._frame_sizes_reversed     = [e-s for s,e,t in layout]
+        self._frame_list               = [view[s:e] for s,e,t in layout]
+        self._tdest                    = [t for s,e,t in layout]
         
-        #self._sub_is_fullframe = [False]*len(self._frame_list)
         self._resolveSubFrames()
         
         return
     
 class timeToolParser(eventBuilderParser):
-    def _parseData(self,frame_bytearray:bytearray):
+    def _parseData(self,frame_bytearray):
         self._parseArray(frame_bytearray)
-        
-        
-        try:
-            _timing_bus_idx           = [i[0] for i in enumerate(self._tdest) if i[1]==0][0] #timing bus always has _tdest of 0
-            self._timing_bus          = self._frame_list[_timing_bus_idx]  #frame_bytearray[16:32]
-        except IndexError:
-            self._timing_bus = None
-        
-        sub_frame_idx            = [i[0] for i in enumerate(self._tdest) if i[1]==1][0]
-        edge_pos_idx             = [i[0] for i in enumerate(self._sub_frames[sub_frame_idx]._tdest) if i[1]==0][0]
-        self.edge_position       = self._sub_frames[sub_frame_idx]._frame_list[edge_pos_idx][0] + self._sub_frames[sub_frame_idx]._frame_list[edge_pos_idx][1]*256
-        
-        try:
-            bkg_frame_idx            = [i[0] for i in enumerate(self._sub_frames[sub_frame_idx]._tdest) if i[1]==1][0]
-            self.background_frame    = self._sub_frames[sub_frame_idx]._frame_list[bkg_frame_idx]
-        except IndexError:    
-            self.background_frame    = None
-
-        try:
-            prescaled_frame_idx      = [i[0] for i in enumerate(self._tdest) if i[1]==2][0]
-            #self.prescaled_frame    = self._frame_list[prescaled_frame_idx] 
-            self.prescaled_frame     = np.frombuffer(self._frame_list[prescaled_frame_idx],dtype = np.int8)
-            
-        except IndexError:
-            self.prescaled_frame     = None
-            
-        
-        
-        
-    
+
+        tdest_idx = _first_index(self._tdest)
+
+        _timing_bus_idx = tdest_idx.get(0) #timing bus always has _tdest of 0
+        self._timing_bus = None if _timing_bus_idx is None else self._frame_list[_timing_bus_idx]
+
+        sub_frame              = self._sub_frames[tdest_idx[1]]
+        sub_tdest_idx          = _first_index(sub_frame._tdest)
+        edge_frame             = sub_frame._frame_list[sub_tdest_idx[0]]
+        self.edge_position     = edge_frame[0] + edge_frame[1]*256
+
+        bkg_frame_idx          = sub_tdest_idx.get(1)
+        self.background_frame  = None if bkg_frame_idx is None else sub_frame._frame_list[bkg_frame_idx]
+
+        prescaled_frame_idx    = tdest_idx.get(2)
+        self.prescaled_frame   = None if prescaled_frame_idx is None else\
+                                 np.frombuffer(self._frame_list[prescaled_frame_idx], dtype=np.int8)
+
         return
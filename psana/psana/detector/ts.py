@@ -1,40 +1,107 @@
 #import bitstruct
+import struct
 import numpy as np
 from collections import namedtuple
 from psana.detector.detector_impl import DetectorImpl
 
-def _to_word(data,shift=0,mask=0):
-    rdata = data[::-1]
-    w = 0
-    for b in data[::-1]:
-        w = w<<8
-        w |= b
-    w >>= shift
-    if mask:
-        w &= (1<<mask)-1
-    return w
+# Little-endian layout of the 48-byte timing header, bit-fields are
+# packed into the 16-bit words 'rates', 'slot' and 'beam'
+_header_dtype = np.dtype([
+    ('pulseId',         '<u8'),
+    ('timestamp',       '<u8'),
+    ('rates',           '<u2'), # fixed rate markers:10, ac rate markers:6
+    ('slot',            '<u2'), # ac time slot:3, ac time slot phase:13
+    ('beam',            '<u2'), # ebeam present:1, reserved1:3, ebeam destination:4, reserved2:8
+    ('beam_charge',     '<u2'),
+    ('beam_energy',     '<u2', (4,)),
+    ('wavelen',         '<u2', (2,)),
+    ('reserved3',       '<u2'),
+    ('mps_limit',       '<u2'),
+    ('mps_power_class', '<u8'),
+])
+_header_bytes = _header_dtype.itemsize # 48
+
+# Decoded timing fields, in the order of TsData
+_info_dtype = np.dtype([
+    ('pulseId',                         '<u8'),
+    ('timestamp',                       '<u8'),
+    ('fixed_rate_markers',              '<u2'),
+    ('ac_rate_markers',                 '<u2'),
+    ('ac_time_slot',                    '<u2'),
+    ('ac_time_slot_phase',              '<u2'),
+    ('ebeam_present',                   '?'),
+    ('reserved1',                       '<u2'),
+    ('ebeam_destination',               '<u2'),
+    ('reserved2',                       '<u2'),
+    ('requested_ebeam_charge_pc',       '<u2'),
+    ('requested_ebeam_energy_loc1',     '<u2'),
+    ('requested_ebeam_energy_loc2',     '<u2'),
+    ('requested_ebeam_energy_loc3',     '<u2'),
+    ('requested_ebeam_energy_loc4',     '<u2'),
+    ('requested_photon_wavelength_sxu', '<u2'),
+    ('requested_photon_wavelength_hxu', '<u2'),
+    ('reserved3',                       '<u2'),
+    ('mps_limit',                       '<u2'),
+    ('mps_power_class',                 '<u8'),
+])
+
+def _header_view(data):
+    """ Returns a structured view of timing headers.
+    data: bytes-like of n*48 bytes or uint8 array of shape (n, >=48) 
+    """
+    a = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    if a.ndim == 1:
+        return np.frombuffer(a[:a.size//_header_bytes*_header_bytes], dtype=_header_dtype)
+    return np.ascontiguousarray(a[:,:_header_bytes]).view(_header_dtype).reshape(-1)
+
+def _unpack_batch(data):
+    """ Decodes n timing headers in one call and returns a record array
+    with the fields of _info_dtype.
+    """
+    h = _header_view(data)
+    out = np.zeros(h.shape[0], dtype=_info_dtype)
+    out['pulseId']                         = h['pulseId']
+    out['timestamp']                       = h['timestamp']
+    out['fixed_rate_markers']              = h['rates'] & 0x3ff
+    out['ac_rate_markers']                 = h['rates'] >> 10
+    out['ac_time_slot']                    = h['slot'] & 0x7
+    out['ac_time_slot_phase']              = h['slot'] >> 3
+    out['ebeam_present']                   = (h['beam'] & 0x1) == 1
+    out['ebeam_destination']               = (h['beam'] >> 4) & 0xf
+    out['requested_ebeam_charge_pc']       = h['beam_charge']
+    out['requested_ebeam_energy_loc1']     = h['beam_energy'][:,0]
+    out['requested_ebeam_energy_loc2']     = h['beam_energy'][:,1]
+    out['requested_ebeam_energy_loc3']     = h['beam_energy'][:,2]
+    out['requested_ebeam_energy_loc4']     = h['beam_energy'][:,3]
+    out['requested_photon_wavelength_sxu'] = h['wavelen'][:,0]
+    out['requested_photon_wavelength_hxu'] = h['wavelen'][:,1]
+    out['mps_limit']                       = h['mps_limit']
+    out['mps_power_class']                 = h['mps_power_class']
+    return out.view(np.recarray)
+
+# The same 48-byte layout for a single header: a recarray per event costs
+# more than the byte loop it replaced, struct unpacks it directly
+_header_struct = struct.Struct('<2Q12HQ')
 
 def _unpack(data):
-    return ( _to_word(data[0:8]),       # pulseId
-             _to_word(data[8:16]),      # timestamp
-             _to_word(data[16:18],0,10),# fixed rate
-             _to_word(data[16:18],10,0),# ac rate
-             _to_word(data[18:20],0,3), # timeslot
-             _to_word(data[18:20],3,0), # phase
-             _to_word(data[20:22],0,1)==1, # beam_present
+    (pulseId, timestamp, rates, slot, beam, beam_charge, e1, e2, e3, e4,
+     sxu, hxu, reserved3, mps_limit, mps_power_class) = _header_struct.unpack_from(data)
+    return ( pulseId,
+             timestamp,
+             rates & 0x3ff,             # fixed rate
+             rates >> 10,               # ac rate
+             slot & 0x7,                # timeslot
+             slot >> 3,                 # phase
+             (beam & 0x1) == 1,         # beam_present
              0,                         # reserved1
-             _to_word(data[20:22],4,4), # beam_destn
+             (beam >> 4) & 0xf,         # beam_destn
              0,                         # reserved2
-             _to_word(data[22:24]),     # beam_charge
-             _to_word(data[24:26]),     # beam_energy_0
-             _to_word(data[26:28]),
-             _to_word(data[28:30]),
-             _to_word(data[30:32]),
-             _to_word(data[32:34]),     # wavelen_0
-             _to_word(data[34:36]),
+             beam_charge,
+             e1, e2, e3, e4,            # beam_energy
+             sxu, hxu,                  # wavelen
              0,                         # reserved3
-             _to_word(data[38:40]),     # mps_limit
-             _to_word(data[40:48]))     # mps_power_class
+             mps_limit,
+             mps_power_class )
 
 class ts_ts_1_2_3(DetectorImpl):
     def __init__(self, *args):
@@ -84,6 +151,18 @@ class ts_ts_1_2_3(DetectorImpl):
         unpacked = _unpack(data)
         return self.TsData(*unpacked)
 
+    def info_batch(self,evts):
+        """ Decodes timing headers of a batch of events (e.g. all events
+        of one EventManager batch) in one call. Returns a record array with
+        one row per event, rows of events with missing data are zero.
+        """
+        headers = np.zeros((len(evts), self.total_bytes), dtype=np.uint8)
+        for i, evt in enumerate(evts):
+            segments = self._segments(evt)
+            if segments is None: continue
+            headers[i] = segments[0].data[:self.total_bytes]
+        return _unpack_batch(headers)
+
     def sequencer_info(self,evt):
         # check for missing data
         segments = self._segments(evt)
@@ -2,12 +2,15 @@ import sys, os
 import time
 import getopt
 import pprint
+import hashlib
+from collections import OrderedDict
 
 from shmem import PyShmemClient
 from psana import dgram
 from psana.event import Event
 from psana.detector import detectors
 from psana.psexp.event_manager import TransitionId
+from psana.psexp.shmem_reader import ShmemReader, TimestampRing, shmem_reader_options
 import numpy as np
 
 def dumpDict(dict,indent):
@@ -24,16 +27,13 @@ def dumpDgram(d):
 
 FN_L = 200
 
-# Warning: If XtcData::Dgram ever changes, this function will likely need to change
-def _service(view):
-    iSvc = 2                    # Index of service field, in units of uint32_t
-    return (np.array(view, copy=False).view(dtype=np.uint32)[iSvc] >> 24) & 0x0f
+# Detector class tables of recently seen configs (keyed by config hash).
+# Consecutive runs usually share the same detector configuration.
+_det_class_cache = OrderedDict()
+_DET_CLASS_CACHE_SIZE = 8
 
-# Warning: If XtcData::Dgram ever changes, this function will likely need to change
-def _dgSize(view):
-    iExt = 5                    # Index of extent field, in units of uint32_t
-    txSize = 3 * 4              # sizeof(XtcData::TransitionBase)
-    return txSize + np.array(view, copy=False).view(dtype=np.uint32)[iExt]
+# Warning: If XtcData::Dgram ever changes, this will likely need to change
+_DGRAM_HEADER_BYTES = 24 # sizeof(XtcData::Dgram): TransitionBase + root Xtc header
 
 class DgramManager():
 
@@ -41,10 +41,11 @@ class DgramManager():
         """ Opens xtc_files and stores configs."""
         self.xtc_files = []
         self.shmem_cli = None
+        self.shmem_reader = None
         self.shmem_kwargs = {'index':-1,'size':0,'cli_cptr':None}
         self.configs = []
         self.fds = np.ones(len(xtc_files), dtype=np.int32) * -1
-        self._timestamps = [] # built when iterating
+        self._timestamps = TimestampRing() # built when iterating
         self._run = run
 
         if isinstance(xtc_files, (str)):
@@ -56,17 +57,17 @@ class DgramManager():
                     #establish connection to available server - blocking
                     status = int(self.shmem_cli.connect(tag,0))
                     assert not status,'shmem connect failure %d' % status
+                    # live sessions are long: keep only the last timestamps
+                    reader_opts, n_timestamps = shmem_reader_options()
+                    self.shmem_reader = ShmemReader(self.shmem_cli, self.shmem_kwargs, **reader_opts)
+                    self._timestamps = TimestampRing(n_timestamps)
                     #wait for first configure datagram - blocking
-                    view = self.shmem_cli.get(self.shmem_kwargs)
-                    assert view
-                    # Release shmem buffer after copying Transition data
-                    if _service(view) != TransitionId.L1Accept:
-                        barray = bytes(view[:_dgSize(view)])
-                        self.shmem_cli.freeByIndex(self.shmem_kwargs['index'], self.shmem_kwargs['size'])
-                        view = memoryview(barray)
+                    item = self.shmem_reader.get()
+                    assert item
+                    view, index, size = item
                     d = dgram.Dgram(view=view, \
-                                    shmem_index=self.shmem_kwargs['index'], \
-                                    shmem_size=self.shmem_kwargs['size'], \
+                                    shmem_index=index, \
+                                    shmem_size=size, \
                                     shmem_cli_cptr=self.shmem_kwargs['cli_cptr'], \
                                     shmem_cli_pyobj=self.shmem_cli)
                     self.configs += [d]
@@ -84,7 +85,7 @@ class DgramManager():
                 d = dgram.Dgram(file_descriptor=self.fds[i])
                 self.configs += [d]
 
-        self.det_classes, self.xtc_info, self.det_info_table = self.get_det_class_table()
+        self.det_classes, self.xtc_info, self.det_info_table = self._cached_det_class_table()
         self.calibconst = {} # initialize to empty dict - will be populated by run class
 
     def __del__(self):
@@ -99,18 +100,15 @@ class DgramManager():
     def __next__(self):
         """ only support sequential read - no event building"""
         if self.shmem_cli:
-            view = self.shmem_cli.get(self.shmem_kwargs)
-            if view:
-                # Release shmem buffer after copying Transition data
-                if _service(view) != TransitionId.L1Accept:
-                    barray = bytes(view[:_dgSize(view)])
-                    self.shmem_cli.freeByIndex(self.shmem_kwargs['index'], self.shmem_kwargs['size'])
-                    view = memoryview(barray)
+            # buffers come in batches (or from a prefetch thread), see ShmemReader
+            item = self.shmem_reader.get()
+            if item:
+                view, index, size = item
                 # use the most recent configure datagram
                 config = self.configs[len(self.configs)-1]
                 d = dgram.Dgram(config=config,view=view, \
-                                shmem_index=self.shmem_kwargs['index'], \
-                                shmem_size=self.shmem_kwargs['size'], \
+                                shmem_index=index, \
+                                shmem_size=size, \
                                 shmem_cli_cptr=self.shmem_kwargs['cli_cptr'], \
                                 shmem_cli_pyobj=self.shmem_cli)
                 dgrams = [d]
@@ -120,7 +118,7 @@ class DgramManager():
             dgrams = [dgram.Dgram(config=config) for config in self.configs]
 
         evt = Event(dgrams, run=self.run())
-        self._timestamps += [evt.timestamp]
+        self._timestamps.append(evt.timestamp)
         return evt
 
     def jump(self, offsets, sizes):
@@ -139,6 +137,31 @@ class DgramManager():
         evt = Event(dgrams, run=self.run())
         return evt
 
+    def config_hash(self):
+        """ Returns hash of the xtc payload of all config dgrams of this
+        DgramManager. The Dgram header (timestamp, env, root xtc) is left
+        out so that a run reconfigured with the same configuration gets
+        the same hash."""
+        h = hashlib.sha1()
+        for config in self.configs:
+            h.update(memoryview(config)[_DGRAM_HEADER_BYTES:])
+        return h.hexdigest()
+
+    def _cached_det_class_table(self):
+        """ Returns get_det_class_table() reusing the tables built for
+        an earlier DgramManager with identical configs."""
+        key = self.config_hash()
+        if key in _det_class_cache:
+            _det_class_cache.move_to_end(key)
+            det_classes, xtc_info, det_info_table = _det_class_cache[key]
+        else:
+            det_classes, xtc_info, det_info_table = self.get_det_class_table()
+            _det_class_cache[key] = (det_classes, xtc_info, det_info_table)
+            if len(_det_class_cache) > _DET_CLASS_CACHE_SIZE:
+                _det_class_cache.popitem(last=False)
+        # copies so that runs do not share mutable tables
+        return {k: dict(v) for k, v in det_classes.items()}, list(xtc_info), dict(det_info_table)
+
     def get_det_class_table(self):
         """
         this function gets the version number for a (det, drp_class) combo
@@ -200,7 +223,8 @@ class DgramManager():
         return det_classes, xtc_info, det_info_table
 
     def get_timestamps(self):
-        return np.asarray(self._timestamps, dtype=np.uint64) # return numpy array for easy search later
+        """ Returns timestamps of the events read (the last PS_SHMEM_TIMESTAMPS in shmem mode). """
+        return self._timestamps.array() # return numpy array for easy search later
 
     def run(self):
         return self._run
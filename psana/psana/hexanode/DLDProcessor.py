@@ -19,6 +19,10 @@ Module :py:class:`DLDProcessor` for MCP with DLD for COLTRIMS experiments
         nhits, pkinds, pkvals, pktsec = peaks(wfs,wts) # ACCESS TO PEAK INFO
         xyrt = o.xyrt_list(nevt, nhits, pktsec)
 
+    # OR: process many events at once in compiled code with numthreads threads,
+    # nhits_batch[nevents,nchannels], pktsec_batch[nevents,nchannels,nhits] - stacked peak info
+    npart, x, y, t, method = o.event_proc_batch(nhits_batch, pktsec_batch, nthreads=8)
+
 Created on 2019-11-20 by Mikhail Dubrovin
 """
 #----------
@@ -32,6 +36,7 @@ logger = logging.getLogger(__name__)
 
 import sys
 from time import time
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
 import numpy as np
 
@@ -192,6 +197,14 @@ class DLDProcessor :
 
         self.evnum_old = None
 
+        # parameters to create extra sorters for batch processing in threads
+        self._kwargs = kwargs
+        self._txt_cfg = txt_cfg
+        self._tdc_resolution = TDC_RESOLUTION
+        self.NUM_THREADS = kwargs.get('numthreads', 1)
+        self._batch_sorters = None
+        self._batch_pool = None
+
 
 
     def set_data_arrays(self, nhits, pktsec) :
@@ -275,6 +288,90 @@ class DLDProcessor :
         #logger.info('    XXX sorter.time_list', sorter.t_list())
 
 
+    def _new_sorter(self) :
+        """Returns one more sorter with the same configuration as self.sorter and its own tdc arrays."""
+        sorter = hexanode.py_sort_class()
+        load_config_pars(self._txt_cfg, sorter, **self._kwargs)
+        NUM_CHANNELS, NUM_HITS = self.tdc_ns.shape
+        tdc_ns = np.zeros((NUM_CHANNELS, NUM_HITS), dtype=np.float64)
+        number_of_hits = np.zeros((NUM_CHANNELS,), dtype=np.int32)
+        sorter.set_tdc_resolution_ns(self._tdc_resolution)
+        sorter.set_tdc_array_row_length(NUM_HITS)
+        sorter.set_count(number_of_hits)
+        sorter.set_tdc_pointer(tdc_ns)
+        error_code = sorter.init_after_setting_parameters()
+        if error_code :
+            logger.warning('Error %d: %s' % (error_code, sorter.get_error_text(error_code, 512)))
+            return None
+        return sorter, tdc_ns, number_of_hits
+
+
+    def _sorters_for_batch(self, nthreads) :
+        """Returns list of sorters, one per thread. Calibration (command>=2) accumulates
+           statistics in self.sorter, so in this case batch is processed in one thread.
+        """
+        if self.command >= 2 : nthreads = 1
+        if self._batch_sorters is None : self._batch_sorters = []
+        while len(self._batch_sorters) < nthreads-1 :
+            o = self._new_sorter()
+            if o is None : break
+            self._batch_sorters.append(o) # keep tdc arrays alive together with sorter
+        return [self.sorter,] + [o[0] for o in self._batch_sorters[:nthreads-1]]
+
+
+    def event_proc_batch(self, nhits, pktsec, max_particles=None, nthreads=None) :
+        """Processes a batch of events in compiled code with the GIL released.
+           nhits[nevents, nchannels] - number of hits per channel, e.g. stacked WFPeaks.number_of_hits,
+           pktsec[nevents, nchannels, nhits] - hit times in sec, e.g. stacked WFPeaks.peak_times_sec.
+           Events are split between nthreads (default kwargs numthreads) threads, each with its own sorter.
+           Returns packed arrays: npart[nevents] (-1 for events with empty channel),
+           x, y, t[nevents, max_particles] (t in sec) and method[nevents, max_particles].
+        """
+        NUM_CHANNELS, NUM_HITS = self.tdc_ns.shape
+        nhits  = np.asarray(nhits)
+        pktsec = np.asarray(pktsec)
+        nevts  = pktsec.shape[0]
+        maxp   = pktsec.shape[2] if max_particles is None else max_particles
+
+        counts = np.ascontiguousarray(nhits[:,:NUM_CHANNELS], dtype=np.int32)
+        if counts.size and counts.max() > NUM_HITS :
+            raise ValueError('event_proc_batch: more than numhits=%d hits in a channel' % NUM_HITS)
+        # the sorters are initialized for (NUM_CHANNELS, NUM_HITS) per event
+        nh = min(NUM_HITS, pktsec.shape[2])
+        tdc_ns = np.zeros((nevts, NUM_CHANNELS, NUM_HITS), dtype=np.float64)
+        tdc_ns[:,:,:nh] = pktsec[:,:NUM_CHANNELS,:nh] * 1E9 # convert sec -> ns
+        x      = np.zeros((nevts, maxp), dtype=np.float64)
+        y      = np.zeros((nevts, maxp), dtype=np.float64)
+        t      = np.zeros((nevts, maxp), dtype=np.float64)
+        method = np.zeros((nevts, maxp), dtype=np.int32)
+        npart  = np.zeros((nevts,), dtype=np.int32)
+
+        if nevts == 0 : return npart, x, y, t, method
+
+        sorters = self._sorters_for_batch(self.NUM_THREADS if nthreads is None else nthreads)
+        pars = (self.offset_sum_u, self.offset_sum_v, self.offset_sum_w,\
+                self.w_offset, self.pos_offset_x, self.pos_offset_y, self.command == 1)
+
+        def proc_chunk(sorter, i0, i1) :
+            sorter.sort_batch(tdc_ns[i0:i1], counts[i0:i1], x[i0:i1], y[i0:i1], t[i0:i1],\
+                              method[i0:i1], npart[i0:i1], *pars)
+
+        nchunks = len(sorters)
+        bounds = np.linspace(0, nevts, nchunks+1).astype(np.int64)
+        if nchunks == 1 :
+            proc_chunk(sorters[0], 0, nevts)
+        else :
+            if self._batch_pool is None or self._batch_pool._max_workers < nchunks :
+                if self._batch_pool is not None : self._batch_pool.shutdown()
+                self._batch_pool = ThreadPoolExecutor(max_workers=nchunks)
+            futures = [self._batch_pool.submit(proc_chunk, o, bounds[i], bounds[i+1])\
+                       for i,o in enumerate(sorters) if bounds[i+1] > bounds[i]]
+            for f in futures : f.result()
+
+        self.evnum_old = None
+        return npart, x, y, t, method
+
+
     def xyrt_list(self, evnum, nhits, pktsec) :
         if evnum != self.evnum_old : self.event_proc(evnum, nhits, pktsec)
         return self.sorter.xyrt_list()
@@ -326,6 +423,7 @@ class DLDProcessor :
         
     def __del__(self) :
         self.end_proc()
+        if getattr(self, '_batch_pool', None) is not None : self._batch_pool.shutdown()
         if self.sorter is not None : del self.sorter
 
 #----------
@@ -178,7 +178,7 @@ class WFPeaks :
                 # need it in V4 to convert _pktsec to _pkinds and _pkvals
                 if self.tbins is None :
                     from psana.pyalgos.generic.HBins import HBins
-                    self.tbins = HBins(list(wt))
+                    self.tbins = HBins(wt)
 
             else : # self.VERSION == 1
                 npeaks = wfpkfinder_cfd(wf, self.BASE, self.THR, self.CFR, self.DEADTIME, self.LEADINGEDGE,\
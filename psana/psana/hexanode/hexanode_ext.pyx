@@ -351,22 +351,22 @@ cdef extern from "psalg/hexanode/resort64c.hh":
         #----------------------
 
         sort_class() except +
-        int32_t sort() except + # sorts data, returns the number of reconstructed particles 
-        int32_t run_without_sorting() except +
+        int32_t sort() except + nogil # sorts data, returns the number of reconstructed particles 
+        int32_t run_without_sorting() except + nogil
         bint create_scalefactors_calibrator(bint , double& runtime_u,\
                                             double& runtime_v,\
                                             double& runtime_w, double& v,\
                                             double& fu, double& fv, double& fw) except +
 
         int32_t init_after_setting_parameters()
-        void shift_sums(int32_t direction, double Sumu_offeset, double Sumv_offeset, double Sumw_offeset)
-        void shift_layer_w(int32_t direction, double w_offeset)
-        void shift_position_origin(int32_t direction, double x_pos_offeset, double y_pos_offeset)
+        void shift_sums(int32_t direction, double Sumu_offeset, double Sumv_offeset, double Sumw_offeset) nogil
+        void shift_layer_w(int32_t direction, double w_offeset) nogil
+        void shift_position_origin(int32_t direction, double x_pos_offeset, double y_pos_offeset) nogil
 
         void get_error_text(int32_t error_code, int32_t buffer_length, char*& error_text)
         bint do_calibration()
-        bint feed_calibration_data(bint build_map, double w_offset, int32_t number_of_correction_points)
-        bint feed_calibration_data(bint build_map, double w_offset)
+        bint feed_calibration_data(bint build_map, double w_offset, int32_t number_of_correction_points) nogil
+        bint feed_calibration_data(bint build_map, double w_offset) nogil
 
         bint are_all_single()
 #        bint clone(sort_class *clone)
@@ -379,6 +379,7 @@ cdef class py_sort_class:
     """
     cdef sort_class* cptr  # holds a C++ instance
     cdef int32_t number_of_output_hits
+    cdef int32_t number_of_channels # length of the count array set by set_count
 
     NS_TO_SEC = 1E-9
 
@@ -673,6 +674,7 @@ cdef class py_sort_class:
 
     def set_count(self, np.ndarray[np.int32_t, ndim=1, mode="c"] nda) : 
        self.cptr.count = &nda[0]
+       self.number_of_channels = nda.shape[0]
 
     def set_tdc_pointer(self, np.ndarray[np.float64_t, ndim=2, mode="c"] nda) : 
        self.cptr.tdc_pointer = &nda[0,0]
@@ -740,6 +742,91 @@ cdef class py_sort_class:
         return self.cptr.are_all_single()
 
 
+    def sort_batch(self, np.ndarray[np.float64_t, ndim=3, mode="c"] tdc_ns not None,\
+                         np.ndarray[np.int32_t,   ndim=2, mode="c"] nhits not None,\
+                         np.ndarray[np.float64_t, ndim=2, mode="c"] x not None,\
+                         np.ndarray[np.float64_t, ndim=2, mode="c"] y not None,\
+                         np.ndarray[np.float64_t, ndim=2, mode="c"] t not None,\
+                         np.ndarray[np.int32_t,   ndim=2, mode="c"] method not None,\
+                         np.ndarray[np.int32_t,   ndim=1, mode="c"] npart not None,\
+                         double offset_sum_u, double offset_sum_v, double offset_sum_w,\
+                         double w_offset, double pos_offset_x, double pos_offset_y,\
+                         bint do_sort=True, bint feed_calibration=True) :
+        """Processes a batch of events with the GIL released.
+           tdc_ns[nevents, nchannels, nhits] - hit times in ns, modified in place by shift/sort,
+                  nchannels and nhits must be those the sorter was initialized with (set_count and
+                  set_tdc_array_row_length), otherwise ValueError is raised,
+           nhits[nevents, nchannels] - number of hits per channel, modified in place,
+           x, y, t[nevents, max_particles], method[nevents, max_particles] - output per particle (t in sec),
+           npart[nevents] - output number of reconstructed particles (-1 for events with empty channel).
+           For each event does the same as DLDProcessor.event_proc: shift_sums, shift_layer_w (hex only),
+           shift_position_origin, feed_calibration_data and sort or run_without_sorting.
+        """
+        cdef Py_ssize_t nevts = tdc_ns.shape[0]
+        cdef Py_ssize_t nchs  = tdc_ns.shape[1]
+        cdef Py_ssize_t nhmax = tdc_ns.shape[2]
+        cdef Py_ssize_t maxp  = x.shape[1]
+        # resort64c indexes its buffers with the channel count and row length it was initialized with
+        if nhmax != self.cptr.tdc_array_row_length :
+            raise ValueError('sort_batch: tdc_ns has %d hits per channel, sorter is initialized for %d'\
+                             % (nhmax, self.cptr.tdc_array_row_length))
+        if nchs != self.number_of_channels :
+            raise ValueError('sort_batch: tdc_ns has %d channels, sorter is initialized for %d'\
+                             % (nchs, self.number_of_channels))
+        assert nhits.shape[0] == nevts and nhits.shape[1] == nchs
+        assert npart.shape[0] == nevts
+        assert y.shape[1] == maxp and t.shape[1] == maxp and method.shape[1] == maxp
+        assert x.shape[0] == nevts and y.shape[0] == nevts and t.shape[0] == nevts and method.shape[0] == nevts
+
+        cdef sort_class* s = self.cptr
+        cdef double*  ptdc  = &tdc_ns[0,0,0]
+        cdef int32_t* pcnt  = &nhits[0,0]
+        cdef double*  px    = &x[0,0]
+        cdef double*  py    = &y[0,0]
+        cdef double*  pt    = &t[0,0]
+        cdef int32_t* pmet  = &method[0,0]
+        cdef int32_t* pnp   = &npart[0]
+        cdef int32_t* count_saved = s.count
+        cdef double*  tdc_saved   = s.tdc_pointer
+        cdef Py_ssize_t i, c, j, n
+        cdef int32_t nout = 0
+        cdef hit_class* hit
+
+        with nogil :
+            for i in range(nevts) :
+                s.count       = pcnt + i*nchs
+                s.tdc_pointer = ptdc + i*nchs*nhmax
+
+                pnp[i] = -1
+                for c in range(nchs) :
+                    if s.count[c] == 0 : break
+                else :
+                    if s.use_HEX :
+                        s.shift_sums(+1, offset_sum_u, offset_sum_v, offset_sum_w)
+                        s.shift_layer_w(+1, w_offset)
+                    else :
+                        s.shift_sums(+1, offset_sum_u, offset_sum_v, 0)
+                    s.shift_position_origin(+1, pos_offset_x, pos_offset_y)
+                    if feed_calibration :
+                        s.feed_calibration_data(True, w_offset)
+
+                    nout = s.sort() if do_sort else s.run_without_sorting()
+                    n = nout if nout < maxp else maxp
+                    pnp[i] = <int32_t>n
+                    for j in range(n) :
+                        hit = s.output_hit_array[j]
+                        px  [i*maxp+j] = hit.x
+                        py  [i*maxp+j] = hit.y
+                        pt  [i*maxp+j] = hit.time*1E-9
+                        pmet[i*maxp+j] = hit.method
+
+            s.count = count_saved
+            s.tdc_pointer = tdc_saved
+
+        self.number_of_output_hits = nout
+        return npart
+
+
 #    def clone(self, sort_class clone) :    	
 #        return self.cptr.clone(self)
 
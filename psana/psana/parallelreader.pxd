@@ -1,5 +1,5 @@
 from libc.stdlib cimport malloc, free
-from libc.string cimport memcpy
+from libc.string cimport memcpy, memmove
 from posix.unistd cimport read, sleep
 from cpython cimport array
 import array
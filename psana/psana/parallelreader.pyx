@@ -62,6 +62,7 @@ cdef class ParallelReader:
         cdef Py_ssize_t i = 0
         cdef uint64_t remaining = 0
         cdef uint64_t got = 0
+        cdef ssize_t nread = 0
         cdef uint64_t offset = 0
         cdef Dgram* d
         cdef Buffer* buf
@@ -81,14 +82,14 @@ cdef class ParallelReader:
             # then fill up the rest of the chunk
             if buf.needs_reread == 1:
                 remaining = buf.got - buf.offset
-                memcpy(buf.chunk, buf.chunk + buf.offset, remaining)
+                memmove(buf.chunk, buf.chunk + buf.offset, remaining)
                 
-                # MONA: TODO there's a chance that below read will be wrong,
-                # if the next part of the dgram cannot be read out in one retry (1s).
-                # The next read will replace the remaining - possible segfault
-                # when try to create Dgram.
-                got = read(self.file_descriptors[i], buf.chunk + remaining, \
+                # The remaining bytes (a partially written dgram in live mode)
+                # are kept at the beginning of the chunk until the rest of the
+                # dgram is read out - retries do not reset got and offset.
+                nread = read(self.file_descriptors[i], buf.chunk + remaining, \
                         self.chunksize - remaining)
+                got = nread if nread > 0 else 0
                 
                 buf.got = remaining + got
                 buf.needs_reread = 0
@@ -364,7 +364,7 @@ cdef extern from "psalg/peaks/PeakFinderAlgosLCLS1.hh" namespace "psalg1":
                                ,const size_t& rank
 	                       ,const double& r0
 	                       ,const double& dr
-	                       ,const double& nsigm)
+	                       ,const double& nsigm) nogil
 
          void peakFinderV4r3[T](const T *data
                                ,const mask_t *mask
@@ -375,7 +375,7 @@ cdef extern from "psalg/peaks/PeakFinderAlgosLCLS1.hh" namespace "psalg1":
                                ,const size_t& rank
 	                       ,const double& r0
 	                       ,const double& dr
-                               )
+                               ) nogil
  
          void printParameters();
 
@@ -385,7 +385,7 @@ cdef extern from "psalg/peaks/PeakFinderAlgosLCLS1.hh" namespace "psalg1":
 
          const vector[Peak]& vectorOfPeaks()
 
-         const vector[Peak]& vectorOfPeaksSelected()
+         const vector[Peak]& vectorOfPeaksSelected() nogil
 
          void localMaxima    (extrim_t *arr2d, const size_t& rows, const size_t& cols)
 
@@ -395,6 +395,35 @@ cdef extern from "psalg/peaks/PeakFinderAlgosLCLS1.hh" namespace "psalg1":
 
 #------------------------------
 
+# Parameters of selected peaks returned as one numpy structured array
+peak_dtype = np.dtype([(name, np.float32) for name in\
+    ('seg', 'row', 'col', 'npix', 'amp_max', 'amp_tot',\
+     'row_cgrav', 'col_cgrav', 'row_sigma', 'col_sigma', 'bkgd', 'noise', 'son')])
+
+cdef size_t PEAK_NPARS = 13
+
+cdef void _fill_peak_pars(const vector[Peak]& peaks, float* out) noexcept nogil :
+    """Copies parameters of peaks to out[len(peaks), PEAK_NPARS] in the order of peak_dtype."""
+    cdef size_t i
+    cdef float* r
+    for i in range(peaks.size()) :
+        r = out + i*PEAK_NPARS
+        r[0]  = peaks[i].seg
+        r[1]  = peaks[i].row
+        r[2]  = peaks[i].col
+        r[3]  = peaks[i].npix
+        r[4]  = peaks[i].amp_max
+        r[5]  = peaks[i].amp_tot
+        r[6]  = peaks[i].row_cgrav
+        r[7]  = peaks[i].col_cgrav
+        r[8]  = peaks[i].row_sigma
+        r[9]  = peaks[i].col_sigma
+        r[10] = peaks[i].bkgd
+        r[11] = peaks[i].noise
+        r[12] = peaks[i].son
+
+#------------------------------
+
 cdef class peak_finder_algos :
     """ Python wrapper for C++ class. 
     """
@@ -450,6 +479,51 @@ cdef class peak_finder_algos :
         return self.list_of_peaks_selected()
 
 
+    def array_of_peaks_selected(self) :
+        """Returns selected peaks as numpy structured array of peak_dtype."""
+        cdef const vector[Peak]* peaks = &self.cptr.vectorOfPeaksSelected()
+        cdef np.ndarray[np.float32_t, ndim=2, mode="c"] arr = np.empty((peaks.size(), PEAK_NPARS), dtype=np.float32)
+        if peaks.size() > 0 :
+            with nogil :
+                _fill_peak_pars(peaks[0], &arr[0,0])
+        return arr.view(peak_dtype).reshape(peaks.size())
+
+
+    def peak_finder_v3r3_d2_nogil(self\
+                                 ,nptype2d data\
+                                 ,np.ndarray[mask_t, ndim=2, mode="c"] mask\
+                                 ,size_t rank\
+                                 ,double r0\
+                                 ,double dr\
+                                 ,double nsigm) :
+        """The same as peak_finder_v3r3_d2, but releases the GIL and returns structured array of selected peaks."""
+        cdef size_t rows = data.shape[0]
+        cdef size_t cols = data.shape[1]
+        with nogil :
+            self.cptr.peakFinderV3r3(&data[0,0], &mask[0,0], rows, cols, rank, r0, dr, nsigm)
+        self.rows = rows
+        self.cols = cols
+        return self.array_of_peaks_selected()
+
+
+    def peak_finder_v4r3_d2_nogil(self\
+                                 ,nptype2d data\
+                                 ,np.ndarray[mask_t, ndim=2, mode="c"] mask\
+                                 ,double thr_low\
+                                 ,double thr_high\
+                                 ,size_t rank\
+                                 ,double r0\
+                                 ,double dr) :
+        """The same as peak_finder_v4r3_d2, but releases the GIL and returns structured array of selected peaks."""
+        cdef size_t rows = data.shape[0]
+        cdef size_t cols = data.shape[1]
+        with nogil :
+            self.cptr.peakFinderV4r3(&data[0,0], &mask[0,0], rows, cols, thr_low, thr_high, rank, r0, dr)
+        self.rows = rows
+        self.cols = cols
+        return self.array_of_peaks_selected()
+
+
     def list_of_peaks_selected(self) :
         cdef vector[Peak] peaks = self.cptr.vectorOfPeaksSelected()
         return [py_peak.factory(p) for p in peaks]
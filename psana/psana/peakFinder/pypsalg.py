@@ -75,6 +75,16 @@ Usage::
     lst_peak_pars = list_of_peak_parameters(peaks)         # returns list of tuples, where tuple consists of float peak parameters 
     arr_peak_pars = numpy_2d_arr_of_peak_parameters(peaks) # returns 2d numpy array of float peak parameters
 
+    # MULTI-SEGMENT PEAKFINDER RELEASING GIL
+    # ======================================
+
+    # data and mask are 3-d numpy arrays (or list of 2-d arrays), one algo object per segment is kept
+    pf = PeakFinderSegments(nthreads=8, npix_min=1, npix_max=None, amax_thr=0, atot_thr=0, son_min=8)
+    peaks = pf.peaks_adaptive(data, mask, rank=5, r0=7.0, dr=2.0, nsigm=5)
+    peaks = pf.peaks_droplet(data, mask, thr_low=20, thr_high=50, rank=5, r0=7.0, dr=2.0)
+    # peaks is a numpy structured array of dtype algos.peak_dtype, e.g. peaks['row'], peaks['son']
+    pf.close()
+
 Created: 2017-08-10 by Mikhail Dubrovin
          2020-03-05 adapted as lcls/2psana/psana/peakFinder/pypsalg.py
 """
@@ -83,6 +93,7 @@ Created: 2017-08-10 by Mikhail Dubrovin
 #from psalg_ext import peak_finder_algos
 import psalg_ext as algos
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 #------------------------------
 
@@ -354,6 +365,93 @@ def peaks_droplet(data, mask, thr_low, thr_high, rank=5, r0=7.0, dr=2.0,\
 
 #------------------------------
 
+class PeakFinderSegments :
+    """Peak finder for multi-segment detectors.
+
+    Keeps one peak_finder_algos object per segment between events and processes
+    segments in a thread pool. The C++ algos allocate their work buffers for the
+    segment shape of the first call, so the object of a segment is created again
+    when its shape changes; the C++ peakfinders run with released GIL.
+    Selected peaks of all segments are returned as a single numpy structured array
+    of dtype peak_dtype.
+    """
+    def __init__(self, nthreads=None, npix_min=1, npix_max=None, amax_thr=0, atot_thr=0, son_min=8, pbits=0) :
+        self.nthreads = nthreads
+        self.selection = (npix_min, npix_max, amax_thr, atot_thr, son_min)
+        self.pbits = pbits
+        self._algos = {} # seg: (shape, peak_finder_algos)
+        self._pool = None
+        self._ones = {}
+
+    def _algos_for(self, segs, rank) :
+        """Returns list of peak_finder_algos for segments segs (list of 2-d arrays)."""
+        npix_min, npix_max, amax_thr, atot_thr, son_min = self.selection
+        _npix_max = npix_max if npix_max is not None else (2*rank+1)*(2*rank+1)
+        algs = []
+        for seg, d2d in enumerate(segs) :
+            shape, o = self._algos.get(seg, (None, None))
+            if shape != d2d.shape :
+                o = algos.peak_finder_algos(seg, self.pbits)
+                self._algos[seg] = (d2d.shape, o)
+            o.set_peak_selection_parameters(npix_min, _npix_max, amax_thr, atot_thr, son_min)
+            algs.append(o)
+        return algs
+
+    def _segments(self, data, mask) :
+        """Returns lists of c-contiguous 2-d data and mask segments."""
+        if isinstance(data, np.ndarray) :
+            if data.ndim < 2 : raise IOError('PeakFinderSegments: wrong data.ndim %s' % str(data.ndim))
+            data = list(data.reshape(shape_as_3d(data.shape)))
+        elif not isinstance(data, list) :
+            raise IOError('PeakFinderSegments: unexpected object type for data: %s' % str(data))
+        if mask is None :
+            for d in data :
+                if d.shape not in self._ones : self._ones[d.shape] = np.ones(d.shape, dtype=np.uint16)
+            masks = [self._ones[d.shape] for d in data]
+        elif isinstance(mask, np.ndarray) :
+            masks = list(mask.reshape(shape_as_3d(mask.shape)))
+        else :
+            masks = mask
+        if len(masks) != len(data) or any(m.shape != d.shape for d, m in zip(data, masks)) :
+            raise IOError('PeakFinderSegments: data and mask segments have different shapes')
+        return [np.ascontiguousarray(d) for d in data],\
+               [np.ascontiguousarray(m, dtype=np.uint16) for m in masks]
+
+    def _map(self, func, nsegs) :
+        if self.nthreads == 1 or nsegs == 1 :
+            return [func(seg) for seg in range(nsegs)]
+        if self._pool is None :
+            self._pool = ThreadPoolExecutor(max_workers=self.nthreads)
+        return list(self._pool.map(func, range(nsegs)))
+
+    def _concatenate(self, peaks) :
+        return np.concatenate(peaks) if peaks else np.empty(0, dtype=algos.peak_dtype)
+
+    def peaks_adaptive(self, data, mask=None, rank=5, r0=7.0, dr=2.0, nsigm=5) :
+        """Adaptive peakfinder (v3r3) for 3-d array or list of 2-d arrays, returns structured array of peaks."""
+        segs, masks = self._segments(data, mask)
+        algs = self._algos_for(segs, rank)
+        return self._concatenate(self._map(lambda s :\
+            algs[s].peak_finder_v3r3_d2_nogil(segs[s], masks[s], rank, r0, dr, nsigm), len(segs)))
+
+    def peaks_droplet(self, data, mask=None, thr_low=None, thr_high=None, rank=5, r0=7.0, dr=2.0) :
+        """Droplet peakfinder (v4r3) for 3-d array or list of 2-d arrays, returns structured array of peaks."""
+        if None in (thr_low, thr_high) : return None
+        segs, masks = self._segments(data, mask)
+        algs = self._algos_for(segs, rank)
+        return self._concatenate(self._map(lambda s :\
+            algs[s].peak_finder_v4r3_d2_nogil(segs[s], masks[s], thr_low, thr_high, rank, r0, dr), len(segs)))
+
+    def close(self) :
+        if self._pool is not None :
+            self._pool.shutdown()
+            self._pool = None
+
+    def __del__(self) :
+        self.close()
+
+#------------------------------
+
 def list_of_peak_parameters(peaks) :
     """Converts list of peak objects to the (old style) list of peak parameters.
     """    
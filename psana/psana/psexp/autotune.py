@@ -0,0 +1,99 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def autotune_enabled():
+    return os.environ.get('PS_AUTOTUNE', '0') == '1'
+
+class AutoTuner(object):
+    """ Adjusts one size parameter of a producer node from how long it
+    waits for its consumers.
+
+    A producer (Smd0 sending chunks, SmdNode sending batches) alternates
+    between doing its work (busy) and waiting for a consumer request
+    (wait). If it hardly waits, or other requests are already queued
+    when it sends, consumers are starving and the producer is the
+    bottleneck: the value is multiplied by factor to amortize per-message
+    costs. If it mostly waits, consumers are the bottleneck: the value is
+    divided by factor for better load balancing. The value stays within
+    [vmin, vmax]. Tuning runs over the first max_windows windows of
+    window calls, then the value is frozen and logged.
+    """
+    def __init__(self, name, value, vmin, vmax, window=4, max_windows=8, \
+            idle_low=0.05, idle_high=0.5, factor=2):
+        self.name = name
+        self.vmin = max(1, int(vmin))
+        self.vmax = max(self.vmin, int(vmax))
+        self.value = min(max(int(value), self.vmin), self.vmax)
+        self.window = window
+        self.max_windows = max_windows
+        self.idle_low = idle_low
+        self.idle_high = idle_high
+        self.factor = factor
+        self.n_windows = 0
+        self.idle_fraction = 0.
+        self._reset_window()
+        self._t_last = None
+
+    def _reset_window(self):
+        self._n = 0
+        self._busy = 0.
+        self._wait = 0.
+        self._queued = 0
+
+    @property
+    def active(self):
+        return self.n_windows < self.max_windows
+
+    def start_wait(self):
+        """ Called before waiting for a consumer; returns time stamp for end_wait. """
+        t = time.monotonic()
+        if self._t_last is not None:
+            self._busy += t - self._t_last
+        return t
+
+    def end_wait(self, t_wait, queued=0):
+        """ Called after a consumer request arrived. queued is the number
+        of other requests already waiting (queue depth). Returns the value
+        to be used for the next message.
+        """
+        self._t_last = time.monotonic()
+        if not self.active: return self.value
+        self._wait += self._t_last - t_wait
+        self._queued += queued
+        self._n += 1
+        if self._n == self.window:
+            self._adjust()
+        return self.value
+
+    def _adjust(self):
+        total = self._busy + self._wait
+        self.idle_fraction = self._wait / total if total > 0 else 0.
+        old = self.value
+        if self.idle_fraction < self.idle_low or self._queued > 0:
+            self.value = min(self.value * self.factor, self.vmax)
+        elif self.idle_fraction > self.idle_high:
+            self.value = max(self.value // self.factor, self.vmin)
+        self.n_windows += 1
+        logger.debug('autotune %s: idle=%.2f queued=%d %d -> %d', \
+                self.name, self.idle_fraction, self._queued, old, self.value)
+        if not self.active:
+            logger.info('autotune %s: chose %d (idle fraction %.2f, bounds [%d, %d])', \
+                    self.name, self.value, self.idle_fraction, self.vmin, self.vmax)
+        self._reset_window()
+
+
+def smd0_tuner(n_events):
+    """ Tuner of no. of smd events read and sent by Smd0 per chunk. """
+    return AutoTuner('PS_SMD_N_EVENTS', n_events, \
+            int(os.environ.get('PS_SMD_N_EVENTS_MIN', 1000)), \
+            int(os.environ.get('PS_SMD_N_EVENTS_MAX', max(n_events, 13500*64))))
+
+
+def batch_tuner(batch_size):
+    """ Tuner of no. of events per batch sent by SmdNode to bigdata nodes. """
+    return AutoTuner('batch_size', batch_size, \
+            int(os.environ.get('PS_BATCH_SIZE_MIN', 1)), \
+            int(os.environ.get('PS_BATCH_SIZE_MAX', max(batch_size, 1000))))
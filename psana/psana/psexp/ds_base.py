@@ -4,13 +4,25 @@ import glob
 import abc
 import numpy as np
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 
 from psana.dgrammanager import DgramManager
 from psana.smalldata import SmallData
+from psana.psexp.run_manifest import RunManifest
 
 class InvalidFileType(Exception): pass
 class XtcFileNotFound(Exception): pass
 
+def _read_ahead(fds, nbytes):
+    """ Asks the kernel to start reading the first nbytes of files. """
+    if not hasattr(os, 'posix_fadvise'): return
+    for fd in fds:
+        if fd < 0: continue
+        try:
+            os.posix_fadvise(int(fd), 0, nbytes, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
 class DataSourceBase(abc.ABC):
 
     filter = 0
@@ -25,6 +37,7 @@ class DataSourceBase(abc.ABC):
     shmem = None
     run_dict = {}
     destination = 0
+    prefetch = os.environ.get('PS_RUN_PREFETCH', '0') == '1'
 
     def __init__(self, **kwargs):
         """Initializes datasource base.
@@ -40,12 +53,15 @@ class DataSourceBase(abc.ABC):
         detectors   -- user-selected detector names (for list of names, use detnames cli).
         destination -- callback that takes a timestamp and returns rank no (only works with RunParallel).
         live        -- turns live mode on/off (default is False). 
+        prefetch    -- opens the next run in the background while a run is processed
+                       (default is off, enabled with prefetch=True or PS_RUN_PREFETCH=1;
+                       only for serial and files= modes).
         """
         if kwargs is not None:
             self.smalldata_kwargs = {}
             keywords = ('exp', 'dir', 'files', 'shmem', \
                     'filter', 'batch_size', 'max_events', 'detectors', \
-                    'det_name','destination','live','smalldata_kwargs')
+                    'det_name','destination','live','smalldata_kwargs','prefetch')
             
             for k in keywords:
                 if k in kwargs:
@@ -67,6 +83,41 @@ class DataSourceBase(abc.ABC):
     def runs(self):
         return
 
+    def _prefetch_runs(self, make_run):
+        """ Yields make_run(run_no) for all runs in run_dict.
+
+        With prefetch, run N+1 (files, configs, calibration constants) is
+        created in a background thread while run N is processed and the
+        first smd chunk of its files is read ahead. Leaving runs() early
+        does not wait for the next run: it is cancelled if not started yet,
+        or else finished (incl. its calibration fetch) by the worker thread
+        and dropped.
+        """
+        run_nos = list(self.run_dict)
+        if not self.prefetch or len(run_nos) < 2:
+            for run_no in run_nos:
+                yield make_run(run_no)
+            return
+
+        def make_run_ahead(run_no):
+            run = make_run(run_no)
+            dm = run.smd_dm if run.smd_dm else run.dm
+            _read_ahead(dm.fds, int(os.environ.get('PS_SMD_CHUNKSIZE', 0x1000000)))
+            return run
+
+        # One worker keeps runs created in order (run ids are sequential).
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(make_run_ahead, run_nos[0])
+        try:
+            for run_no in run_nos[1:]:
+                run = future.result()
+                future = executor.submit(make_run_ahead, run_no)
+                yield run
+            yield future.result()
+        finally:
+            future.cancel()
+            executor.shutdown(wait=False)
+
     # to be added at a later date...
     #@abc.abstractmethod
     #def steps(self):
@@ -117,6 +168,18 @@ class DataSourceBase(abc.ABC):
                 xtc_dir = os.environ.get('SIT_PSDM_DATA', '/reg/d/psdm')
                 xtc_path = os.path.join(xtc_dir, self.exp[:3], self.exp, 'xtc')
 
+            # With PS_RUN_MANIFEST_DIR, run files and configs of smd files
+            # are kept in a manifest that is reused by later DataSources.
+            # Live runs are still growing so the directories are listed.
+            manifest_dir = os.environ.get('PS_RUN_MANIFEST_DIR')
+            if manifest_dir and not self.live:
+                manifest = RunManifest(xtc_path, manifest_dir)
+                run_list = [self.run_num] if self.run_num > -1 else manifest.runs()
+                for r in run_list:
+                    run_dict[r] = manifest.files(r, detectors=self.detectors)
+                manifest.save()
+                return self.exp, run_dict
+
             # Get a list of runs (or just one run if user specifies it) then
             # setup corresponding xtc_files and smd_files for each run in run_dict
             run_list = []
@@ -146,7 +209,8 @@ class DataSourceBase(abc.ABC):
                              if os.path.isfile(os.path.join(xtc_path, \
                              os.path.basename(smd_file).split('.smd')[0] + '.xtc2'))]
                 all_files = glob.glob(os.path.join(xtc_path, '*r%s-*.xtc2'%(str(r).zfill(4))))
-                other_files = [f for f in all_files if f not in xtc_files]
+                xtc_set = set(xtc_files)
+                other_files = [f for f in all_files if f not in xtc_set]
                 run_dict[r] = (xtc_files, smd_files, other_files)
         
         return self.exp, run_dict
@@ -4,6 +4,7 @@ from psana.psexp.packet_footer import PacketFooter
 import numpy as np
 import os
 from psana.psexp.TransitionId import TransitionId
+from psana.psexp.perf_stats import perf
 
 class EventManager(object):
     """ Return an event from the received smalldata memoryview (view)
@@ -85,8 +86,10 @@ class EventManager(object):
             # dgrams starting from the first offset are stored consecutively
             # in the file. We read a chunk of sum(all dgram sizes) and
             # store in a view.
+            t0 = perf.start('bd_read')
             os.lseek(self.dm.fds[i], offsets[i], 0)
             self.bigdata[i].extend(os.read(self.dm.fds[i], sizes[i]))
+            perf.stop('bd_read', t0, nbytes=int(sizes[i]))
             
     def __iter__(self):
         return self
@@ -104,7 +107,10 @@ class EventManager(object):
             self.cn_events += 1
             if smd_evt.service() == TransitionId.L1Accept:
                 offset_and_size_array = smd_evt.get_offsets_and_sizes()
+                t0 = perf.start('bd_read', every=16) # per-event reads are sampled
                 bd_evt = self.dm.jump(offset_and_size_array[:,0], offset_and_size_array[:,1])
+                if t0:
+                    perf.stop('bd_read', t0, nbytes=int(offset_and_size_array[:,1].sum()))
             else:
                 bd_evt = smd_evt
 
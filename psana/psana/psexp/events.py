@@ -1,5 +1,6 @@
 from psana.psexp.smdreader_manager import SmdReaderManager
 from psana.psexp.event_manager import EventManager, TransitionId
+from psana.psexp.perf_stats import perf
 
 class Events:
     def __init__(self, run, get_smd=0, dm=None):
@@ -19,6 +20,8 @@ class Events:
         evt = next(self._evt_man)
         if evt.service() != TransitionId.L1Accept:
             self.run.esm.update_by_event(evt)
+        else:
+            perf.count('events')
         return evt
 
     def __next__(self):
@@ -45,6 +48,8 @@ class Events:
                 evt = next(self.dm)
                 if evt.service() != TransitionId.L1Accept:
                     self.run.esm.update_by_event(evt)
+                else:
+                    perf.count('events')
                 return evt
             else:
                 # RunSerial - get smd chunk from SmdReader iterator
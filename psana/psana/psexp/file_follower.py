@@ -0,0 +1,100 @@
+import os
+import time
+import select
+import ctypes
+import ctypes.util
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+class FileFollower(object):
+    """ Waits for live xtc2 files to grow.
+
+    A file has new data when its committed size (st_size) is larger
+    than the position the reader has read up to (the current offset of
+    its file descriptor) and than its size when wait() last returned.
+    The latter keeps wait() from returning again and again for unread
+    data that the reader cannot take yet (e.g. its chunk is full while
+    another file is lagging). Growth is waited on with inotify IN_MODIFY
+    events when they are available. Because inotify does not see
+    writes done on other hosts (network filesystems), files are also
+    checked every poll_secs, which is the only mechanism used when
+    inotify cannot be set up.
+    """
+    def __init__(self, fds, filenames=None, poll_secs=None):
+        self.fds = [int(fd) for fd in fds]
+        if poll_secs is None:
+            poll_secs = float(os.environ.get('PS_SMD_POLL_SECS', '0.05'))
+        self.poll_secs = poll_secs
+        self._seen_sizes = [0] * len(self.fds) # sizes when wait() last returned
+        self._inotify_fd = -1
+        if filenames is not None and len(filenames) > 0:
+            self._init_inotify(filenames)
+
+    def _init_inotify(self, filenames):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0: return
+            for filename in filenames:
+                if libc.inotify_add_watch(fd, os.fsencode(str(filename)), IN_MODIFY | IN_CLOSE_WRITE) < 0:
+                    os.close(fd)
+                    return
+            self._inotify_fd = fd
+        except (OSError, AttributeError):
+            self._inotify_fd = -1
+
+    @property
+    def uses_inotify(self):
+        return self._inotify_fd >= 0
+
+    def committed_sizes(self):
+        """ Returns the current size of each file. """
+        return [os.fstat(fd).st_size for fd in self.fds]
+
+    def read_positions(self):
+        """ Returns how far each file has been read. """
+        return [os.lseek(fd, 0, os.SEEK_CUR) for fd in self.fds]
+
+    def has_new_data(self):
+        sizes = self.committed_sizes()
+        for fd, size, seen_size in zip(self.fds, sizes, self._seen_sizes):
+            if size > max(os.lseek(fd, 0, os.SEEK_CUR), seen_size):
+                self._seen_sizes = sizes
+                return True
+        return False
+
+    def _drain(self):
+        try:
+            while os.read(self._inotify_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, timeout):
+        """ Blocks until any file has new data (see has_new_data) or
+        timeout (seconds) expires. Returns True if there's new data.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.has_new_data():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.uses_inotify:
+                ready, _, _ = select.select([self._inotify_fd], [], [], min(remaining, self.poll_secs))
+                if ready: self._drain()
+            else:
+                time.sleep(min(remaining, self.poll_secs))
+
+    def close(self):
+        if self._inotify_fd >= 0:
+            os.close(self._inotify_fd)
+            self._inotify_fd = -1
+
+    def __del__(self):
+        self.close()
@@ -12,6 +12,7 @@ from psana.dgrammanager import DgramManager
 from psana.psexp.envstore_manager import EnvStoreManager
 from psana.psexp.event_manager import TransitionId
 from psana.psexp.node import Smd0, SmdNode, BigDataNode
+from psana.psexp import perf_stats
 
 class InvalidEventBuilderCores(Exception): pass
 
@@ -88,18 +89,22 @@ class RunParallel(Run):
             yield step
 
     def run_node(self):
-        if self.comms._nodetype == 'smd0':
-            Smd0(self)
-        elif self.comms._nodetype == 'smd':
-            smd_node = SmdNode(self)
-            smd_node.run_mpi()
-        elif self.comms._nodetype == 'bd':
-            bd_node = BigDataNode(self)
-            for result in bd_node.run_mpi():
-                yield result
-        elif self.comms._nodetype == 'srv':
-            # tell the iterator to do nothing
-            return
+        try:
+            if self.comms._nodetype == 'smd0':
+                Smd0(self)
+            elif self.comms._nodetype == 'smd':
+                smd_node = SmdNode(self)
+                smd_node.run_mpi()
+            elif self.comms._nodetype == 'bd':
+                bd_node = BigDataNode(self)
+                for result in bd_node.run_mpi():
+                    yield result
+            elif self.comms._nodetype == 'srv':
+                # tell the iterator to do nothing
+                return
+        finally:
+            # also when the user loop breaks out of events()
+            perf_stats.report(self.comms.world_rank, run_no=self.run_no)
 
 
 class MPIDataSource(DataSourceBase):
@@ -135,6 +140,7 @@ class MPIDataSource(DataSourceBase):
 
         self.exp = exp
         self.run_dict = run_dict
+        perf_stats.perf.start_exporter(rank=self.comms.world_rank)
 
 
     def runs(self):
@@ -6,10 +6,15 @@ from psana.psexp.packet_footer import PacketFooter
 from psana.psexp.step import Step
 from psana.psexp.events import Events
 from psana.psexp.event_manager import TransitionId
-from psana.dgram import Dgram
+from psana.psexp.perf_stats import perf
+from psana.psexp.autotune import autotune_enabled, smd0_tuner, batch_tuner
 import os
+import logging
+from collections import deque
 from mpi4py import MPI
 
+logger = logging.getLogger(__name__)
+
 # Setting up group communications
 # Ex. PS_SMD_NODES=3 mpirun -n 13
 #       1   4   7   10
@@ -110,58 +115,87 @@ class Communicators(object):
 
 
 class StepHistory(object):
-    """ Keeps step data and their send history. """
+    """ Keeps step data and their send history.
+
+    Step data are kept as a log of entries, each appended once: a tuple
+    of per-smd-file bytes for Smd0 (as_event=False) or the bytes of a
+    step event (dgrams of all smd files + PacketFooter) for SmdNode.
+    Each client (rank 1 .. client_size-1) has a cursor pointing to the
+    first entry it has not been sent. Entries seen by all clients are
+    dropped from the log.
+    """
     def __init__(self, client_size, n_smds):
         self.n_smds = n_smds
-        self.bufs = []
-        for i in range(self.n_smds):
-            self.bufs.append(bytearray())
-        self.send_history = []
-        # Initialize no. of sent bytes to 0 for clients
-        # [[offset_update0, offset_update1, ], [offset_update0, offset_update1, ], ...]
-        # [ -----------client 0------------- ,  ----------- client 1------------ ,
-        for i in range(1, client_size):
-            self.send_history.append(np.zeros(self.n_smds, dtype=np.int))
+        self.entries = []
+        self.base = 0 # no. of entries dropped from the log
+        # Absolute index of the next unsent entry for clients
+        # [client 1, client 2, ...] (rank 0 has no send history).
+        self.cursors = np.zeros(max(client_size - 1, 0), dtype=np.int64)
+
+    @property
+    def n_entries(self):
+        return self.base + len(self.entries)
+
+    def _missing(self, client_id, stop=None):
+        """ Returns unsent entries of this client (up to absolute index
+        stop) then marks them as sent. """
+        idx = client_id - 1 # rank 0 has no send history.
+        if stop is None: stop = self.n_entries
+        missing = self.entries[self.cursors[idx] - self.base:stop - self.base]
+        self.cursors[idx] = stop
+        self._compact()
+        return missing
+
+    def cursor(self, client_id):
+        """ Returns absolute index of the first entry not sent to this client. """
+        return int(self.cursors[client_id - 1])
+
+    def _compact(self):
+        n_seen = int(self.cursors.min()) - self.base if self.cursors.size else len(self.entries)
+        if n_seen > 0:
+            del self.entries[:n_seen]
+            self.base += n_seen
 
     def extend_buffers(self, views, client_id, as_event=False):
-        idx = client_id - 1 # rank 0 has no send history.
+        """ Appends step data already sent to (included in data for) this client. """
         # Views is either list of smdchunks or events
+        n_before = self.n_entries
         if not as_event:
             # For Smd0
-            for i_smd, view in enumerate(views):
-                self.bufs[i_smd].extend(view)
-                self.send_history[idx][i_smd] += view.nbytes
+            if any(memoryview(view).nbytes for view in views):
+                self.entries.append(tuple(bytes(view) for view in views))
         else:
             # For EventBuilder
-            for i_evt, evt_bytes in enumerate(views):
-                pf = PacketFooter(view=evt_bytes)
-                assert pf.n_packets == self.n_smds
-                for i_smd, dg_bytes in enumerate(pf.split_packets()):
-                    self.bufs[i_smd].extend(dg_bytes)
-                    self.send_history[idx][i_smd] += dg_bytes.nbytes
-    
-    def update_history(self, views, client_id):
+            for evt_bytes in views:
+                self.entries.append(bytes(evt_bytes))
+        self.update_history(self.n_entries - n_before, client_id)
+
+    def append_events(self, views):
+        """ Appends step events not sent to any client yet (SmdNode, for
+        the step events of a queued batch). """
+        for evt_bytes in views:
+            self.entries.append(bytes(evt_bytes))
+
+    def update_history(self, n_entries, client_id):
         indexed_id = client_id - 1 # rank 0 has no send history.
-        for i, view in enumerate(views):
-            self.send_history[indexed_id][i] += view.nbytes
+        self.cursors[indexed_id] += n_entries
+        self._compact()
 
     def get_buffer(self, client_id):
-        """ Returns new step data (if any) for this client
-        then updates the sent record."""
-        views = []
-        
-        if self.n_smds: # do nothing if no step data found
-            indexed_id = client_id - 1 # rank 0 has no send history.
-            views = [bytearray() for i in range(self.n_smds)]
-            for i, buf in enumerate(self.bufs):
-                current_buf = self.bufs[i]
-                current_offset = self.send_history[indexed_id][i]
-                current_buf_size = memoryview(current_buf).nbytes
-                if current_offset < current_buf_size:
-                    views[i].extend(current_buf[current_offset:])
-                    self.send_history[indexed_id][i] = current_buf_size
-        
-        return views
+        """ Returns new step data (if any) for this client, one view per
+        smd file, then updates the sent record (for Smd0)."""
+        if not self.n_smds: return [] # do nothing if no step data found
+        missing = self._missing(client_id)
+        if not missing: return []
+        if len(missing) == 1:
+            return [memoryview(buf) for buf in missing[0]]
+        return [memoryview(b''.join(bufs)) for bufs in zip(*missing)]
+
+    def get_events(self, client_id, stop=None):
+        """ Returns new step events (if any, up to absolute index stop) for
+        this client then updates the sent record (for SmdNode)."""
+        if not self.n_smds: return []
+        return [memoryview(evt) for evt in self._missing(client_id, stop)]
 
 def repack_for_eb(smd_chunk, step_views, configs):
     """ Smd0 uses this to prepend missing step views
@@ -173,7 +207,8 @@ def repack_for_eb(smd_chunk, step_views, configs):
         new_chunk_pf = PacketFooter(n_packets=smd_chunk_pf.n_packets)
         new_chunk = bytearray()
         for i, (smd_view, step_view) in enumerate(zip(smd_chunk_pf.split_packets(), step_views)):
-            new_chunk.extend(step_view+bytearray(smd_view))
+            new_chunk.extend(step_view)
+            new_chunk.extend(smd_view)
             new_chunk_pf.set_size(i, memoryview(step_view).nbytes + smd_view.nbytes)
         new_chunk.extend(new_chunk_pf.footer)
         return new_chunk
@@ -181,44 +216,25 @@ def repack_for_eb(smd_chunk, step_views, configs):
         return smd_chunk 
 
 
-def repack_for_bd(smd_batch, step_views, configs, client=-1):
-    """ EventBuilder Node uses this to prepend missing step views 
+def repack_for_bd(smd_batch, step_events, configs, client=-1):
+    """ EventBuilder Node uses this to prepend missing step events
     to the smd_batch. Unlike repack_for_eb (used by Smd0), this output 
     chunk contains list of pre-built events."""
-    if step_views:
+    if step_events:
         batch_pf = PacketFooter(view=smd_batch)
-        
-        # Create bytearray containing a list of events from step_views 
-        steps = bytearray()
-        n_smds = len(step_views)
-        offsets = np.zeros(n_smds, dtype=np.int) 
-        n_steps = 0
-        step_sizes = []
-        while offsets[0] < memoryview(step_views[0]).nbytes:
-            step_pf = PacketFooter(n_packets=n_smds)
-            step_size = 0
-            for i, (config, view) in enumerate(zip(configs, step_views)):
-                d = Dgram(config=config, view=view, offset=offsets[i])
-                steps.extend(d)
-                offsets[i] += d._size
-                step_size += d._size
-                step_pf.set_size(i, d._size)
-            
-            steps.extend(step_pf.footer)
-            step_sizes.append(step_size + memoryview(step_pf.footer).nbytes)
-            n_steps += 1
+        n_steps = len(step_events)
         
         # Create new batch with total_events = smd_batch_events + step_events 
         new_batch_pf = PacketFooter(n_packets = batch_pf.n_packets + n_steps)
-        for i in range(n_steps):
-            new_batch_pf.set_size(i, step_sizes[i])
+        new_batch = bytearray()
+        for i, step_event in enumerate(step_events):
+            new_batch.extend(step_event)
+            new_batch_pf.set_size(i, memoryview(step_event).nbytes)
         
         for i in range(n_steps, new_batch_pf.n_packets):
             new_batch_pf.set_size(i, batch_pf.get_size(i-n_steps))
 
-        new_batch = bytearray()
-        new_batch.extend(steps)
-        new_batch.extend(smd_batch[:memoryview(smd_batch).nbytes-memoryview(batch_pf.footer).nbytes])
+        new_batch.extend(memoryview(smd_batch)[:memoryview(smd_batch).nbytes-memoryview(batch_pf.footer).nbytes])
         new_batch.extend(new_batch_pf.footer)
         return new_batch
     else:
@@ -233,6 +249,7 @@ class Smd0(object):
         self.smdr_man = SmdReaderManager(run)
         self.run = run
         self.step_hist = StepHistory(self.run.comms.smd_size, len(self.run.configs))
+        self.tuner = smd0_tuner(self.smdr_man.batch_size) if autotune_enabled() else None
         self.run_mpi()
 
     def run_mpi(self):
@@ -249,7 +266,14 @@ class Smd0(object):
             # then send only unseen portion of data to the evtbuilder rank.
             if not smd_chunk: break
 
+            t0 = perf.start('mpi_wait')
+            t_wait = self.tuner.start_wait() if self.tuner else 0
             self.run.comms.smd_comm.Recv(rankreq, source=MPI.ANY_SOURCE)
+            perf.stop('mpi_wait', t0)
+            if self.tuner:
+                # other smd nodes already waiting means they starve
+                queued = int(self.run.comms.smd_comm.Iprobe(source=MPI.ANY_SOURCE))
+                self.smdr_man.batch_size = self.tuner.end_wait(t_wait, queued)
             
             # Check missing steps for the current client
             missing_step_views = self.step_hist.get_buffer(rankreq[0])
@@ -267,6 +291,125 @@ class Smd0(object):
             self.run.comms.smd_comm.Recv(rankreq, source=MPI.ANY_SOURCE)
             self.run.comms.smd_comm.Send(bytearray(), dest=rankreq[0])
 
+        # Node topology is fixed when the communicators are created,
+        # so only recommend a different no. of smd nodes.
+        if self.tuner and self.tuner.idle_fraction > self.tuner.idle_high:
+            logger.info('autotune: Smd0 waited for smd nodes %.0f%% of the time, '
+                        'consider increasing PS_SMD_NODES (now %d)', \
+                        100*self.tuner.idle_fraction, self.run.comms.n_smd_nodes)
+
+class DestinationScheduler(object):
+    """ Queues destination-routed batches of an SmdNode per bigdata rank.
+
+    Batches are appended to the queue of their destination and sent when
+    that rank asks for work, so one slow rank does not stop batches for
+    the others from being sent. Queues are bounded: when any queue holds
+    more than PS_DEST_QUEUE_MAX batches, the SmdNode stops building events
+    and serves requests until it is below the bound.
+
+    With PS_DEST_SOFT=1 destinations are treated as hints: a rank asking
+    for work with an empty queue steals the oldest batch of the longest
+    queue if that queue holds at least PS_DEST_STEAL_MIN batches.
+
+    Step events of a batch are added to the step history when the batch is
+    queued, and each queued batch keeps the history position it was built
+    at. A rank is only sent the step events from before its batch, so it
+    never sees step context newer than the events it processes. For the
+    same reason a rank does not steal a batch built before the last one
+    it was sent.
+    """
+    def __init__(self, smd_node, n_bd_nodes):
+        self.node = smd_node
+        self.bd_comm = smd_node.run.comms.bd_comm
+        self.queues = {rank: deque() for rank in range(1, n_bd_nodes + 1)}
+        self.waiting = deque() # ranks that asked for work and got nothing yet
+        self.max_queued = int(os.environ.get('PS_DEST_QUEUE_MAX', 4))
+        self.soft = os.environ.get('PS_DEST_SOFT', '0') == '1'
+        self.steal_min = int(os.environ.get('PS_DEST_STEAL_MIN', 2))
+        self.n_queued = 0
+        self.sent = dict.fromkeys(self.queues, 0)
+        self.stolen = 0
+        self.max_depth = 0
+        self.rankreq = np.empty(1, dtype='i')
+
+    def put(self, smd_batch_dict, step_batch_dict):
+        step_hist = self.node.step_hist
+        for dest_rank, (smd_batch, _) in smd_batch_dict.items():
+            step_batch, _ = step_batch_dict[dest_rank]
+            start = step_hist.n_entries
+            if memoryview(step_batch).nbytes > 0:
+                step_hist.append_events(PacketFooter(view=step_batch).split_packets())
+            queue = self.queues[dest_rank]
+            queue.append((smd_batch, start, step_hist.n_entries))
+            self.n_queued += 1
+            if len(queue) > self.max_depth: self.max_depth = len(queue)
+        self._serve(flush=False)
+
+    def flush(self):
+        """ Sends all queued batches. """
+        self._serve(flush=True)
+
+    def _full(self):
+        return any(len(q) > self.max_queued for q in self.queues.values())
+
+    def _pick(self, rank):
+        """ Returns queue to serve rank from or None. """
+        queue = self.queues[rank]
+        if queue: return queue
+        if self.soft:
+            cursor = self.node.step_hist.cursor(rank)
+            queues = [q for q in self.queues.values() if len(q) >= self.steal_min and q[0][1] >= cursor]
+            if queues:
+                self.stolen += 1
+                perf.count('dest_steal')
+                return max(queues, key=len)
+        return None
+
+    def _send(self, rank, queue):
+        smd_batch, step_start, step_stop = queue.popleft()
+        self.n_queued -= 1
+        self.node._send_batch(rank, smd_batch, step_start, step_stop)
+        self.sent[rank] += 1
+
+    def _dispatch_waiting(self):
+        for _ in range(len(self.waiting)):
+            rank = self.waiting.popleft()
+            queue = self._pick(rank)
+            if queue is None:
+                self.waiting.append(rank)
+            else:
+                self._send(rank, queue)
+
+    def _serve(self, flush):
+        """ Serves requests: blocking while a queue is over the bound
+        (or until all queues are empty when flushing), otherwise only
+        requests that have already arrived.
+        """
+        while True:
+            self._dispatch_waiting()
+            if self.n_queued == 0: return
+            block = flush or self._full()
+            if not block and not self.bd_comm.Iprobe(source=MPI.ANY_SOURCE): return
+            t0 = perf.start('mpi_wait')
+            self.bd_comm.Recv(self.rankreq, source=MPI.ANY_SOURCE)
+            perf.stop('mpi_wait', t0)
+            rank = int(self.rankreq[0])
+            queue = self._pick(rank)
+            if queue is None:
+                self.waiting.append(rank)
+            else:
+                self._send(rank, queue)
+
+    def report(self):
+        """ Logs imbalance of sent batches over destinations. """
+        counts = np.array(list(self.sent.values()))
+        if counts.sum() == 0: return
+        imbalance = counts.max() / counts.mean()
+        logger.info('destination scheduler: batches sent per rank min/mean/max=%d/%.1f/%d '
+                    '(imbalance %.2f), max queue depth %d, stolen %d', \
+                    counts.min(), counts.mean(), counts.max(), imbalance, self.max_depth, self.stolen)
+
+
 class SmdNode(object):
     """Handles both smd_0 and bd_nodes
     Receives blocks of smds from smd_0 then assembles
@@ -276,6 +419,8 @@ class SmdNode(object):
         self.run = run
         self.step_hist = StepHistory(self.run.comms.bd_size, len(self.run.configs))
         self.waiting_bds = []
+        # batches for specific destinations are not resized
+        self.tuner = batch_tuner(run.batch_size) if autotune_enabled() and not run.destination else None
 
     def pack(self, *args):
         pf = PacketFooter(len(args))
@@ -286,19 +431,15 @@ class SmdNode(object):
         batch += pf.footer
         return batch
 
-    def _send_to_dest(self, dest_rank, smd_batch_dict, step_batch_dict, eb_man):
+    def _send_batch(self, dest_rank, smd_batch, step_start, step_stop):
+        """ Sends a queued batch with the step events from before it
+        (history entries up to step_start) that dest_rank has not seen. The
+        batch itself holds entries step_start to step_stop. """
         bd_comm = self.run.comms.bd_comm
-        smd_batch, _ = smd_batch_dict[dest_rank]
-        missing_step_views = self.step_hist.get_buffer(dest_rank)
-        batch = repack_for_bd(smd_batch, missing_step_views, self.run.configs, client=dest_rank)
+        missing_step_events = self.step_hist.get_events(dest_rank, stop=step_start)
+        batch = repack_for_bd(smd_batch, missing_step_events, self.run.configs, client=dest_rank)
         bd_comm.Send(batch, dest=dest_rank)
-        del smd_batch_dict[dest_rank] # done sending
-        
-        step_batch, _ = step_batch_dict[dest_rank]
-        if eb_man.eb.nsteps > 0 and memoryview(step_batch).nbytes > 0:  
-            step_pf = PacketFooter(view=step_batch)
-            self.step_hist.extend_buffers(step_pf.split_packets(), dest_rank, as_event=True)
-        del step_batch_dict[dest_rank] # done adding
+        self.step_hist.update_history(step_stop - step_start, dest_rank)
 
     def run_mpi(self):
         rankreq = np.empty(1, dtype='i')
@@ -306,18 +447,22 @@ class SmdNode(object):
         n_bd_nodes = self.run.comms.bd_comm.Get_size() - 1
         bd_comm    = self.run.comms.bd_comm
         smd_rank   = self.run.comms.smd_rank
+        scheduler  = DestinationScheduler(self, n_bd_nodes) if self.run.destination else None
         
         while True:
+            t0 = perf.start('mpi_wait')
             smd_comm.Send(np.array([smd_rank], dtype='i'), dest=0)
             info = MPI.Status()
             smd_comm.Probe(source=0, status=info)
             count = info.Get_elements(MPI.BYTE)
             smd_chunk = bytearray(count)
             smd_comm.Recv(smd_chunk, source=0)
+            perf.stop('mpi_wait', t0, nbytes=count)
             if not smd_chunk:
                 break
            
             eb_man = EventBuilderManager(smd_chunk, self.run) 
+            if self.tuner: eb_man.batch_size = self.tuner.value
         
             # Build batch of events
             for smd_batch_dict, step_batch_dict  in eb_man.batches():
@@ -326,10 +471,16 @@ class SmdNode(object):
                 if 0 in smd_batch_dict.keys():
                     smd_batch, _ = smd_batch_dict[0]
                     step_batch, _ = step_batch_dict[0]
+                    t0 = perf.start('mpi_wait')
+                    t_wait = self.tuner.start_wait() if self.tuner else 0
                     bd_comm.Recv(rankreq, source=MPI.ANY_SOURCE)
+                    perf.stop('mpi_wait', t0)
+                    if self.tuner:
+                        queued = int(bd_comm.Iprobe(source=MPI.ANY_SOURCE))
+                        eb_man.batch_size = self.tuner.end_wait(t_wait, queued)
                     
-                    missing_step_views = self.step_hist.get_buffer(rankreq[0])
-                    batch = repack_for_bd(smd_batch, missing_step_views, self.run.configs, client=rankreq[0])
+                    missing_step_events = self.step_hist.get_events(rankreq[0])
+                    batch = repack_for_bd(smd_batch, missing_step_events, self.run.configs, client=rankreq[0])
                     bd_comm.Send(batch, dest=rankreq[0])
                     
                     if eb_man.eb.nsteps > 0 and memoryview(step_batch).nbytes > 0:  
@@ -337,33 +488,21 @@ class SmdNode(object):
                         self.step_hist.extend_buffers(step_pf.split_packets(), rankreq[0], as_event=True)
                     
                           
-                # With > 1 dest_rank, start looping until all dest_rank batches
-                # have been sent.
+                # With > 1 dest_rank, queue batches per destination. They
+                # are sent as the destination ranks ask for work.
                 else:
                     # Check if destinations are valid 
                     destinations = np.asarray(list(smd_batch_dict.keys()))
-                    if any(destinations > n_bd_nodes):
+                    if any(destinations > n_bd_nodes) or any(destinations < 1):
                         print(f"Found invalid destination ({destinations}). Must be <= {n_bd_nodes} (#big data nodes)")
                         break
 
-                    while smd_batch_dict:
-                        sent = False
-                        if self.waiting_bds: # Check first if there are bd nodes waiting
-                            copied_waiting_bds = self.waiting_bds[:]
-                            for dest_rank in copied_waiting_bds:
-                                if dest_rank in smd_batch_dict:
-                                    self._send_to_dest(dest_rank, smd_batch_dict, step_batch_dict, eb_man)
-                                    self.waiting_bds.remove(dest_rank)
-                                    sent = True
-                        
-                        if not sent:
-                            bd_comm.Recv(rankreq, source=MPI.ANY_SOURCE)
-                            dest_rank = rankreq[0]
-                            if dest_rank in smd_batch_dict:
-                                self._send_to_dest(dest_rank, smd_batch_dict, step_batch_dict, eb_man)
-                            else:
-                                self.waiting_bds.append(dest_rank)
-                        
+                    scheduler.put(smd_batch_dict, step_batch_dict)
+
+        if scheduler:
+            scheduler.flush()
+            scheduler.report()
+            self.waiting_bds = list(scheduler.waiting)
 
         # Done 
         # - kill idling nodes
@@ -385,12 +524,14 @@ class BigDataNode(object):
         def get_smd():
             bd_comm = self.run.comms.bd_comm
             bd_rank = self.run.comms.bd_rank
+            t0 = perf.start('mpi_wait')
             bd_comm.Send(np.array([bd_rank], dtype='i'), dest=0)
             info = MPI.Status()
             bd_comm.Probe(source=0, tag=MPI.ANY_TAG, status=info)
             count = info.Get_elements(MPI.BYTE)
             chunk = bytearray(count)
             bd_comm.Recv(chunk, source=0)
+            perf.stop('mpi_wait', t0, nbytes=count)
             return chunk
         
         events = Events(self.run, get_smd=get_smd)
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PerfStats(object):
+    """ Per-stage timers and counters of this psana process.
+
+    Each stage keeps [ncalls, ntimed, secs, nbytes, nitems]. Timers can be
+    sampled: start(name, every=n) only reads the clock on every n-th call.
+    stop() records time, bytes and items of timed calls only (callers can
+    skip computing them when start() returned 0) and summary() extrapolates
+    them to all calls. Stages
+    are plain lists updated by the thread that runs the event loop, so no
+    locking is done. Set PS_PERF=0 to switch everything off.
+
+    Stages recorded by psana:
+        smd_read    - SmdReader reading a chunk of smd events (incl. live-mode waits)
+        event_build - building a batch of events from smd chunks
+        mpi_wait    - waiting for a request or data from another rank
+        bd_read     - reading bigdata (nbytes read)
+        events      - events yielded (nitems)
+    """
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get('PS_PERF', '1') != '0'
+        self.enabled = enabled
+        self.stages = {}
+        self._exporter_started = False
+
+    def _stage(self, name):
+        s = self.stages.get(name)
+        if s is None:
+            s = self.stages[name] = [0, 0, 0., 0, 0]
+        return s
+
+    def start(self, name, every=1):
+        """ Returns start time, or 0 when this call is not sampled. """
+        if not self.enabled: return 0.
+        s = self._stage(name)
+        s[0] += 1
+        if every > 1 and s[0] % every: return 0.
+        return time.perf_counter()
+
+    def stop(self, name, t0, nbytes=0, nitems=0):
+        if not self.enabled or not t0: return
+        s = self.stages[name]
+        s[1] += 1
+        s[2] += time.perf_counter() - t0
+        s[3] += nbytes
+        s[4] += nitems
+
+    def count(self, name, nitems=1, nbytes=0):
+        """ Counts items and bytes without timing. """
+        if not self.enabled: return
+        s = self._stage(name)
+        s[0] += 1
+        s[3] += nbytes
+        s[4] += nitems
+
+    def summary(self):
+        """ Returns {stage: {calls, secs, bytes, items}} with sampled stages extrapolated. """
+        out = {}
+        for name, (ncalls, ntimed, secs, nbytes, nitems) in self.stages.items():
+            if ntimed and ntimed < ncalls:
+                scale = ncalls / ntimed
+                secs *= scale
+                nbytes = int(nbytes * scale)
+                nitems = int(nitems * scale)
+            out[name] = {'calls': ncalls, 'secs': secs, 'bytes': nbytes, 'items': nitems}
+        return out
+
+    def reset(self):
+        self.stages = {}
+
+    def start_exporter(self, rank=0):
+        """ Exports stages in Prometheus format on port PS_PROM_PORT+rank
+        (if PS_PROM_PORT is set and prometheus_client is installed).
+        """
+        port = os.environ.get('PS_PROM_PORT')
+        if port is None or self._exporter_started or not self.enabled: return
+        try:
+            from prometheus_client import start_http_server
+            from prometheus_client.core import CounterMetricFamily, REGISTRY
+        except ImportError:
+            logger.warning('PS_PROM_PORT is set but prometheus_client is not installed')
+            return
+
+        stats = self
+        class PerfCollector(object):
+            def collect(self):
+                labels = ['stage', 'rank']
+                fams = {k: CounterMetricFamily('psana_stage_%s' % k, 'psana per-stage %s' % k, labels=labels) \
+                        for k in ('calls', 'secs', 'bytes', 'items')}
+                for name, vals in stats.summary().items():
+                    for k, fam in fams.items():
+                        fam.add_metric([name, str(rank)], vals[k])
+                for fam in fams.values():
+                    yield fam
+
+        REGISTRY.register(PerfCollector())
+        start_http_server(int(port) + rank)
+        self._exporter_started = True
+
+
+perf = PerfStats()
+
+
+def format_table(summaries, ranks=None):
+    """ Returns text table of summaries (list of summary() dicts, one per rank). """
+    if ranks is None: ranks = list(range(len(summaries)))
+    lines = ['%-6s %-12s %10s %12s %14s %12s %10s' % \
+             ('rank', 'stage', 'calls', 'secs', 'bytes', 'items', 'MB/s')]
+    for rank, summary in zip(ranks, summaries):
+        if not summary: continue
+        for name in sorted(summary):
+            v = summary[name]
+            rate = v['bytes'] / v['secs'] / 1e6 if v['secs'] > 0 and v['bytes'] else 0.
+            lines.append('%-6s %-12s %10d %12.6f %14d %12d %10.1f' % \
+                         (rank, name, v['calls'], v['secs'], v['bytes'], v['items'], rate))
+    return '\n'.join(lines)
+
+
+def report(rank=0, run_no=None):
+    """ Reports stages of this process at the end of a run and starts
+    counting again for the next run.
+
+    With PS_PERF_REPORT=1 the summary table is printed. With
+    PS_PERF_REPORT_DIR set, the summary is written to
+    PS_PERF_REPORT_DIR/run_<run_no>/rank_<rank> so that the summaries
+    of all ranks can be merged into one table afterwards with
+
+        python -m psana.psexp.perf_stats PS_PERF_REPORT_DIR
+
+    Not collective: in MPI runs each rank reports its own rows, so a
+    rank that leaves its event loop early does not hold up the others.
+    """
+    if not perf.enabled: return
+    summary = perf.summary()
+    perf.reset()
+    if not summary: return
+    if os.environ.get('PS_PERF_REPORT', '0') == '1':
+        print(format_table([summary], ranks=[rank]))
+        sys.stdout.flush()
+    report_dir = os.environ.get('PS_PERF_REPORT_DIR')
+    if report_dir:
+        write_summary(summary, os.path.join(report_dir, 'run_%s' % run_no), rank)
+
+
+def write_summary(summary, path, rank):
+    """ Writes summary of rank to path/rank_<rank> atomically. """
+    try:
+        os.makedirs(path, exist_ok=True)
+        filename = os.path.join(path, 'rank_%d' % rank)
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(summary, f)
+        os.replace(tmp, filename)
+    except OSError as e:
+        logger.warning('cannot write perf summary to %s: %s', path, e)
+
+
+def merge_summaries(path):
+    """ Returns (ranks, summaries) of the rank_<rank> files in path. """
+    ranks, summaries = [], []
+    names = [name for name in os.listdir(path) if name.startswith('rank_') and name[5:].isdigit()]
+    for name in sorted(names, key=lambda name: int(name[5:])):
+        with open(os.path.join(path, name)) as f:
+            summaries.append(json.load(f))
+        ranks.append(int(name[5:]))
+    return ranks, summaries
+
+
+def main(argv=None):
+    """ Prints the merged table of each run in PS_PERF_REPORT_DIR. """
+    import argparse
+    parser = argparse.ArgumentParser(description='Merges per-rank psana perf summaries')
+    parser.add_argument('report_dir', help='PS_PERF_REPORT_DIR of the job')
+    args = parser.parse_args(argv)
+    for name in sorted(os.listdir(args.report_dir)):
+        path = os.path.join(args.report_dir, name)
+        if not name.startswith('run_') or not os.path.isdir(path): continue
+        ranks, summaries = merge_summaries(path)
+        print(name)
+        print(format_table(summaries, ranks=ranks))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ from psana.psexp.packet_footer import PacketFooter
 from psana.psexp.step import Step
 from psana.psexp.event_manager import TransitionId
 from psana.psexp.events import Events
+from psana.psexp import perf_stats
 from psana.psexp.ds_base import XtcFileNotFound
 import psana.pscalib.calib.MDBWebUtils as wu
 from psana.detector.detector_impl import MissingDet
@@ -282,9 +283,12 @@ class RunSingleFile(Run):
 
     def events(self):
         events = Events(self, dm=self.dm)
-        for evt in events:
-            if evt.service() == TransitionId.L1Accept:
-                yield evt
+        try:
+            for evt in events:
+                if evt.service() == TransitionId.L1Accept:
+                    yield evt
+        finally:
+            perf_stats.report(run_no=self.run_no)
     
     def steps(self):
         """ Generates events between steps. """
@@ -311,9 +315,12 @@ class RunSerial(Run):
         
     def events(self):
         events = Events(self)
-        for evt in events:
-            if evt.service() == TransitionId.L1Accept:
-                yield evt
+        try:
+            for evt in events:
+                if evt.service() == TransitionId.L1Accept:
+                    yield evt
+        finally:
+            perf_stats.report(run_no=self.run_no)
     
     def steps(self):
         """ Generates events between steps. """
@@ -0,0 +1,184 @@
+import os
+import re
+import pickle
+import hashlib
+import logging
+
+from psana.dgrammanager import DgramManager
+
+logger = logging.getLogger(__name__)
+
+# Same file name patterns as *-r*.xtc2 (runs), *rNNNN-*.xtc2 (xtc files)
+# and *rNNNN-s*.smd.xtc2 (smd files) globs of DataSourceBase._setup_xtcs.
+_RUN_RE = re.compile(r'.*-r.*\.xtc2$')
+_XTC_RE = re.compile(r'r(\d{4,})-(?=.*\.xtc2$)')
+_SMD_RE = re.compile(r'r(\d{4,})-s(?=.*\.smd\.xtc2$)')
+
+def scan_run(smd_files, all_files):
+    """ Stats the files of a run.
+
+    Returns manifest entry of the run:
+        smd_files  -- list of smd file names
+        all_files  -- all xtc2 files of the run in xtc directory
+        detectors  -- list of names in the config of each smd file
+                      (None until read_configs is called)
+        configs    -- list of config dgram bytes of each smd file
+                      (None until read_configs is called)
+        stats      -- {file name: (size, mtime_ns)} of all listed files
+    """
+    stats = {}
+    for filename in smd_files + all_files:
+        st = os.stat(filename)
+        stats[filename] = (st.st_size, st.st_mtime_ns)
+
+    return {'smd_files': smd_files, 'all_files': all_files,
+            'detectors': None, 'configs': None, 'stats': stats}
+
+def read_configs(entry):
+    """ Reads configs of smd files of a manifest entry (only needed to
+    filter them by detector)."""
+    detectors, configs = [], []
+    if entry['smd_files']:
+        smd_dm = DgramManager(entry['smd_files'])
+        detectors = [list(config.__dict__.keys()) for config in smd_dm.configs]
+        configs = [bytes(memoryview(config)) for config in smd_dm.configs]
+    entry['detectors'] = detectors
+    entry['configs'] = configs
+
+
+class RunManifest(object):
+    """ Persistent list of runs and their files in one xtc directory.
+
+    Building run_dict of an experiment lists the xtc and smalldata
+    directories and, when asked for detectors, opens the smd files of
+    a run to filter them by detector. The manifest keeps the result in
+    cache_dir/manifest_<hash of xtc_path>.pkl so later DataSources only
+    stat the files. The run list is listed again when the xtc or
+    smalldata directory changes, and an entry is rebuilt when the size
+    or modification time of one of its files changes (e.g. live runs).
+
+    Subclasses can keep the manifest elsewhere by overriding load() and
+    save().
+    """
+    version = 2
+
+    def __init__(self, xtc_path, cache_dir):
+        self.xtc_path = os.path.abspath(xtc_path)
+        self.cache_dir = cache_dir
+        key = hashlib.sha1(self.xtc_path.encode()).hexdigest()[:16]
+        self.filename = os.path.join(cache_dir, 'manifest_%s.pkl' % key)
+        self.dir_mtimes = None
+        self.run_nos = []
+        self.run_files = {}
+        self.entries = {}
+        self.modified = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        if data.get('version') != self.version or data.get('xtc_path') != self.xtc_path:
+            return
+        self.dir_mtimes = data['dir_mtimes']
+        self.run_nos = data['run_nos']
+        self.run_files = data['run_files']
+        self.entries = data['entries']
+
+    def save(self):
+        """ Writes the manifest (if changed) atomically. """
+        if not self.modified: return
+        data = {'version': self.version, 'xtc_path': self.xtc_path, \
+                'dir_mtimes': self.dir_mtimes, 'run_nos': self.run_nos, 'run_files': self.run_files, 'entries': self.entries}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.filename)
+            self.modified = False
+        except OSError as e:
+            logger.warning('cannot write run manifest %s: %s', self.filename, e)
+
+    def _get_dir_mtimes(self):
+        mtimes = []
+        for path in (self.xtc_path, os.path.join(self.xtc_path, 'smalldata')):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _refresh(self):
+        """ Lists xtc and smalldata directories (once, if changed) and
+        indexes their files by run number."""
+        dir_mtimes = self._get_dir_mtimes()
+        if dir_mtimes == self.dir_mtimes: return
+        run_nos = set()
+        run_files = {}
+        for path, pattern in ((self.xtc_path, _XTC_RE), (os.path.join(self.xtc_path, 'smalldata'), _SMD_RE)):
+            try:
+                names = sorted(os.listdir(path))
+            except OSError:
+                continue
+            for name in names:
+                if pattern is _XTC_RE and _RUN_RE.match(name):
+                    run_nos.add(int(os.path.splitext(name)[0].split('-r')[1].split('-')[0]))
+                for run_str in pattern.findall(name):
+                    smd_files, all_files = run_files.setdefault(int(run_str), ([], []))
+                    (all_files if pattern is _XTC_RE else smd_files).append(os.path.join(path, name))
+        self.run_nos = sorted(run_nos)
+        self.run_files = run_files
+        self.dir_mtimes = dir_mtimes
+        self.modified = True
+
+    def runs(self):
+        """ Returns sorted list of run numbers in xtc_path. """
+        self._refresh()
+        return self.run_nos
+
+    def _is_valid(self, entry, smd_files, all_files):
+        if entry['smd_files'] != smd_files or entry['all_files'] != all_files:
+            return False
+        for filename, stat in entry['stats'].items():
+            try:
+                st = os.stat(filename)
+            except OSError:
+                return False
+            if (st.st_size, st.st_mtime_ns) != stat:
+                return False
+        return True
+
+    def entry(self, run_no):
+        """ Returns manifest entry of run_no (see scan_run). """
+        self._refresh()
+        smd_files, all_files = self.run_files.get(run_no, ([], []))
+        entry = self.entries.get(run_no)
+        if entry is None or not self._is_valid(entry, smd_files, all_files):
+            entry = scan_run(smd_files, all_files)
+            self.entries[run_no] = entry
+            self.modified = True
+        return entry
+
+    def files(self, run_no, detectors=None):
+        """ Returns (xtc_files, smd_files, other_files) of run_no. With
+        detectors, only smd files with any of these detectors are kept."""
+        entry = self.entry(run_no)
+        if detectors:
+            if entry['detectors'] is None:
+                read_configs(entry)
+                self.modified = True
+            s1 = set(detectors)
+            smd_files = [smd_file for smd_file, names in zip(entry['smd_files'], entry['detectors']) \
+                        if s1.intersection(names)]
+        else:
+            smd_files = entry['smd_files']
+        all_set = set(entry['all_files'])
+        xtc_files = [os.path.join(self.xtc_path, os.path.basename(smd_file).split('.smd')[0] + '.xtc2') \
+                     for smd_file in smd_files]
+        xtc_files = [xtc_file for xtc_file in xtc_files if xtc_file in all_set]
+        xtc_set = set(xtc_files)
+        other_files = [f for f in entry['all_files'] if f not in xtc_set]
+        return xtc_files, smd_files, other_files
@@ -1,14 +1,19 @@
 from .ds_base import DataSourceBase
 from psana.psexp.run import RunSerial
+from psana.psexp.perf_stats import perf
 
 class SerialDataSource(DataSourceBase):
 
     def __init__(self, *args, **kwargs):
         super(SerialDataSource, self).__init__(**kwargs)
         self.exp, self.run_dict = self._setup_xtcs()
+        perf.start_exporter()
+
+    def _make_run(self, run_no):
+        return RunSerial(self.exp, run_no, self.run_dict[run_no], \
+                    max_events=self.max_events, batch_size=self.batch_size, \
+                    filter_callback=self.filter)
 
     def runs(self):
-        for run_no in self.run_dict:
-            yield RunSerial(self.exp, run_no, self.run_dict[run_no], \
-                        max_events=self.max_events, batch_size=self.batch_size, \
-                        filter_callback=self.filter)
+        for run in self._prefetch_runs(self._make_run):
+            yield run
@@ -0,0 +1,170 @@
+import os
+import threading
+from collections import deque
+import numpy as np
+
+from psana.psexp.TransitionId import TransitionId
+
+# Warning: If XtcData::Dgram ever changes, this function will likely need to change
+def _service(view):
+    iSvc = 2                    # Index of service field, in units of uint32_t
+    return (np.array(view, copy=False).view(dtype=np.uint32)[iSvc] >> 24) & 0x0f
+
+# Warning: If XtcData::Dgram ever changes, this function will likely need to change
+def _dgSize(view):
+    iExt = 5                    # Index of extent field, in units of uint32_t
+    txSize = 3 * 4              # sizeof(XtcData::TransitionBase)
+    return txSize + np.array(view, copy=False).view(dtype=np.uint32)[iExt]
+
+DROP_POLICIES = ('block', 'oldest', 'newest')
+
+class TimestampRing(object):
+    """ Timestamps of the last capacity events (all of them if capacity
+    is None), kept in a numpy array instead of a growing list.
+    """
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self._data = np.zeros(capacity if capacity else 1024, dtype=np.uint64)
+        self._count = 0         # timestamps appended
+
+    def __len__(self):
+        return min(self._count, self.capacity) if self.capacity else self._count
+
+    def append(self, timestamp):
+        if self.capacity:
+            self._data[self._count % self.capacity] = timestamp
+        else:
+            if self._count == len(self._data):
+                self._data = np.concatenate((self._data, np.zeros_like(self._data)))
+            self._data[self._count] = timestamp
+        self._count += 1
+
+    def array(self):
+        """ Returns the timestamps in order (a copy). """
+        if self.capacity and self._count > self.capacity:
+            head = self._count % self.capacity
+            return np.concatenate((self._data[head:], self._data[:head]))
+        return self._data[:self._count].copy()
+
+class ShmemReader(object):
+    """ Gets datagram buffers from a shmem client.
+
+    get() returns (view, index, size) of the next buffer or None when the
+    server has gone. Transitions are copied and their buffer freed right
+    away; L1Accept buffers are freed by the caller (the Dgram made of the
+    view frees it when deleted).
+
+    Each request to the client returns up to batch buffers that are
+    ready. With prefetch > 0, a thread keeps up to prefetch buffers
+    ready ahead of the caller. When they are all waiting, the drop policy
+    decides what happens to the next L1Accept: 'block' waits for the
+    caller (and so holds back the server), 'oldest' frees the oldest
+    waiting L1Accept and 'newest' frees the new one. Transitions are never
+    dropped.
+    """
+    def __init__(self, client, args, batch=1, prefetch=0, drop='block'):
+        assert batch > 0
+        assert drop in DROP_POLICIES, 'drop policy must be one of %s' % (DROP_POLICIES,)
+        self.client = client
+        self.args = args
+        self.batch = batch
+        self.prefetch = prefetch
+        self.drop = drop
+        self.received = 0       # buffers got from the client
+        self.dropped = 0        # L1Accepts freed without being returned
+        self.max_waiting = 0    # most buffers waiting for the caller
+        self._waiting = deque() # (view, index, size, is_transition)
+        self._end = False
+        self._cond = threading.Condition()
+        self._thread = None
+        if prefetch > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _read(self):
+        """ Returns the next batch of ready buffers, an empty list when the
+        server has gone. """
+        items = []
+        for view, index in self.client.get_batch(self.args, self.batch):
+            size = self.args['size']
+            is_transition = _service(view) != TransitionId.L1Accept
+            if is_transition:
+                # Release shmem buffer after copying Transition data
+                barray = bytes(view[:_dgSize(view)])
+                self.client.freeByIndex(index, size)
+                view = memoryview(barray)
+            items.append((view, index, size, is_transition))
+        self.received += len(items)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._read()
+            with self._cond:
+                if not items:
+                    self._end = True
+                    self._cond.notify_all()
+                    return
+                for item in items:
+                    self._put(item)
+                self.max_waiting = max(self.max_waiting, len(self._waiting))
+                self._cond.notify_all()
+
+    def _put(self, item):
+        # called with the condition held
+        while len(self._waiting) >= self.prefetch:
+            if item[3] or self.drop == 'block':
+                self._cond.wait()
+            elif self.drop == 'newest':
+                self._free(item)
+                return
+            else:
+                oldest = next((i for i, waiting in enumerate(self._waiting) if not waiting[3]), None)
+                if oldest is None:
+                    self._cond.wait()
+                else:
+                    self._free(self._waiting[oldest])
+                    del self._waiting[oldest]
+        self._waiting.append(item)
+
+    def _free(self, item):
+        view, index, size, is_transition = item
+        self.client.freeByIndex(index, size)
+        self.dropped += 1
+
+    def get(self):
+        if self._thread is None:
+            if not self._waiting and not self._end:
+                self._waiting.extend(self._read())
+                self.max_waiting = max(self.max_waiting, len(self._waiting))
+                self._end = not self._waiting
+            if not self._waiting:
+                return None
+            return self._waiting.popleft()[:3]
+
+        with self._cond:
+            while not self._waiting and not self._end:
+                self._cond.wait()
+            if not self._waiting:
+                return None
+            item = self._waiting.popleft()
+            self._cond.notify_all()
+            return item[:3]
+
+    def stats(self):
+        return {'received': self.received, 'dropped': self.dropped,
+                'waiting': len(self._waiting), 'max_waiting': self.max_waiting}
+
+def shmem_reader_options():
+    """ Returns ShmemReader keyword arguments and the timestamp ring
+    capacity from the environment:
+
+        PS_SHMEM_BATCH      -- most buffers got from shmem at once (default 8)
+        PS_SHMEM_PREFETCH   -- buffers prefetched by a thread (default 0, no thread)
+        PS_SHMEM_DROP       -- block, oldest or newest (default block)
+        PS_SHMEM_TIMESTAMPS -- timestamps of the last events kept (default 100000)
+    """
+    opts = {'batch'   : int(os.environ.get('PS_SHMEM_BATCH', '8')),
+            'prefetch': int(os.environ.get('PS_SHMEM_PREFETCH', '0')),
+            'drop'    : os.environ.get('PS_SHMEM_DROP', 'block')}
+    return opts, int(os.environ.get('PS_SHMEM_TIMESTAMPS', '100000'))
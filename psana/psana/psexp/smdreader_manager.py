@@ -1,6 +1,8 @@
 from psana.smdreader import SmdReader
 from psana.psexp.packet_footer import PacketFooter
 from psana.eventbuilder import EventBuilder
+from psana.psexp.file_follower import FileFollower
+from psana.psexp.perf_stats import perf
 import os, time
 
 class BatchIterator(object):
@@ -33,8 +35,10 @@ class BatchIterator(object):
         # while updating offsets of each smd memoryview
         if not self.eb: raise StopIteration
 
+        t0 = perf.start('event_build')
         batch_dict, step_dict = self.eb.build(batch_size=self.batch_size, filter_fn=self.filter_fn, \
                 destination=self.destination)
+        perf.stop('event_build', t0, nitems=self.eb.nevents)
         if self.eb.nevents == 0 and self.eb.nsteps == 0: raise StopIteration
         return batch_dict, step_dict
 
@@ -54,6 +58,7 @@ class SmdReaderManager(object):
         self.smdr = SmdReader(run.smd_dm.fds, self.chunksize)
         self.processed_events = 0
         self.got_events = -1
+        self.follower = None # created when live data are waited for the first time
 
     def __iter__(self):
         return self
@@ -67,7 +72,7 @@ class SmdReaderManager(object):
         to read this amount of events (see how_many is being set below).
         """
         max_retries = int(os.environ.get('PS_SMD_MAX_RETRIES', '5'))
-        sleep_secs = int(os.environ.get('PS_SMD_SLEEP_SECS', '1'))
+        sleep_secs = float(os.environ.get('PS_SMD_SLEEP_SECS', '1'))
 
         how_many = self.batch_size
         if self.run.max_events:
@@ -75,18 +80,30 @@ class SmdReaderManager(object):
             if to_be_read < how_many:
                 how_many = to_be_read
         
+        t0 = perf.start('smd_read')
         self.smdr.get(how_many)
         
-        cn_retries = 0
-        while self.smdr.got_events==0:
+        if self.smdr.got_events == 0:
             self.smdr.retry()
-            cn_retries += 1
-            if cn_retries == max_retries:
-                break
-            time.sleep(sleep_secs)
+
+        # Live mode: instead of sleeping between retries, wait until
+        # the files grow (up to the same total time) and retry right away.
+        # A partially written dgram is kept in the buffer by retry() and
+        # reading resumes at the last complete dgram.
+        if self.smdr.got_events == 0 and max_retries > 1:
+            if self.follower is None:
+                self.follower = FileFollower(self.run.smd_dm.fds, filenames=self.run.smd_dm.xtc_files)
+            deadline = time.monotonic() + (max_retries - 1) * sleep_secs
+            while self.smdr.got_events == 0:
+                if not self.follower.wait(deadline - time.monotonic()):
+                    break
+                self.smdr.retry()
 
         self.got_events = self.smdr.got_events
         self.processed_events += self.got_events
+        if perf.enabled:
+            nbytes = sum(memoryview(self.smdr.view(i)).nbytes for i in range(self.n_files) if self.smdr.view(i))
+            perf.stop('smd_read', t0, nbytes=nbytes, nitems=self.got_events)
         
     def __next__(self):
         """
@@ -33,6 +33,7 @@ Usage::
     ind     = hb.bin_index(value, edgemode=0)    # returns bin index [0,nbins) for value. 
     indarr  = hb.bin_indexes(valarr, edgemode=0) # returns array of bin index [0,nbins) for array of values
     hisarr  = hb.bin_count(valarr, edgemode=0)   # returns array of bin counts [0,nbins) for array of values (histogram value per bin)
+    hb.histogram_into(hisarr, valarr, weights=None, edgemode=0) # accumulates bin counts (or weights) in existing array hisarr
     # edgemode - defines what to do with underflow overflow indexes;
     #          = 0 - use indexes  0 and nbins-1 for underflow overflow, respectively
     #          = 1 - use extended indexes -1 and nbins for underflow overflow, respectively
@@ -98,10 +99,11 @@ class HBins() :
         self._indedges   = None 
         self._indcenters = None 
         self._strrange   = None
+        self._set_index_pars()
 
 
     def _set_valid_edges(self, edges) :
-        if not isinstance(edges,(tuple,list,np.array)) :
+        if not isinstance(edges,(tuple,list,np.ndarray)) :
             raise ValueError('Parameter edges is not a tuple or list: '\
                              'edges=%s' % str(edges))
 
@@ -109,7 +111,7 @@ class HBins() :
             raise ValueError('Sequence of edges should have at least two values: '\
                              'edges=%s' % str(edges))
 
-        if not all([isinstance(v,(int, float)) for v in tuple(edges)]) :
+        if not all([isinstance(v,(int, float, np.integer, np.floating)) for v in tuple(edges)]) :
             raise ValueError('Sequence of edges has a wrong type value: '\
                              'edges=%s' % str(edges))
 
@@ -144,6 +146,22 @@ class HBins() :
         self._nbins = nbins
 
 
+    def _set_index_pars(self) :
+        """Pre-computes parameters used by bin_indexes for every call"""
+        self._limit_indexes = {0: self._set_limit_indexes(0), 1: self._set_limit_indexes(1)}
+        e = self.binedges()
+        # variable bins with (nearly) equal widths, e.g. waveform sample times, use arithmetic indexing too;
+        # bin_indexes corrects its estimate by one bin, so edges may deviate from a uniform grid by a fraction of bin
+        e64 = e.astype(np.float64)
+        grid = np.linspace(e64[0], e64[-1], self._nbins+1)
+        self._uniform = self._equalbins or bool(np.all(np.fabs(e64-grid) < 0.25*np.fabs(grid[1]-grid[0])))
+        # the same expression and value type as for equal bins: values are binned in self._vtype
+        self._index_origin = self._edges[0]
+        self._index_factor = float(self._nbins)/(self._edges[-1]-self._edges[0])
+        # searchsorted needs ascending edges
+        self._sortededges = e if self._ascending else -e
+
+
     def edges(self) :
         """Returns input sequence of edges"""
         return self._edges
@@ -260,40 +278,57 @@ class HBins() :
 
 
     def bin_indexes(self, arr, edgemode=0) :
-
-        indmin, indmax = self._set_limit_indexes(edgemode)
+        """Returns array of bin indexes for array of values"""
+        indmin, indmax = self._limit_indexes[edgemode]
+        nbins1 = self._nbins-1
 
         if self._equalbins :
-            factor = float(self._nbins)/(self._edges[-1]-self._edges[0])
-            nbins1 = self._nbins-1
-            nparr = (np.array(arr, dtype=self._vtype)-self._edges[0])*factor
-            ind = np.array(np.floor(nparr), dtype=np.int32)
-            return np.select((ind<0, ind>nbins1), (indmin, indmax), default=ind)
+            nparr = (np.asarray(arr, dtype=self._vtype)-self._index_origin)*self._index_factor
+            ind = np.clip(np.floor(nparr), -1, self._nbins).astype(np.int32)
+
+        elif self._uniform :
+            # arithmetic estimate of a bin in [0,nbins), then corrected by one bin against its edges,
+            # which also moves values beyond the limits (or rounded to nbins) to -1 or nbins
+            vals = np.asarray(arr)
+            e = self._binedges
+            ind = np.clip(np.floor((vals-self._index_origin)*self._index_factor), 0, nbins1).astype(np.int32)
+            if self._ascending :
+                lo, hi = vals < e[ind], vals >= e[ind+1]
+            else :
+                lo, hi = vals > e[ind], vals <= e[ind+1]
+            ind -= lo.astype(np.int32)
+            ind += hi.astype(np.int32)
 
         else :
-            conds = None
-            if self._ascending :
-                conds = np.array([arr<edge for edge in self.binedges()], dtype=np.bool)
-            else :            
-                conds = np.array([arr>edge for edge in self.binedges()], dtype=np.bool)
-
-            inds1d = list(range(-1, self._nbins))
-            inds1d[0] = indmin # re-define index for underflow
-            inds = np.array(len(arr)*inds1d, dtype=np.int32)
-            inds.shape = (len(arr),self._nbins+1)
-            inds = inds.transpose()
-            #print('indmin, indmax = ', indmin, indmax)
-            #print('XXX conds:\n', conds)
-            #print('XXX inds:\n', inds)
-            return np.select(conds, inds, default=indmax)
-
-
-    def bin_count(self, arr) :
-        #indmin, indmax = self._set_limit_indexes(edgemode)
-        edgemode=0
-        indarr = self.bin_indexes(arr.flatten(), edgemode)
-        weights=None
-        return np.bincount(indarr, weights, self.nbins())
+            vals = np.asarray(arr) if self._ascending else -np.asarray(arr)
+            ind = np.searchsorted(self._sortededges, vals, side='right').astype(np.int32) - 1
+
+        ind[ind<0] = indmin
+        ind[ind>nbins1] = indmax
+        return ind
+
+
+    def bin_count(self, arr, edgemode=0) :
+        """Returns array of bin counts [0,nbins) for array of values"""
+        hisarr = np.zeros(self.nbins(), dtype=np.int64)
+        self.histogram_into(hisarr, arr, edgemode=edgemode)
+        return hisarr
+
+
+    def histogram_into(self, out, values, weights=None, edgemode=0) :
+        """Accumulates number of entries (or sum of weights) per bin for array of values in array out.
+           - out - existing array of size nbins, which is updated in place and returned
+           - edgemode=0 - underflow/overflow values are counted in the first/last bin,
+           - edgemode=1 - underflow/overflow values are dropped.
+        """
+        ind = self.bin_indexes(np.ravel(values), edgemode)
+        w = None if weights is None else np.ravel(weights)
+        if edgemode==1 :
+            sel = (ind>-1) & (ind<self._nbins)
+            ind = ind[sel]
+            if w is not None : w = w[sel]
+        out += np.bincount(ind, w, self._nbins).astype(out.dtype, copy=False)
+        return out
 
 
     def set_bin_data(self, data, dtype=np.float) :
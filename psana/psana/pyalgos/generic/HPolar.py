@@ -14,6 +14,14 @@ Usage::
     # --------------
     hp = HPolar(xarr, yarr, mask=None, radedges=None, nradbins=100, phiedges=(0,360), nphibins=32)
 
+    # Sparse matrix integrator with pixel splitting, corrections and disk cache
+    hs = HPolarSparse(xarr, yarr, mask=None, radedges=None, nradbins=100, phiedges=(0,360), nphibins=32,
+                      pix_size=109.92, nsplit=4, zarr=z, polarization=True, solid_angle=True, cachedir='./hpolar-cache')
+    arr1d = hs.bin_avrg(nda)           # for single frame
+    arr2d = hs.bin_avrg(frames)        # for stack of frames (nframes, ...) -> (nframes, ntbins)
+    arr2d = hs.bin_avrg_rad_phi(nda, do_transp=True)
+    prof  = hs.radial_profile(frames)  # (nframes, nradbins)
+
     # Access methods
     # --------------
     orb   = hp.obj_radbins() # returns HBins object for radial bins
@@ -49,6 +57,7 @@ Usage::
 See:
   - :py:class:`HBins`
   - :py:class:`HPolar`
+  - :py:class:`HPolarSparse`
   - :py:class:`HSpectrum`
   - :py:class:`RadialBkgd`
   - `Radial background <https://confluence.slac.stanford.edu/display/PSDMInternal/Radial+background+subtraction+algorithm>`_.
@@ -60,7 +69,9 @@ Created in 2015 by Mikhail Dubrovin
 """
 #------------------------------
 
+import os
 import math
+import hashlib
 import numpy as np
 from psana.pyalgos.generic.HBins import HBins
 
@@ -341,6 +352,179 @@ class HPolar() :
         grid_vals = self.griddata(points, values, (self.phi, self.rad), method=method)
         return np.select((self.iseq<self.ntbins,), (grid_vals,), default=subs_value)
 
+#------------------------------
+
+class HPolarSparse() :
+    def __init__(self, xarr, yarr, mask=None, radedges=None, nradbins=100, phiedges=(0,360), nphibins=32,\
+                 pix_size=None, nsplit=4, zarr=None, polarization=True, solid_angle=True, cachedir=None) :
+        """Azimuthal integrator which keeps r-phi binning as a sparse (CSR) matrix.
+
+           Each pixel is split in nsplit*nsplit sub-pixels between its corners (center -/+ pix_size/2),
+           so that a pixel crossing bin borders contributes to every bin in proportion to its covered area.
+           Per-pixel polarization and solid angle corrections are folded into the matrix weights,
+           so averaged r-phi intensities for a stack of frames are obtained by a single sparse matrix product.
+
+           Parameters (in addition to HPolar)
+           - pix_size - pixel size (scalar or (size_x, size_y)) in xarr units; None - no pixel splitting
+           - nsplit   - number of pixel sub-divisions along each axis
+           - zarr     - n-d array or scalar of pixel z coordinates in xarr units; None - no corrections
+           - polarization, solid_angle - apply polarization and solid angle corrections if zarr is defined
+           - cachedir - directory to save/load matrix, file name is defined by the hash of geometry and parameters;
+                        default None - no cache
+        """
+        self.shapeflat = (np.asarray(xarr).size,)
+        x = np.asarray(xarr, dtype=np.float64).reshape(self.shapeflat)
+        y = np.asarray(yarr, dtype=np.float64).reshape(self.shapeflat)
+        m = None if mask is None else np.asarray(mask).reshape(self.shapeflat) != 0
+        z = None if zarr is None else np.broadcast_to(np.asarray(zarr, dtype=np.float64).flatten(), self.shapeflat)
+        if pix_size is None : nsplit = 1
+
+        # binning is defined exactly as in HPolar
+        rad, phi0 = cart2polar(x, y)
+        self.phimin = min(phiedges[0], phiedges[-1])
+        self.rb = HBins(self._rad_limits(rad, radedges), nradbins)
+        if phiedges[-1] > phiedges[0]+360\
+        or phiedges[-1] < phiedges[0]-360:
+            raise ValueError('Difference between angular edges should not exceed 360 degree;'\
+                             ' phiedges: %.0f, %.0f' % (phiedges[0], phiedges[-1]))
+        self.pb = HBins(phiedges, nphibins)
+        self.ntbins = self.pb.nbins()*self.rb.nbins()
+
+        fname = None
+        if cachedir is not None :
+            fname = os.path.join(cachedir, 'hpolar-%s.npz' % self._hash(x, y, m, z, pix_size, nsplit,\
+                                 polarization, solid_angle))
+            if os.path.exists(fname) :
+                self._load(fname)
+                return
+
+        self._make_matrix(x, y, m, z, pix_size, nsplit, polarization, solid_angle)
+
+        if fname is not None :
+            self._save(fname)
+
+
+    def _rad_limits(self, rad, radedges) :
+        rmin = math.floor(np.amin(rad)) if radedges is None else radedges[0]
+        rmax = math.ceil (np.amax(rad)) if radedges is None else radedges[-1]
+        if rmin<1 : rmin = 1
+        return rmin, rmax
+
+
+    def _hash(self, *args) :
+        h = hashlib.sha1()
+        pars = (self.rb.edges(), self.pb.edges())
+        for a in args + pars :
+            if isinstance(a, np.ndarray) : h.update(np.ascontiguousarray(a).tobytes())
+            else : h.update(repr(a).encode())
+        return h.hexdigest()
+
+
+    def _save(self, fname) :
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        tmpname = '%s-%d.tmp.npz' % (fname[:-4], os.getpid())
+        m = self.matrix
+        np.savez(tmpname, data=m.data, indices=m.indices, indptr=m.indptr, shape=m.shape,\
+                 npix_per_bin=self.npix_per_bin)
+        os.replace(tmpname, fname) # atomic for concurrent jobs with the same geometry
+
+
+    def _load(self, fname) :
+        from scipy import sparse
+        with np.load(fname) as f :
+            self.matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            self.npix_per_bin = f['npix_per_bin']
+
+
+    def _make_matrix(self, x, y, mask, z, pix_size, nsplit, polarization, solid_angle, chunk=1<<18) :
+        """Sets CSR matrix[ntbins, npixels] of normalized pixel weights and number of pixels per bin."""
+        from scipy import sparse
+        npix = x.size
+        corr = np.ones(npix, dtype=np.float64)
+        if z is not None :
+            rad, phi = cart2polar(x, y)
+            if polarization : corr *= polarization_factor(rad, phi, z)
+            if solid_angle :
+                cos_theta = z / np.sqrt(x*x + y*y + z*z)
+                corr *= 1./(cos_theta*cos_theta*cos_theta)
+        if mask is not None : corr[~mask] = 0
+
+        # sub-pixel offsets from pixel center in units of pixel size
+        sx, sy = (0., 0.) if pix_size is None else np.broadcast_to(np.asarray(pix_size, dtype=np.float64), (2,))
+        offs = (np.arange(nsplit) + 0.5)/nsplit - 0.5
+        dx, dy = np.meshgrid(offs*sx, offs*sy)
+        dx, dy = dx.ravel(), dy.ravel()
+        frac = 1./dx.size
+
+        nrbins = self.rb.nbins()
+        npbins = self.pb.nbins()
+        matrix = sparse.csr_matrix((self.ntbins, npix), dtype=np.float64)
+        for begin in range(0, npix, chunk) :
+            end = min(begin + chunk, npix)
+            ipix = np.arange(begin, end)
+            xs = (x[begin:end,None] + dx[None,:]).ravel()
+            ys = (y[begin:end,None] + dy[None,:]).ravel()
+            rad, phi0 = cart2polar(xs, ys)
+            phi = np.where(phi0<self.phimin, phi0+360., phi0)
+            irad = self.rb.bin_indexes(rad, edgemode=1)
+            iphi = self.pb.bin_indexes(phi, edgemode=1)
+            cols = np.repeat(ipix, dx.size)
+            cond = (irad > -1) & (irad < nrbins) & (iphi > -1) & (iphi < npbins) & (corr[cols] != 0)
+            rows = iphi[cond]*nrbins + irad[cond]
+            matrix = matrix + sparse.csr_matrix((np.full(rows.size, frac), (rows, cols[cond])),\
+                                                shape=(self.ntbins, npix))
+
+        # matrix of pixel fractions gives the (fractional) number of pixels per bin
+        npix_per_bin = np.asarray(matrix.sum(axis=1)).ravel()
+        norm = divide_protected(np.ones_like(npix_per_bin), npix_per_bin)
+        matrix = sparse.diags(norm) @ matrix @ sparse.diags(corr)
+        matrix = matrix.tocsr()
+        matrix.eliminate_zeros()
+        self.matrix = matrix
+        self.npix_per_bin = npix_per_bin
+
+
+    def obj_radbins(self) :
+        """Returns HBins object for radial bins."""
+        return self.rb
+
+
+    def obj_phibins(self) :
+        """Returns HBins object for angular bins."""
+        return self.pb
+
+
+    def bin_number_of_pixels(self) :
+        """Returns 1-d numpy array of (fractional) number of accounted pixels per bin."""
+        return self.npix_per_bin
+
+
+    def bin_avrg(self, nda) :
+        """Returns averaged in r-phi bin intensities for input array nda.
+           - nda - single frame (any shape with npixels elements) -> 1-d array of ntbins,
+                   or stack of frames of shape (nframes, ...) -> 2-d array (nframes, ntbins).
+        """
+        nda = np.asarray(nda)
+        if nda.size == self.shapeflat[0] :
+            return self.matrix @ nda.reshape(self.shapeflat)
+        frames = nda.reshape((-1,) + self.shapeflat)
+        return (self.matrix @ frames.T).T
+
+
+    def bin_avrg_rad_phi(self, nda, do_transp=True) :
+        """Returns (rad,phi) numpy array of averaged in bin intensity for single frame,
+           or (nframes,rad,phi) for stack of frames.
+        """
+        avrg = self.bin_avrg(nda)
+        shape = (self.pb.nbins(), self.rb.nbins())
+        arr = avrg.reshape(avrg.shape[:-1] + shape)
+        return np.swapaxes(arr, -1, -2) if do_transp else arr
+
+
+    def radial_profile(self, nda) :
+        """Returns radial profile(s) averaged over all phi bins for single frame or stack of frames."""
+        return self.bin_avrg_rad_phi(nda, do_transp=False).mean(axis=-2)
+
 #------------------------------
 #------------------------------
 #----------- TEST -------------
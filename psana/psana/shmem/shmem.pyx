@@ -1,8 +1,11 @@
 
+from libc.stdlib cimport malloc, free as c_free
+
 cdef extern from "psalg/shmem/ShmemClient.hh" namespace "psalg::shmem":
     cdef cppclass ShmemClient:
         int connect(const char* tag, int tr_index)
         void *get(int& ev_index, int& buf_size)
+        int get(void** bufs, int* ev_indices, int& buf_size, int max_count) nogil
         void free(int ev_index, int buf_size)
 
 cdef class PyShmemClient:
@@ -42,6 +45,33 @@ cdef class PyShmemClient:
 
         return cview
 
+    def get_batch(self, args, int max_count):
+        """ Waits for a buffer, then returns [(view, index)] of up to
+        max_count buffers that are ready (a transition ends the batch).
+        An empty list means the server has gone.
+        """
+        cdef void** bufs = <void**>malloc(max_count*sizeof(void*))
+        cdef int* indices = <int*>malloc(max_count*sizeof(int))
+        cdef int buf_size = 0
+        cdef int n = 0
+        cdef char[:] cview
+        try:
+            # without the GIL, so that a prefetch thread can wait here
+            with nogil:
+                n = self.client.get(bufs, indices, buf_size, max_count)
+
+            args['size'] = buf_size
+            args['cli_cptr'] = self.pclient
+
+            views = []
+            for i in range(n):
+                cview = <char[:buf_size]><char*>bufs[i]
+                views.append((cview, indices[i]))
+            return views
+        finally:
+            c_free(bufs)
+            c_free(indices)
+
     def free(self,dgram):
         self.client.free(dgram._shmem_index,dgram._shmem_size)
 
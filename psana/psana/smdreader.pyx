@@ -85,8 +85,17 @@ cdef class SmdReader:
         return self.max_ts
     
     def retry(self):
-        self.prl_reader._reset_buffers(self.prl_reader.bufs)
+        """ Reads again after the files have grown.
+
+        Unlike _reset_buffers, keeps got and offset so that bytes of a
+        partially written dgram stay in the buffer and reading resumes
+        at the last complete dgram.
+        """
         cdef int i
+        cdef Buffer* buf
         for i in range(self.prl_reader.nfiles):
-            self.prl_reader.bufs[i].needs_reread = 1
+            buf = &(self.prl_reader.bufs[i])
+            buf.nevents = 0
+            buf.timestamp = 0
+            buf.needs_reread = 1
         self.get()
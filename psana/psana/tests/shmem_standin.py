@@ -0,0 +1,238 @@
+"""
+Stand-in for shmemServer and PyShmemClient to exercise and measure
+psana.psexp.shmem_reader without a DAQ: a producer process writes datagram
+headers into a pool of shared memory buffers at a fixed rate and hands
+their indices to the client through a pipe; freed indices go back the
+same way. As with the real server, an event is dropped by the producer when
+no buffer is free (the client is behind), transitions wait for a buffer.
+
+Usage::
+
+    # 50 kHz for 10 s, a consumer taking 30 us per event, 64 buffers prefetched
+    python shmem_standin.py --rate 50000 --seconds 10 --work 30e-6 --prefetch 64 --drop oldest
+
+prints events/s, the drop rates and the RSS of the consumer every second.
+"""
+import os
+import time
+import argparse
+import threading
+from collections import deque
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from psana.psexp.TransitionId import TransitionId
+from psana.psexp.shmem_reader import ShmemReader, TimestampRing, _service
+
+_END = -1
+
+def _pack(indices):
+    return np.asarray(indices, dtype=np.int32).tobytes()
+
+def _unpack(message):
+    return np.frombuffer(message, dtype=np.int32).tolist()
+
+def _write(buf, index, size, service, timestamp, payload):
+    header = np.frombuffer(buf, dtype=np.uint32, count=6, offset=index*size)
+    header[:] = (timestamp & 0xffffffff, timestamp >> 32, service << 24, 0, 0, payload)
+    del header
+
+def _produce(name, nbuffers, size, rate, seconds, conn, counts):
+    shm = shared_memory.SharedMemory(name=name)
+    free = list(range(nbuffers))
+    timestamp = 0
+    done = False
+
+    def recycle(block):
+        nonlocal done
+        if block and not free:
+            free.extend(_unpack(conn.recv_bytes()))
+        while conn.poll(0):
+            free.extend(_unpack(conn.recv_bytes()))
+
+    def write(service):
+        nonlocal timestamp
+        timestamp += 1
+        index = free.pop()
+        _write(shm.buf, index, size, service, timestamp, size-24)
+        return index
+
+    # indices are sent once per burst of events, to keep up with high rates
+    recycle(True)
+    conn.send_bytes(_pack([write(TransitionId.Configure)]))
+    t0 = time.monotonic()
+    handled = 0
+    while True:
+        elapsed = time.monotonic() - t0
+        due = min(int(elapsed*rate), int(seconds*rate)) - handled
+        ready = []
+        recycle(False)
+        for i in range(due):
+            if not free:
+                recycle(False)
+                if not free:
+                    # no buffer free: dropped by the server
+                    counts[1] += due - i
+                    break
+            ready.append(write(TransitionId.L1Accept))
+        if ready:
+            conn.send_bytes(_pack(ready))
+            counts[0] += len(ready)
+        handled += due
+        if elapsed >= seconds:
+            break
+        conn.poll(0.0005)               # until a buffer is freed or more events are due
+    recycle(True)
+    conn.send_bytes(_pack([write(TransitionId.EndRun), _END]))
+    # the client frees what it holds until it closes
+    while _END not in _unpack(conn.recv_bytes()):
+        pass
+    shm.close()
+
+class LocalShmemServer(object):
+    """ nbuffers buffers of size bytes, rate L1Accepts/s for seconds between
+    a Configure and an EndRun. """
+    def __init__(self, nbuffers=16, size=4096, rate=1000, seconds=1.):
+        self.nbuffers = nbuffers
+        self.size = size
+        self.shm = shared_memory.SharedMemory(create=True, size=nbuffers*size)
+        self.conn, conn = mp.Pipe()
+        self.counts = mp.Array('q', 2)  # L1Accepts sent, dropped
+        self.process = mp.Process(target=_produce, args=(self.shm.name, nbuffers, size, rate, seconds, conn, self.counts))
+        self.process.start()
+
+    @property
+    def sent(self):
+        return self.counts[0]
+
+    @property
+    def dropped(self):
+        return self.counts[1]
+
+    def client(self):
+        return LocalShmemClient(self)
+
+    def close(self):
+        self.conn.send_bytes(_pack([_END]))
+        self.process.join()
+        self.shm.close()
+        self.shm.unlink()
+
+class LocalShmemClient(object):
+    """ Same interface as psana's PyShmemClient (get, get_batch, freeByIndex). """
+    def __init__(self, server):
+        self.conn = server.conn
+        self.buf = server.shm.buf
+        self.size = server.size
+        self._lock = threading.Lock()   # frees come from the consumer and prefetch threads
+        self._ready = deque()
+        self._end = False
+
+    def _view(self, index):
+        return self.buf[index*self.size:(index+1)*self.size]
+
+    def get_batch(self, args, max_count):
+        args['size'] = self.size
+        args['cli_cptr'] = None
+        views = []
+        while len(views) < max_count:
+            if not self._ready:
+                if self._end or (views and not self.conn.poll(0)):
+                    break
+                self._ready.extend(_unpack(self.conn.recv_bytes()))
+            index = self._ready.popleft()
+            if index == _END:
+                self._end = True
+                break
+            view = self._view(index)
+            views.append((view, index))
+            if _service(view) != TransitionId.L1Accept:
+                break
+        return views
+
+    def get(self, args):
+        views = self.get_batch(args, 1)
+        if views:
+            args['index'] = views[0][1]
+            return views[0][0]
+
+    def freeByIndex(self, index, size):
+        with self._lock:
+            self.conn.send_bytes(_pack([index]))
+
+def rss():
+    """ Resident set size of this process in bytes. """
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def run(rate=1000, seconds=1., nbuffers=16, size=4096, batch=8, prefetch=0, drop='block',
+        work=0., timestamps=100000, interval=1.):
+    """ Consumes the stand-in stream as DgramManager does, spending work
+    seconds per L1Accept, and returns the counts, events/s and RSS samples
+    [(seconds, bytes)]. """
+    server = LocalShmemServer(nbuffers, size, rate, seconds)
+    client = server.client()
+    reader = ShmemReader(client, {}, batch=batch, prefetch=prefetch, drop=drop)
+    ring = TimestampRing(timestamps)
+    services = []
+    rss_samples = []
+    nevents = 0
+    t0 = time.monotonic()
+    t_sample = t0
+    while True:
+        item = reader.get()
+        if item is None:
+            break
+        view, index, size = item
+        header = np.frombuffer(view, dtype=np.uint32, count=6)
+        service = (int(header[2]) >> 24) & 0xf
+        ring.append(int(header[0]) | (int(header[1]) << 32))
+        del header
+        if service == TransitionId.L1Accept:
+            t_end = time.perf_counter() + work
+            while time.perf_counter() < t_end:
+                pass
+            del view
+            client.freeByIndex(index, size)
+            nevents += 1
+        else:
+            services.append(service)
+            del view
+        now = time.monotonic()
+        if now - t_sample >= interval:
+            rss_samples.append((now - t0, rss()))
+            t_sample = now
+    elapsed = time.monotonic() - t0
+    rss_samples.append((elapsed, rss()))
+    server.close()
+    offered = server.sent + server.dropped
+    return {'events': nevents, 'events_per_sec': nevents / elapsed,
+            'sent': server.sent, 'server_dropped': server.dropped, 'reader_dropped': reader.dropped,
+            'drop_rate': (server.dropped + reader.dropped) / max(offered, 1),
+            'transitions': services, 'timestamps': ring.array(),
+            'max_waiting': reader.max_waiting, 'rss': rss_samples}
+
+def main():
+    parser = argparse.ArgumentParser(description='shmem reader benchmark with a local producer stand-in')
+    parser.add_argument('--rate', type=float, default=10000, help='L1Accepts/s [10000]')
+    parser.add_argument('--seconds', type=float, default=5, help='duration [5]')
+    parser.add_argument('--buffers', type=int, default=16, help='shared memory buffers [16]')
+    parser.add_argument('--size', type=int, default=0x80000, help='buffer size [0x80000]')
+    parser.add_argument('--batch', type=int, default=8, help='buffers per get [8]')
+    parser.add_argument('--prefetch', type=int, default=0, help='buffers prefetched by a thread [0]')
+    parser.add_argument('--drop', default='block', help='block, oldest or newest [block]')
+    parser.add_argument('--work', type=float, default=0., help='seconds per event in the consumer [0]')
+    parser.add_argument('--timestamps', type=int, default=100000, help='timestamps kept, 0 for all [100000]')
+    args = parser.parse_args()
+
+    r = run(args.rate, args.seconds, args.buffers, args.size, args.batch, args.prefetch, args.drop,
+            args.work, args.timestamps or None)
+    for t, nbytes in r['rss']:
+        print('%6.1f s  rss %8.1f MB' % (t, nbytes / 1e6))
+    print('events %d  %.0f events/s  sent %d  dropped by server %d, by reader %d (%.2f%%)  max waiting %d' %
+          (r['events'], r['events_per_sec'], r['sent'], r['server_dropped'], r['reader_dropped'],
+           100 * r['drop_rate'], r['max_waiting']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+from psana.psexp.autotune import AutoTuner
+
+def test_autotune():
+    # consumers always queued: producer is the bottleneck, value grows up to vmax
+    tuner = AutoTuner('batch_size', 4, 1, 32, window=2, max_windows=4)
+    for i in range(20):
+        value = tuner.end_wait(tuner.start_wait(), queued=1)
+    assert value == 32
+    assert not tuner.active
+
+    # value is frozen after max_windows
+    tuner = AutoTuner('batch_size', 4, 1, 1000, window=1, max_windows=2)
+    for i in range(10):
+        value = tuner.end_wait(tuner.start_wait(), queued=1)
+    assert value == 16
+
+    # initial value is clipped to the bounds
+    assert AutoTuner('n', 5000, 10, 100).value == 100
+
+if __name__ == "__main__":
+    test_autotune()
@@ -0,0 +1,93 @@
+from collections import deque
+from types import SimpleNamespace
+import pytest
+
+from psana.psexp.node import SmdNode, DestinationScheduler
+from psana.psexp.packet_footer import PacketFooter
+
+class FakeComm(object):
+    """ bd_comm of an SmdNode: requests from bigdata ranks are given in
+    advance, sent batches are recorded. """
+    def __init__(self):
+        self.requests = deque()
+        self.sent = []
+
+    def Iprobe(self, source=None):
+        return bool(self.requests)
+
+    def Recv(self, buf, source=None):
+        assert self.requests, 'SmdNode would wait for a request forever'
+        buf[0] = self.requests.popleft()
+
+    def Send(self, batch, dest=None):
+        self.sent.append((dest, [bytes(v) for v in PacketFooter(view=batch).split_packets()]))
+
+def pack(*events):
+    pf = PacketFooter(len(events))
+    batch = bytearray()
+    for i, evt in enumerate(events):
+        pf.set_size(i, len(evt))
+        batch += evt
+    return batch + pf.footer
+
+def build(**batches):
+    """ One event-builder pass: {rank: (smd_batch, step_batch)} as dicts
+    keyed by destination rank; b'S' events are step transitions. """
+    smd_batch_dict, step_batch_dict = {}, {}
+    for name, events in batches.items():
+        rank = int(name[1:])
+        steps = [evt for evt in events if evt.startswith(b'S')]
+        smd_batch_dict[rank] = (pack(*events), None)
+        step_batch_dict[rank] = (pack(*steps) if steps else bytearray(), None)
+    return smd_batch_dict, step_batch_dict
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    def make(soft=False):
+        monkeypatch.setenv('PS_DEST_SOFT', '1' if soft else '0')
+        monkeypatch.setenv('PS_DEST_STEAL_MIN', '2')
+        comm = FakeComm()
+        run = SimpleNamespace(comms=SimpleNamespace(bd_comm=comm, bd_size=3), configs=[None],
+                              batch_size=1, destination=lambda ts: 1)
+        return DestinationScheduler(SmdNode(run), 2), comm
+    return make
+
+def test_queued_across_builds(scheduler):
+    sched, comm = scheduler()
+    sched.put(*build(r1=[b'L1a'], r2=[b'S1', b'L1b']))
+    sched.put(*build(r1=[b'L1c'], r2=[b'S2', b'L1d']))
+    # rank 2 gets both its batches before rank 1 asks for its first one
+    comm.requests.extend([2, 2, 1, 1])
+    sched.flush()
+    assert comm.sent == [(2, [b'S1', b'L1b']),
+                         (2, [b'S2', b'L1d']),
+                         (1, [b'L1a']),         # no step context from later builds
+                         (1, [b'S1', b'L1c'])]  # only the steps built before it
+
+def test_steal(scheduler):
+    sched, comm = scheduler(soft=True)
+    sched.put(*build(r1=[b'L1a']))
+    sched.put(*build(r1=[b'S1', b'L1b']))
+    sched.put(*build(r1=[b'L1c']))
+    comm.requests.extend([2, 2, 1])
+    sched.flush()
+    assert comm.sent == [(2, [b'L1a']),
+                         (2, [b'S1', b'L1b']),
+                         (1, [b'S1', b'L1c'])]
+    assert sched.stolen == 2
+    assert sched.node.step_hist.cursor(1) == sched.node.step_hist.cursor(2) == 1
+
+def test_no_steal_of_older_batch(scheduler):
+    sched, comm = scheduler(soft=True)
+    sched.put(*build(r1=[b'L1a']))
+    sched.put(*build(r1=[b'L1b'], r2=[b'S1', b'L1x']))
+    sched.put(*build(r1=[b'L1c']))
+    # rank 2 has seen S1: the older batches of rank 1 stay with rank 1
+    comm.requests.extend([2, 2, 1, 1, 1])
+    sched.flush()
+    assert comm.sent == [(2, [b'S1', b'L1x']),
+                         (1, [b'L1a']),
+                         (1, [b'L1b']),
+                         (1, [b'S1', b'L1c'])]
+    assert sched.stolen == 0
+    assert list(sched.waiting) == [2]
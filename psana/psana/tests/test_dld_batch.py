@@ -0,0 +1,69 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# only built if the roentdek software exists, as in test_psalg.py
+roentdek_found = os.path.isfile(os.path.join(sys.prefix, 'lib', 'libResort64c_x64.a'))
+
+NUM_CHANNELS = 5
+NUM_HITS = 16
+
+def quad_events(nevents, seed=5):
+    """ Synthetic quad DLD hits: per particle an mcp time t0 and u1/u2, v1/v2 pairs
+    with the time sums of configuration_quad.txt, as stacked WFPeaks outputs in sec.
+    """
+    rng = np.random.default_rng(seed)
+    nhits = np.zeros((nevents, NUM_CHANNELS), dtype=np.int32)
+    pktsec = np.zeros((nevents, NUM_CHANNELS, NUM_HITS), dtype=np.float64)
+    for i in range(nevents):
+        npart = int(rng.integers(1, 5))
+        t0 = np.sort(rng.uniform(1000, 5000, npart)) + 100*np.arange(npart) # ns, beyond dead time
+        dx = rng.uniform(-30, 30, npart)
+        dy = rng.uniform(-30, 30, npart)
+        times = [t0 + 66.5 + dx, t0 + 66.5 - dx, t0 + 71.3 + dy, t0 + 71.3 - dy, t0]
+        for c, tc in enumerate(times):
+            nhits[i,c] = npart
+            pktsec[i,c,:npart] = np.sort(tc) * 1E-9
+    return nhits, pktsec
+
+@pytest.fixture
+def processor(tmp_path):
+    from psana.hexanode.DLDProcessor import DLDProcessor
+    examples = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../hexanode/examples')
+    with open(os.path.join(examples, 'configuration_quad.txt')) as f: txt_cfg = f.read()
+    with open(os.path.join(examples, 'calibration_table_data.txt')) as f: txt_calib = f.read()
+    consts = {'calibcfg': (txt_cfg, None), 'calibtab': (txt_calib, None)}
+    return DLDProcessor(consts=consts, numchs=NUM_CHANNELS, numhits=NUM_HITS,
+                        ofprefix=str(tmp_path / 'figs-DLD/plot'))
+
+@pytest.mark.skipif(not roentdek_found, reason="roentdek library not found")
+@pytest.mark.parametrize('nthreads', [1, 3])
+def test_event_proc_batch(processor, nthreads):
+    nhits, pktsec = quad_events(60)
+    nhits[7,2] = 0 # an event with an empty channel is skipped
+
+    npart, x, y, t, method = processor.event_proc_batch(nhits.copy(), pktsec.copy(), nthreads=nthreads)
+
+    for i in range(len(nhits)):
+        if i == 7:
+            assert npart[i] == -1
+            continue
+        processor.event_proc(i, nhits[i], pktsec[i])
+        xyt = processor.sorter.xyt_list()
+        assert npart[i] == len(xyt)
+        assert np.allclose(x[i,:npart[i]], [p[0] for p in xyt])
+        assert np.allclose(y[i,:npart[i]], [p[1] for p in xyt])
+        assert np.allclose(t[i,:npart[i]], [p[2] for p in xyt])
+    assert npart.max() > 0
+
+@pytest.mark.skipif(not roentdek_found, reason="roentdek library not found")
+def test_sort_batch_shape(processor):
+    # arrays must match the channels and hits the sorter was initialized with
+    nevts = 2
+    for nchs, nh in ((NUM_CHANNELS, NUM_HITS+4), (NUM_CHANNELS+1, NUM_HITS)):
+        with pytest.raises(ValueError):
+            processor.sorter.sort_batch(np.zeros((nevts, nchs, nh)), np.ones((nevts, nchs), dtype=np.int32),
+                                        np.zeros((nevts, 4)), np.zeros((nevts, 4)), np.zeros((nevts, 4)),
+                                        np.zeros((nevts, 4), dtype=np.int32), np.zeros(nevts, dtype=np.int32),
+                                        0, 0, 0, 0, 0, 0)
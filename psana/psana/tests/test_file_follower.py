@@ -0,0 +1,49 @@
+import os
+import time
+import threading
+
+from psana.psexp.file_follower import FileFollower
+
+def test_file_follower(tmp_path):
+    fname = str(tmp_path / 'data-r0001-s00.smd.xtc2')
+    with open(fname, 'wb') as f:
+        f.write(b'\0' * 64)
+
+    fd = os.open(fname, os.O_RDONLY)
+    os.read(fd, 64)
+    follower = FileFollower([fd], filenames=[fname], poll_secs=5)
+    assert not follower.has_new_data()
+    assert not follower.wait(0.1)
+
+    def append():
+        time.sleep(0.1)
+        with open(fname, 'ab') as f:
+            f.write(b'\0' * 16)
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    t0 = time.monotonic()
+    assert follower.wait(2)
+    if follower.uses_inotify:
+        # woken up by IN_MODIFY and not by the 5 s poll
+        assert time.monotonic() - t0 < 1
+    writer.join()
+    assert follower.committed_sizes() == [80]
+    assert follower.read_positions() == [64]
+
+    # the unread 16 bytes were reported: no new data until the file grows again
+    assert not follower.has_new_data()
+    t0 = time.monotonic()
+    assert not follower.wait(0.2)
+    assert time.monotonic() - t0 >= 0.2
+    with open(fname, 'ab') as f:
+        f.write(b'\0' * 16)
+    assert follower.wait(0.2)
+
+    follower.close()
+    os.close(fd)
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as d:
+        test_file_follower(pathlib.Path(d))
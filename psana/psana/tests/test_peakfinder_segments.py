@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import psalg_ext as algos
+from psana.peakFinder.pypsalg import PeakFinderSegments, peaks_adaptive, peaks_droplet
+
+# columns of peak_dtype in the tuple of py_peak.parameters()
+PARS_INDEXES = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 14, 15, 16)
+
+def segments(nsegs, rows, cols, seed=7):
+    """ Gaussian peaks on noise in each segment. """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(10, 2, (nsegs, rows, cols)).astype(np.float32)
+    r, c = np.mgrid[0:rows, 0:cols]
+    for seg in range(nsegs):
+        for _ in range(8):
+            r0, c0 = rng.uniform(5, rows-5), rng.uniform(5, cols-5)
+            data[seg] += rng.uniform(50, 500) * np.exp(-((r-r0)**2 + (c-c0)**2) / 3.)
+    return data
+
+def as_array(peaks):
+    return np.array([[p.parameters()[i] for i in PARS_INDEXES] for p in peaks], dtype=np.float32)\
+             .reshape(len(peaks), len(PARS_INDEXES))
+
+def check(new, old):
+    assert new.dtype == algos.peak_dtype
+    assert len(new) == len(old) > 0
+    assert np.allclose(new.view(np.float32).reshape(len(new), -1), as_array(old), rtol=1e-5, atol=1e-5)
+
+@pytest.mark.parametrize('nthreads', [1, 4])
+def test_peak_finder_segments(nthreads):
+    pf = PeakFinderSegments(nthreads=nthreads)
+    for shape in ((4, 40, 60), (4, 40, 60), (6, 90, 120), (3, 30, 20)):
+        # the same segments with a larger and a smaller shape reuse no work buffers
+        data = segments(*shape)
+        check(pf.peaks_adaptive(data, rank=3, r0=5, dr=1, nsigm=3),
+              peaks_adaptive(data, None, rank=3, r0=5, dr=1, nsigm=3))
+        check(pf.peaks_droplet(data, thr_low=20, thr_high=60, rank=3, r0=5, dr=1),
+              peaks_droplet(data, None, thr_low=20, thr_high=60, rank=3, r0=5, dr=1))
+
+    # list of segments of different shapes with masks
+    data = [segments(1, 40, 60, seed=1)[0], segments(1, 90, 120, seed=2)[0]]
+    mask = [np.ones(d.shape, dtype=np.uint16) for d in data]
+    mask[1][:45] = 0
+    check(pf.peaks_adaptive(data, mask, rank=3, r0=5, dr=1, nsigm=3),
+          peaks_adaptive(data, mask, rank=3, r0=5, dr=1, nsigm=3))
+    check(pf.peaks_droplet(data, mask, thr_low=20, thr_high=60, rank=3, r0=5, dr=1),
+          peaks_droplet(data, mask, thr_low=20, thr_high=60, rank=3, r0=5, dr=1))
+    pf.close()
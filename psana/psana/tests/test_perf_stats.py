@@ -0,0 +1,54 @@
+import psana.psexp.perf_stats as perf_stats
+from psana.psexp.perf_stats import PerfStats, format_table
+
+def test_perf_stats():
+    perf = PerfStats(enabled=True)
+    for i in range(32):
+        t0 = perf.start('bd_read', every=8)
+        perf.stop('bd_read', t0, nbytes=10)
+    perf.count('events', nitems=3)
+    summary = perf.summary()
+    assert summary['bd_read']['calls'] == 32
+    assert summary['bd_read']['bytes'] == 320 # extrapolated from the timed calls
+    assert perf.stages['bd_read'][1] == 4 # only every 8th call is timed
+    assert perf.stages['bd_read'][3] == 40
+    assert summary['events']['items'] == 3
+    assert 'bd_read' in format_table([summary])
+
+    off = PerfStats(enabled=False)
+    off.stop('bd_read', off.start('bd_read'), nbytes=10)
+    assert off.summary() == {}
+
+def test_report(monkeypatch, capsys):
+    # per-rank, no collective
+    monkeypatch.setenv('PS_PERF_REPORT', '1')
+    monkeypatch.setattr(perf_stats, 'perf', PerfStats(enabled=True))
+    perf_stats.report(rank=3)
+    assert capsys.readouterr().out == ''
+    perf_stats.perf.count('events', nitems=5)
+    perf_stats.report(rank=3)
+    rows = capsys.readouterr().out.splitlines()
+    assert len(rows) == 2 and rows[1].split()[:2] == ['3', 'events']
+    # the next run starts from zero
+    assert perf_stats.perf.summary() == {}
+
+def test_report_dir(monkeypatch, tmp_path, capsys):
+    # each rank writes its summary, merged afterwards into one table
+    monkeypatch.delenv('PS_PERF_REPORT', raising=False)
+    monkeypatch.setenv('PS_PERF_REPORT_DIR', str(tmp_path))
+    monkeypatch.setattr(perf_stats, 'perf', PerfStats(enabled=True))
+    for rank in (0, 2, 10):
+        perf_stats.perf.count('events', nitems=rank+1)
+        perf_stats.report(rank=rank, run_no=7)
+    assert capsys.readouterr().out == ''
+    ranks, summaries = perf_stats.merge_summaries(str(tmp_path / 'run_7'))
+    assert ranks == [0, 2, 10]
+    assert [summary['events']['items'] for summary in summaries] == [1, 3, 11]
+
+    perf_stats.main([str(tmp_path)])
+    rows = capsys.readouterr().out.splitlines()
+    assert rows[0] == 'run_7'
+    assert [row.split()[0] for row in rows[2:]] == ['0', '2', '10']
+
+if __name__ == "__main__":
+    test_perf_stats()
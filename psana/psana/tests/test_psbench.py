@@ -0,0 +1,25 @@
+import os
+import json
+from psana.app.psbench import generate, run_suite, compare
+
+def test_psbench(tmp_path):
+    xtc_dir = str(tmp_path / 'bench')
+    pars = generate(xtc_dir, nfiles=2, nevents=20, payload=64, step_every=10, epics_every=5)
+    assert pars['bigdata_bytes'] > 2*20*64
+
+    summary = run_suite(xtc_dir, modes=('serial', 'singlefile'))
+    results = {r['mode']: r for r in summary['results']}
+    assert results['serial']['nevents'] == 20
+    assert results['singlefile']['nevents'] == 20
+    assert results['serial']['nbytes'] > results['singlefile']['nbytes'] # two streams per event
+    for r in results.values():
+        assert r['events_per_sec'] > 0
+
+    fname = str(tmp_path / 'result.json')
+    with open(fname, 'w') as f:
+        json.dump(summary, f)
+    assert compare(fname, fname) == []
+
+if __name__ == "__main__":
+    import pathlib
+    test_psbench(pathlib.Path('.'))
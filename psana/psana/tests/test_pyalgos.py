@@ -18,6 +18,54 @@ def test_hbins():
     o = HBins((1,6), 5)
     print('  binedges():', o.binedges())
     assert(np.array_equal(o.binedges(), np.array((1,2,3,4,5,6), dtype=np.float)))
+    vals = np.array((0, 1, 1.5, 2, 5.9, 6, 8))
+    assert(np.array_equal(o.bin_indexes(vals, edgemode=1), (-1, 0, 0, 1, 4, 5, 5)))
+    v = HBins((1, 2, 4, 8))
+    assert(np.array_equal(v.bin_indexes(vals, edgemode=0), (0, 0, 0, 1, 2, 2, 2)))
+    his = np.zeros(o.nbins())
+    o.histogram_into(his, vals, edgemode=1)
+    o.histogram_into(his, vals, weights=2*np.ones_like(vals), edgemode=1)
+    assert(np.array_equal(his, (6, 3, 0, 0, 3)))
+
+#------------------------------
+
+def hbins_bin_indexes_ref(o, arr, edgemode=0):
+    """HBins.bin_indexes as it was before the index lookup was precomputed"""
+    indmin, indmax = o._set_limit_indexes(edgemode)
+    if o._equalbins :
+        factor = float(o._nbins)/(o._edges[-1]-o._edges[0])
+        nparr = (np.array(arr, dtype=o._vtype)-o._edges[0])*factor
+        ind = np.array(np.floor(nparr), dtype=np.int32)
+        return np.select((ind<0, ind>o._nbins-1), (indmin, indmax), default=ind)
+    if o._ascending :
+        conds = np.array([arr<edge for edge in o.binedges()], dtype=bool)
+    else :
+        conds = np.array([arr>edge for edge in o.binedges()], dtype=bool)
+    inds1d = list(range(-1, o._nbins))
+    inds1d[0] = indmin
+    inds = np.array(len(arr)*inds1d, dtype=np.int32)
+    inds.shape = (len(arr),o._nbins+1)
+    return np.select(conds, inds.transpose(), default=indmax)
+
+def test_hbins_bin_indexes():
+    from psana.pyalgos.generic.HBins import HBins
+    rng = np.random.default_rng(13)
+    for i in range(60):
+        lo, hi = sorted(rng.uniform(-1000, 1000, 2))
+        nbins = int(rng.integers(1, 200))
+        grid = np.linspace(lo, hi, nbins+1)
+        hbins = [HBins((lo, hi), nbins), HBins((hi, lo), nbins),
+                 HBins(grid + rng.uniform(-0.1, 0.1, nbins+1)*(grid[1]-grid[0])), # near-uniform, e.g. sample times
+                 HBins(np.sort(rng.uniform(lo, hi, nbins+1)))]
+        for o in hbins + [HBins(o.edges()[::-1]) for o in hbins[2:]]:
+            e = o.binedges().astype(np.float64)
+            # values on, next to and between the edges and beyond the limits
+            vals = np.concatenate((e, np.nextafter(e, np.inf), np.nextafter(e, -np.inf),
+                                   np.nextafter(e.astype(np.float32), np.float32(np.inf)).astype(np.float64),
+                                   np.nextafter(e.astype(np.float32), np.float32(-np.inf)).astype(np.float64),
+                                   rng.uniform(lo-10, hi+10, 200)))
+            for edgemode in (0, 1):
+                assert np.array_equal(o.bin_indexes(vals, edgemode), hbins_bin_indexes_ref(o, vals, edgemode))
 
 #------------------------------
 
@@ -40,9 +88,28 @@ def test_entropy():
 
 #------------------------------
 
+def test_hpolar_sparse():
+    print('In pyalgos.test_hpolar_sparse')
+    from psana.pyalgos.generic.HPolar import HPolar, HPolarSparse
+    y, x = np.mgrid[-50:50,-50:50] + 0.5
+    mask = np.ones(x.shape, dtype=np.uint16)
+    mask[5:10,5:10] = 0
+    frames = np.random.rand(3, *x.shape)
+    hp = HPolar(x, y, mask, nradbins=20, nphibins=4)
+    hs = HPolarSparse(x, y, mask, nradbins=20, nphibins=4) # no pixel splitting, no corrections
+    assert(np.allclose(hs.bin_avrg(frames[1]), hp.bin_avrg(frames[1])[:-1]))
+    hs = HPolarSparse(x, y, mask, nradbins=20, nphibins=4, pix_size=1, nsplit=3)
+    avrg = hs.bin_avrg(frames)
+    assert(avrg.shape == (3, 80))
+    assert(np.allclose(avrg[2], hs.bin_avrg(frames[2])))
+    assert(np.allclose(hs.bin_avrg(np.ones(x.shape))[hs.bin_number_of_pixels()>0], 1))
+
+#------------------------------
+
 def pyalgos() :
     test_pyalgos()
     test_hbins()
+    test_hpolar_sparse()
     #test_utils()
     test_entropy()
 
@@ -0,0 +1,51 @@
+import os
+import types
+from psana.psexp import run_manifest
+from psana.psexp.run_manifest import RunManifest
+
+class FakeDgramManager(object):
+    n_opened = 0
+    def __init__(self, smd_files):
+        FakeDgramManager.n_opened += 1
+        # config of stream s1 has no xppcspad
+        self.configs = [types.SimpleNamespace(xppcspad=1) if '-s000' in f else types.SimpleNamespace(epics=1) \
+                for f in smd_files]
+
+def test_run_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_manifest, 'DgramManager', FakeDgramManager)
+    monkeypatch.setattr(run_manifest, 'memoryview', lambda config: b'', raising=False)
+    xtc_path = tmp_path / 'xtc'
+    (xtc_path / 'smalldata').mkdir(parents=True)
+    for run in (1, 2):
+        for s in (0, 1):
+            (xtc_path / ('xpptut15-r%04d-s%03d-c000.xtc2' % (run, s))).write_bytes(b'x')
+            (xtc_path / 'smalldata' / ('xpptut15-r%04d-s%03d-c000.smd.xtc2' % (run, s))).write_bytes(b'x')
+
+    cache_dir = str(tmp_path / 'cache')
+    manifest = RunManifest(str(xtc_path), cache_dir)
+    assert manifest.runs() == [1, 2]
+    # without detectors no smd file is opened
+    xtc_files, smd_files, other_files = manifest.files(1)
+    assert len(smd_files) == len(xtc_files) == 2 and other_files == []
+    assert FakeDgramManager.n_opened == 0
+    xtc_files, smd_files, other_files = manifest.files(1, detectors=['xppcspad'])
+    assert [os.path.basename(f) for f in smd_files] == ['xpptut15-r0001-s000-c000.smd.xtc2']
+    assert [os.path.basename(f) for f in xtc_files] == ['xpptut15-r0001-s000-c000.xtc2']
+    assert [os.path.basename(f) for f in other_files] == ['xpptut15-r0001-s001-c000.xtc2']
+    manifest.files(2)
+    manifest.save()
+    assert FakeDgramManager.n_opened == 1
+
+    # reloaded manifest does not open files again
+    manifest = RunManifest(str(xtc_path), cache_dir)
+    assert manifest.runs() == [1, 2]
+    manifest.files(1, detectors=['xppcspad'])
+    manifest.files(2)
+    assert FakeDgramManager.n_opened == 1
+
+    # growing file (e.g. live run) invalidates its run only
+    with open(xtc_path / 'smalldata' / 'xpptut15-r0002-s001-c000.smd.xtc2', 'ab') as f:
+        f.write(b'more')
+    manifest.files(1, detectors=['xppcspad'])
+    manifest.files(2, detectors=['xppcspad'])
+    assert FakeDgramManager.n_opened == 2
@@ -0,0 +1,82 @@
+import os
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import psana.dgrammanager as dgrammanager
+from psana.dgrammanager import DgramManager
+from psana.psexp.ds_base import DataSourceBase
+
+def test_det_class_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(dgrammanager, '_det_class_cache', OrderedDict())
+    nbuilt = []
+    get_det_class_table = DgramManager.get_det_class_table
+    def counted(self):
+        nbuilt.append(1)
+        return get_det_class_table(self)
+    monkeypatch.setattr(DgramManager, 'get_det_class_table', counted)
+
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    xtc_file = os.path.join(dir_path, 'test_ts.xtc2')
+    # the same configuration written at a later time (Configure timestamp)
+    reconfigured = str(tmp_path / 'reconfigured.xtc2')
+    shutil.copy(xtc_file, reconfigured)
+    with open(reconfigured, 'r+b') as f:
+        ts = struct.unpack('<Q', f.read(8))[0]
+        f.seek(0)
+        f.write(struct.pack('<Q', ts + (10 << 32)))
+
+    dm1 = DgramManager(xtc_file)
+    dm2 = DgramManager(reconfigured)
+    assert dm1.config_hash() == dm2.config_hash()
+    assert len(nbuilt) == 1
+    # each run gets its own tables
+    assert dm1.det_classes == dm2.det_classes and dm1.det_classes is not dm2.det_classes
+    assert dm1.det_info_table == dm2.det_info_table
+
+    dm3 = DgramManager(os.path.join(dir_path, 'test_hsd.xtc2'))
+    assert dm3.config_hash() != dm1.config_hash()
+    assert len(nbuilt) == 2
+
+def test_prefetch_runs():
+    created = {}
+    second_created = threading.Event()
+    def make_run(run_no):
+        created[run_no] = threading.current_thread()
+        if run_no == 2: second_created.set()
+        return SimpleNamespace(run_no=run_no, smd_dm=None, dm=SimpleNamespace(fds=[-1]))
+
+    ds = SimpleNamespace(prefetch=False, run_dict={1: None, 2: None, 3: None})
+    runs = DataSourceBase._prefetch_runs(ds, make_run)
+    assert next(runs).run_no == 1
+    assert list(created) == [1] # created when asked for
+    assert [run.run_no for run in runs] == [2, 3]
+
+    created.clear()
+    second_created.clear()
+    ds.prefetch = True
+    runs = DataSourceBase._prefetch_runs(ds, make_run)
+    assert next(runs).run_no == 1
+    # run 2 is created in the background while run 1 is processed
+    assert second_created.wait(5)
+    assert created[2] is not threading.current_thread()
+    assert [run.run_no for run in runs] == [2, 3]
+    assert list(created) == [1, 2, 3]
+
+def test_prefetch_runs_leave_early():
+    release = threading.Event()
+    def make_run(run_no):
+        if run_no == 2: release.wait(5) # e.g. a slow calibration fetch
+        return SimpleNamespace(run_no=run_no, smd_dm=None, dm=SimpleNamespace(fds=[-1]))
+
+    ds = SimpleNamespace(prefetch=True, run_dict={1: None, 2: None, 3: None})
+    runs = DataSourceBase._prefetch_runs(ds, make_run)
+    assert next(runs).run_no == 1
+    # leaving runs() does not wait for run 2 being created
+    t0 = time.monotonic()
+    runs.close()
+    assert time.monotonic() - t0 < 1
+    release.set()
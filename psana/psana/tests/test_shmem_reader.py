@@ -0,0 +1,38 @@
+import sys
+import numpy as np
+import pytest
+
+from psana.psexp.TransitionId import TransitionId
+from psana.psexp.shmem_reader import TimestampRing
+import shmem_standin
+
+def test_timestamp_ring():
+    ring = TimestampRing(4)
+    for ts in range(10):
+        ring.append(ts)
+    assert len(ring) == 4
+    assert ring.array().tolist() == [6, 7, 8, 9]
+
+    ring = TimestampRing()
+    for ts in range(3000):
+        ring.append(ts)
+    assert len(ring) == 3000
+    assert np.array_equal(ring.array(), np.arange(3000))
+
+@pytest.mark.skipif(sys.platform == 'darwin', reason="multiprocessing shared memory stand-in not tested on mac")
+def test_batch():
+    r = shmem_standin.run(rate=2000, seconds=0.5, batch=8, timestamps=None)
+    assert r['transitions'] == [TransitionId.Configure, TransitionId.EndRun]
+    assert r['reader_dropped'] == 0
+    assert r['events'] == r['sent'] > 0
+    assert np.all(np.diff(r['timestamps'].astype(np.int64)) > 0)
+
+@pytest.mark.skipif(sys.platform == 'darwin', reason="multiprocessing shared memory stand-in not tested on mac")
+@pytest.mark.parametrize('drop', ['oldest', 'newest'])
+def test_prefetch_drop(drop):
+    # a consumer slower than the rate: the reader frees what it cannot keep
+    r = shmem_standin.run(rate=5000, seconds=0.5, prefetch=4, drop=drop, work=1e-3)
+    assert r['transitions'] == [TransitionId.Configure, TransitionId.EndRun]
+    assert r['reader_dropped'] > 0
+    assert r['max_waiting'] <= 4
+    assert r['events'] + r['reader_dropped'] == r['sent']
@@ -0,0 +1,31 @@
+from psana.psexp.node import StepHistory, repack_for_bd
+from psana.psexp.packet_footer import PacketFooter
+
+def test_step_history():
+    # 3 clients (ranks 1-3), 2 smd files
+    hist = StepHistory(4, 2)
+    assert hist.get_buffer(1) == []
+    hist.extend_buffers([b'a1', b'b1'], 1)
+    assert [bytes(v) for v in hist.get_buffer(2)] == [b'a1', b'b1']
+    hist.extend_buffers([b'a2', b'b2'], 2)
+    # client 3 gets both entries, then entries seen by all are dropped
+    assert [bytes(v) for v in hist.get_buffer(3)] == [b'a1a2', b'b1b2']
+    assert hist.base == 1 and len(hist.entries) == 1
+    assert [bytes(v) for v in hist.get_buffer(1)] == [b'a2', b'b2']
+    assert hist.entries == []
+
+def test_step_history_events():
+    hist = StepHistory(3, 1)
+    hist.extend_buffers([b'step1', b'step2'], 1, as_event=True)
+    step_events = hist.get_events(2)
+    assert [bytes(v) for v in step_events] == [b'step1', b'step2']
+    assert hist.get_events(2) == []
+
+    pf = PacketFooter(1)
+    pf.set_size(0, 4)
+    batch = repack_for_bd(bytearray(b'evt1') + pf.footer, step_events, None)
+    assert [bytes(v) for v in PacketFooter(view=batch).split_packets()] == [b'step1', b'step2', b'evt1']
+
+if __name__ == "__main__":
+    test_step_history()
+    test_step_history_events()
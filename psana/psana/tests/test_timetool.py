@@ -4,6 +4,7 @@ import IPython
 
 from psana import DataSource
 from psana.pyalgos.generic.edgefinder import EdgeFinder
+from psana.detector.timetool import timeToolParser
 import matplotlib.pyplot as plt
 
 def twos_complement(hexstr,bits):
@@ -94,7 +95,102 @@ def test_timetool_psana(plot=False):
 
     assert nevt==1324
 
+class oldTimeToolParser():
+    """ Frame parser before the single-pass rewrite, as reference. """
+    def _frames_to_position(self,frame_bytearray,position):
+        return int('0b'+'{0:08b}'.format(frame_bytearray[position+1])+'{0:08b}'.format(frame_bytearray[position]),2)
+
+    def _resolveSubFrames(self):
+        self._sub_frames = [False]*len(self._frame_list)
+        for i in range(len(self._frame_list)):
+            if self._main_header[:2] == self._frame_list[i][:self._HEADER_WIDTH][:2]:
+                self._sub_frames[i] = oldTimeToolParser()
+                self._sub_frames[i]._parseArray(self._frame_list[i])
+                self._frame_list[i] = False
+
+    def _parseArray(self,frame_bytearray):
+        self._main_header  = frame_bytearray[0:16]
+        self._HEADER_WIDTH = int(8*2**((self._main_header[0] >> 4) + 1)/8)
+        sizes     = [self._frames_to_position(frame_bytearray,-16)]
+        positions = [[len(frame_bytearray)-16-sizes[0],len(frame_bytearray)-16]]
+        self._frame_list = [frame_bytearray[positions[-1][0]:positions[-1][1]]]
+        self._tdest      = [frame_bytearray[-12]]
+        parsed_frame_size = sum(sizes) + (len(sizes)+1)*self._HEADER_WIDTH
+        while len(frame_bytearray)>=(parsed_frame_size+self._HEADER_WIDTH):
+            sizes.append(self._frames_to_position(frame_bytearray,positions[-1][0]-16))
+            positions.append([positions[-1][0]-16-sizes[-1],positions[-1][0]-16])
+            self._frame_list.append(frame_bytearray[positions[-1][0]:positions[-1][1]])
+            self._tdest.append(frame_bytearray[positions[-1][1]+4])
+            parsed_frame_size = sum(sizes) + (len(sizes)+1)*self._HEADER_WIDTH
+        self._resolveSubFrames()
+
+    def _parseData(self,frame_bytearray):
+        self._parseArray(frame_bytearray)
+        try:
+            self._timing_bus = self._frame_list[[i for i,t in enumerate(self._tdest) if t==0][0]]
+        except IndexError:
+            self._timing_bus = None
+        sub_frame = self._sub_frames[[i for i,t in enumerate(self._tdest) if t==1][0]]
+        edge_frame = sub_frame._frame_list[[i for i,t in enumerate(sub_frame._tdest) if t==0][0]]
+        self.edge_position = edge_frame[0] + edge_frame[1]*256
+        try:
+            self.background_frame = sub_frame._frame_list[[i for i,t in enumerate(sub_frame._tdest) if t==1][0]]
+        except IndexError:
+            self.background_frame = None
+        try:
+            self.prescaled_frame = np.frombuffer(self._frame_list[[i for i,t in enumerate(self._tdest) if t==2][0]],dtype=np.int8)
+        except IndexError:
+            self.prescaled_frame = None
+
+def axi_stream_frame(header, frames):
+    """ Event-builder frame: 16 byte header, then each (payload, tdest) followed by
+    a 16 byte footer with the payload size and tdest."""
+    buf = bytearray(header)
+    for payload, tdest in frames:
+        footer = bytearray(16)
+        footer[0:2] = len(payload).to_bytes(2, 'little')
+        footer[4] = tdest
+        buf += payload + footer
+    return buf
+
+def test_timetool_parser():
+    rng = np.random.default_rng(3)
+    def payload(n):
+        b = bytearray(rng.integers(0, 256, n, dtype=np.uint8).tobytes())
+        b[0] = 0xff # not a frame header
+        return b
+    header = bytearray(16)
+    header[0] = 0x31 # 128 bit AXI-stream, version 1
+    for seq in range(4):
+        header[1] = seq
+        edge = bytearray([seq*37 % 256, seq % 8]) + bytearray(6)
+        sub = [(edge, 0), (payload(2048), 1)] if seq != 2 else [(edge, 0)]
+        frames = [(payload(16), 0), (axi_stream_frame(header, sub), 1), (payload(2048), 2)]
+        if seq == 1: frames = frames[1:] # no timing bus
+        if seq == 3: frames = frames[:2] # no prescaled frame
+        data = axi_stream_frame(header, frames)
+
+        old = oldTimeToolParser()
+        old._parseData(data)
+        new = timeToolParser()
+        new._parseData(np.frombuffer(bytes(data), dtype=np.uint8))
+
+        assert new.edge_position == old.edge_position == edge[0] + edge[1]*256
+        for name in ('_timing_bus', 'background_frame'):
+            if getattr(old, name) is None:
+                assert getattr(new, name) is None
+            else:
+                assert bytes(getattr(new, name)) == bytes(getattr(old, name))
+        if old.prescaled_frame is None:
+            assert new.prescaled_frame is None
+        else:
+            assert np.array_equal(new.prescaled_frame, old.prescaled_frame)
+        assert (old._timing_bus is None) == (seq == 1)
+        assert (old.background_frame is None) == (seq == 2)
+        assert (old.prescaled_frame is None) == (seq == 3)
+
 if __name__ == "__main__":
+    test_timetool_parser()
     test_timetool()
     test_timetool_psana(plot=False)
 
@@ -2,6 +2,7 @@ import numpy as np
 import os 
 
 from psana import DataSource
+from psana.detector.ts import _unpack, _unpack_batch
 
 def test_ts():
     dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -10,10 +11,25 @@ def test_ts():
     myrun = next(ds.runs())
     det = myrun.Detector('xppts')
 
+    evts = []
     for nevt,evt in enumerate(myrun.events()):
         info = det.ts.info(evt)
         seqinfo = det.ts.sequencer_info(evt)
+        evts.append(evt)
     assert nevt==1
 
+    batch = det.ts.info_batch(evts)
+    assert len(batch) == len(evts)
+    for evt, rec in zip(evts, batch):
+        assert det.ts.info(evt) == tuple(rec.item())
+
+def test_unpack():
+    # single-header struct path and vectorized batch path agree
+    headers = np.random.default_rng(0).integers(0, 256, (64, 64), dtype=np.uint8)
+    batch = _unpack_batch(headers)
+    for header, rec in zip(headers, batch):
+        assert _unpack(header) == tuple(rec.item())
+
 if __name__ == "__main__":
     test_ts()
+    test_unpack()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import psana.xtcav.Utils as xtu
+import psana.xtcav.ClusteringUtils as cu
+import psana.xtcav.Constants as cons
+
+NUM_SHOTS = 10
+NUM_BUNCHES = 2
+NUM_GROUPS = 3
+
+def synthetic_profiles(charges, seed=11):
+    """ Lasing-off ImageProfiles with random profiles on uniform time axes of different lengths and steps. """
+    rng = np.random.default_rng(seed)
+    profiles = []
+    for i, charge in enumerate(charges):
+        n = int(rng.integers(40, 60))
+        xfsPerPix = float(rng.uniform(0.8, 1.2))
+        yMeVPerPix = float(rng.uniform(0.9, 1.1))
+        xfs = (np.arange(n) - n/2) * xfsPerPix
+        image_stats = []
+        for j in range(NUM_BUNCHES):
+            image_stats.append(xtu.ImageStatistics(
+                imfrac=1./NUM_BUNCHES,
+                xProfile=rng.uniform(0, 1, n),
+                yProfile=rng.uniform(0, 1, n),
+                xCOM=float(rng.uniform(20, 30)), yCOM=float(rng.uniform(20, 30)),
+                xRMS=float(rng.uniform(1, 5)), yRMS=float(rng.uniform(1, 5)),
+                yCOMslice=rng.uniform(15, 35, n),
+                yRMSslice=rng.uniform(1, 5, n)))
+        profiles.append(xtu.ImageProfile(
+            image_stats=image_stats,
+            roi=xtu.ROIMetrics(),
+            shot_to_shot=xtu.ShotToShotParameters(dumpecharge=charge, unixtime=1000+i, fiducial=3*i),
+            physical_units=xtu.PhysicalUnits(xfs=xfs, yMeV=None, xfsPerPix=xfsPerPix,
+                                             yMeVPerPix=yMeVPerPix, valid=1)))
+    return profiles
+
+def accumulate(profiles):
+    acc = xtu.ProfileAccumulator(NUM_SHOTS, NUM_BUNCHES, 64)
+    for p in profiles:
+        assert acc.add(p)
+    assert acc.full()
+    return acc.averaged_profiles(NUM_GROUPS)
+
+@pytest.fixture(autouse=True)
+def groups(monkeypatch):
+    # the same deterministic grouping for both implementations
+    monkeypatch.setattr(cu, 'getGroups', lambda X, num_clusters, method: np.arange(len(X)) % num_clusters)
+
+def check_common(old, new):
+    assert np.allclose(old.t, new.t)
+    for j in range(NUM_BUNCHES):
+        assert np.allclose(old.eCOMslice[j], new.eCOMslice[j], rtol=1e-5, atol=1e-4)
+        assert np.allclose(old.eRMSslice[j], new.eRMSslice[j], rtol=1e-5, atol=1e-4)
+        assert np.allclose(old.distT[j], new.distT[j])
+        assert np.allclose(old.distE[j], new.distE[j])
+        assert np.array_equal(old.eventTime[j], new.eventTime[j])
+        assert np.array_equal(old.eventFid[j], new.eventFid[j])
+
+def test_accumulator_equal_charges():
+    profiles = synthetic_profiles([cons.DUMP_E_CHARGE]*NUM_SHOTS)
+    old, nold = xtu.averageXTCAVProfilesGroups(profiles, NUM_GROUPS)
+    new, nnew = accumulate(profiles)
+    assert nold == nnew == NUM_GROUPS
+    check_common(old, new)
+    for j in range(NUM_BUNCHES):
+        assert np.allclose(old.eCurrent[j], new.eCurrent[j], rtol=1e-5)
+        # the old grouping stored the mean eRMS into tRMS and left eRMS empty
+        assert np.allclose(old.tRMS[j], new.eRMS[j])
+        assert not np.any(old.eRMS[j])
+        tRMS = [p.image_stats[j].xRMS*p.physical_units.xfsPerPix for p in profiles]
+        assert np.allclose(new.tRMS[j], [np.mean(tRMS[g::NUM_GROUPS]) for g in range(NUM_GROUPS)])
+
+def test_accumulator_member_charges():
+    # the accumulator weights the current of each member with its own charge,
+    # which is the old grouping on profiles scaled to a common charge
+    charges = cons.DUMP_E_CHARGE * np.linspace(0.5, 1.5, NUM_SHOTS)
+    profiles = synthetic_profiles(charges)
+    scaled = []
+    for p, charge in zip(profiles, charges):
+        stats = [s._replace(xProfile=s.xProfile*charge/cons.DUMP_E_CHARGE) for s in p.image_stats]
+        scaled.append(p._replace(image_stats=stats, shot_to_shot=p.shot_to_shot._replace(dumpecharge=cons.DUMP_E_CHARGE)))
+    old, _ = xtu.averageXTCAVProfilesGroups(scaled, NUM_GROUPS)
+    new, _ = accumulate(profiles)
+    check_common(old, new)
+    for j in range(NUM_BUNCHES):
+        assert np.allclose(old.eCurrent[j], new.eCurrent[j], rtol=1e-5)
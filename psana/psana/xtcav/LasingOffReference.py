@@ -123,10 +123,10 @@ class LasingOffReference():
         gasdetector = run.Detector(cons.GAS_DETECTOR) #SimulatorGasDetector() # psana.Detector(cons.GAS_DETECTOR)
         xtcavpars   = run.Detector(cons.XTCAVPARS)
 
-        # Empty list for the statistics obtained from each image, the shot to shot properties,
-        # and the ROI of each image (although this ROI is initially the same for each shot,
-        # it becomes different when the image is cropped around the trace)
-        list_image_profiles = []
+        # Streaming accumulator of compact per-shot features of the statistics obtained from each image
+        # and the shot to shot properties, allocated for max_shots as soon as the camera ROI is known
+        # (the ROI is initially the same for each shot, it becomes different when the image is cropped around the trace)
+        accumulator = None
 
         #dark_background = self._getDarkBackground(env)
         
@@ -167,6 +167,8 @@ class LasingOffReference():
                 resp = self._getCalibrationValues(nev, evt, camraw, valsxtp)
                 if resp is None : continue
                 roi_xtcav, global_calibration, saturation_value = resp
+                accumulator = xtu.ProfileAccumulator(np.ceil(self.parameters.max_shots/float(size)),
+                                                     self.parameters.num_bunches, roi_xtcav.xN)
 
             #Obtain the shot to shot parameters necessary for the retrieval of the x and y axis in time and energy units
             shot_to_shot = xtup.getShotToShotParameters(evt, valsebm, valsgd, valseid)
@@ -182,8 +184,9 @@ class LasingOffReference():
             if not image_profile:
                 continue
 
-            #Append only image profile, omit processed image
-            list_image_profiles.append(image_profile)     
+            #Accumulate only compact features of image profile, omit processed image
+            if not accumulator.add(image_profile):
+                continue
             num_processed += 1
 
             self._printProgressStatements(num_processed)
@@ -208,25 +211,15 @@ class LasingOffReference():
                 gr.draw_fig(self.fig)
                 gr.show(mode='non-hold')
 
-        # here gather all shots in one core, add all lists
-        #image_profiles = comm.gather(list_image_profiles, root=0)
-        image_profiles = list_image_profiles
-
         if rank != 0: return
 
         sys.stdout.write('\n')
-        # Flatten gathered arrays
-        #image_profiles = [item for sublist in image_profiles for item in sublist]
 
-        #for i,ipf in enumerate(image_profiles) :
-        #  print('XXX image_profiles %d:\n  %s'%(i,str(ipf)))
+        if accumulator is None or accumulator.n == 0:
+            sys.exit('FATAL ERROR: NO VALID LASING OFF PROFILES FOUND')
 
-        #Since there are 12 cores it is possible that there are more references than needed. In that case we discard some
-        if len(image_profiles) > self.parameters.max_shots:
-            image_profiles = image_profiles[0:self.parameters.max_shots]
-        
         #At the end, all the reference profiles are converted to Physical units, grouped and averaged together
-        averaged_profiles = xtu.averageXTCAVProfilesGroups(image_profiles, self.parameters.num_groups);     
+        averaged_profiles = accumulator.averaged_profiles(self.parameters.num_groups)
 
         self.averaged_profiles, num_groups=averaged_profiles
         self.n=num_processed
@@ -574,6 +574,167 @@ def averageXTCAVProfilesGroups(list_image_profiles, num_groups=0, method='hierar
         averageERMS, num_bunches, eventTime, eventFid), num_clusters
 
 
+class ProfileAccumulator():
+    """
+    Streaming, fixed-memory alternative to averageXTCAVProfilesGroups.
+    Instead of keeping a full ImageProfile per shot, add() copies only the compact per-shot
+    features needed for clustering and averaging into preallocated arrays:
+      - xProfile, energy COM per slice (MeV) and energy RMS per slice (MeV) on the shot's own
+        ascending time axis, padded to max_pixels,
+      - time axis origin and step, distances/dispersions per bunch, number of electrons, time and fiducial.
+    Per-cluster sums are accumulated in a second lightweight pass over these arrays in averaged_profiles().
+
+    Usage:
+      acc = ProfileAccumulator(max_shots, num_bunches, max_pixels)
+      for ...: acc.add(image_profile)
+      averaged_profiles, num_groups = acc.averaged_profiles(num_groups)
+    """
+    def __init__(self, max_shots, num_bunches, max_pixels, dtype=np.float32):
+        self.max_shots   = int(max_shots)
+        self.num_bunches = int(num_bunches)
+        self.max_pixels  = int(max_pixels)
+        shape = (self.max_shots, self.num_bunches, self.max_pixels)
+        self.xprofile  = np.zeros(shape, dtype=dtype) # x profile per bunch
+        self.ecomslice = np.zeros(shape, dtype=dtype) # energy center of mass for each slice in MeV
+        self.ermsslice = np.zeros(shape, dtype=dtype) # energy dispersion for each slice in MeV
+        self.npix      = np.zeros(self.max_shots, dtype=np.int32)   # number of valid pixels per shot
+        self.xfs0      = np.zeros(self.max_shots, dtype=np.float64) # first value of ascending time axis in fs
+        self.dxfs      = np.zeros(self.max_shots, dtype=np.float64) # step of ascending time axis in fs
+        self.distt     = np.zeros((self.max_shots, self.num_bunches), dtype=np.float64)
+        self.diste     = np.zeros((self.max_shots, self.num_bunches), dtype=np.float64)
+        self.trms      = np.zeros((self.max_shots, self.num_bunches), dtype=np.float64)
+        self.erms      = np.zeros((self.max_shots, self.num_bunches), dtype=np.float64)
+        self.nelectrons= np.zeros(self.max_shots, dtype=np.float64)
+        self.unixtime  = np.zeros(self.max_shots, dtype=np.uint64)
+        self.fiducial  = np.zeros(self.max_shots, dtype=np.uint32)
+        self.n = 0
+        # running limits of the master time vector
+        self.mint, self.maxt, self.mindt = np.inf, -np.inf, np.inf
+
+
+    def full(self):
+        return self.n >= self.max_shots
+
+
+    def add(self, image_profile):
+        """
+        Copies compact features of image_profile (ImageProfile) to the next free row.
+        Returns False if accumulator is full or profile does not fit, True otherwise.
+        """
+        if self.full(): return False
+
+        image_stats    = image_profile.image_stats
+        physical_units = image_profile.physical_units
+        shot_to_shot   = image_profile.shot_to_shot
+        xfs = physical_units.xfs
+        n = len(xfs)
+        if n < 2 or n > self.max_pixels or len(image_stats) != self.num_bunches:
+            logger.warning('ProfileAccumulator: skip profile with %d pixels and %d bunches' % (n, len(image_stats)))
+            return False
+
+        i = self.n
+        xfsPerPix  = physical_units.xfsPerPix
+        yMeVPerPix = physical_units.yMeVPerPix
+        self.npix[i] = n
+        self.xfs0[i] = xfs[0]
+        self.dxfs[i] = xfs[1]-xfs[0]
+        self.nelectrons[i] = shot_to_shot.dumpecharge/cons.E_CHARGE
+        self.unixtime[i] = shot_to_shot.unixtime
+        self.fiducial[i] = shot_to_shot.fiducial
+
+        s0 = image_stats[0]
+        for j,s in enumerate(image_stats):
+            self.xprofile[i,j,:n]  = s.xProfile
+            self.ecomslice[i,j,:n] = (s.yCOMslice-s.yCOM)*yMeVPerPix
+            self.ermsslice[i,j,:n] = s.yRMSslice*yMeVPerPix
+            self.distt[i,j] = (s.xCOM-s0.xCOM)*xfsPerPix
+            self.diste[i,j] = (s.yCOM-s0.yCOM)*yMeVPerPix
+            self.trms[i,j]  = s.xRMS*xfsPerPix
+            self.erms[i,j]  = s.yRMS*yMeVPerPix
+
+        self.mint  = min(self.mint,  np.amin(xfs))
+        self.maxt  = max(self.maxt,  np.amax(xfs))
+        self.mindt = min(self.mindt, np.abs(xfsPerPix))
+        self.n += 1
+        return True
+
+
+    def master_time(self):
+        """Returns master time vector in fs with a step half of the minimal step."""
+        dt = self.mindt/2
+        return np.arange(self.mint, self.maxt+dt, dt)
+
+
+    def _interpolated(self, arr, i, j, t):
+        """Interpolates feature arr of shot i, bunch j to the master time t."""
+        n = self.npix[i]
+        xfs = self.xfs0[i] + self.dxfs[i]*np.arange(n) - self.distt[i,j]
+        return np.interp(t, xfs, arr[i,j,:n], left=0, right=0)
+
+
+    def averaged_profiles(self, num_groups=0, method='hierarchical'):
+        """
+        Clusters accumulated profiles and averages them in groups.
+        Returns the same as averageXTCAVProfilesGroups: (AveragedProfiles, num_clusters)
+        """
+        num_profiles = self.n
+        t = self.master_time()
+        nt = len(t)
+        nb = self.num_bunches
+
+        averageECurrent, averageECOMslice, averageERMSslice = [], [], []
+        averageDistT, averageDistE, averageTRMS, averageERMS = [], [], [], []
+        eventTime, eventFid = [], []
+
+        for j in range(nb):
+            profilesT = np.zeros((num_profiles, nt), dtype=np.float64)
+            for i in range(num_profiles):
+                profilesT[i,:] = self._interpolated(self.xprofile, i, j, t)
+
+            num_clusters = cu.findOptGroups(profilesT, 100, method=method.lower()) if not num_groups else num_groups
+            num_groups = num_clusters
+
+            if num_profiles == 1:
+                groups = np.array([0])
+            elif num_clusters >= num_profiles:
+                groups = np.arange(num_profiles)
+            else:
+                groups = np.asarray(cu.getGroups(profilesT, num_clusters, method=method.lower()))
+
+            num_clusters = int(max(groups) + 1)
+            print("Averaging lasing off profiles into ", num_clusters, " groups.")
+
+            # second pass: per-cluster running sums over compact features
+            sumECurrent  = np.zeros((num_clusters, nt), dtype=np.float64)
+            sumECOMslice = np.zeros((num_clusters, nt), dtype=np.float64)
+            sumERMSslice = np.zeros((num_clusters, nt), dtype=np.float64)
+            for i in range(num_profiles):
+                g = groups[i]
+                sumECurrent[g,:]  += self._interpolated(self.xprofile, i, j, t)/(self.dxfs[i]*cons.FS_TO_S)*self.nelectrons[i]
+                sumECOMslice[g,:] += self._interpolated(self.ecomslice, i, j, t)
+                sumERMSslice[g,:] += self._interpolated(self.ermsslice, i, j, t)
+
+            counts = np.bincount(groups, minlength=num_clusters).astype(np.float64)
+            counts_div = np.maximum(counts, 1)
+            averageECurrent.append(sumECurrent/counts_div[:,None])
+            averageECOMslice.append(sumECOMslice/counts_div[:,None])
+            averageERMSslice.append(sumERMSslice/counts_div[:,None])
+            averageDistT.append(np.bincount(groups, weights=self.distt[:num_profiles,j], minlength=num_clusters)/counts_div)
+            averageDistE.append(np.bincount(groups, weights=self.diste[:num_profiles,j], minlength=num_clusters)/counts_div)
+            averageTRMS.append(np.bincount(groups, weights=self.trms[:num_profiles,j], minlength=num_clusters)/counts_div)
+            averageERMS.append(np.bincount(groups, weights=self.erms[:num_profiles,j], minlength=num_clusters)/counts_div)
+
+            # time and fiducial of the last shot in each group
+            last = np.zeros(num_clusters, dtype=np.int64)
+            np.maximum.at(last, groups, np.arange(num_profiles))
+            eventTime.append(self.unixtime[last])
+            eventFid.append(self.fiducial[last])
+
+        return AveragedProfiles(t, averageECurrent, averageECOMslice,
+            averageERMSslice, averageDistT, averageDistE, averageTRMS,
+            averageERMS, nb, eventTime, eventFid), num_clusters
+
+
 # http://stackoverflow.com/questions/26248654/numpy-return-0-with-divide-by-zero
 def divideNoWarn(numer,denom,default):
     with np.errstate(divide='ignore', invalid='ignore'):
@@ -122,6 +122,7 @@ if 'PSANA' in BUILD_LIST :
             'hdf5explorer        = psana.graphqt.app.hdf5explorer:hdf5explorer_gui',
             'screengrabber       = psana.graphqt.ScreenGrabberQt5:run_GUIScreenGrabber',
             'detnames            = psana.app.detnames:detnames',
+            'psbench             = psana.app.psbench:main',
             'xtcavDark           = psana.xtcav.app.xtcavDark',
             'xtcavLasingOff      = psana.xtcav.app.xtcavLasingOff',
             'xtcavLasingOn       = psana.xtcav.app.xtcavLasingOn',
@@ -4,14 +4,30 @@ import sys
 import time
 import argparse
 import logging
+import threading
 from p4p.client.thread import Context
 from prometheus_client import start_http_server
 from prometheus_client.core import GaugeMetricFamily, REGISTRY
 
 class CustomCollector():
-    def __init__(self):
-        self.pvactx = Context('pva')
-        self._pvs   = {}
+    #  Scrapes are served from a cache of PV values filled in the
+    #  background, either by one batched get of all PVs every period
+    #  seconds or by monitors.  Polled values older than maxAge seconds
+    #  are left out of a scrape; monitored values are kept until the PV
+    #  disconnects.
+    def __init__(self, period=1.0, maxAge=10.0, monitor=False, ctx=None):
+        self.pvactx  = ctx if ctx is not None else Context('pva')
+        self._pvs    = {}
+        self._period = period
+        self._maxAge = maxAge
+        self._monitor= monitor
+        self._lock   = threading.Lock()
+        self._cache  = {}       # pv -> (value, time received)
+        self._subs   = []
+        self._thread = None
+        self._stop   = threading.Event()
+        self._latency= 0.       # duration of the last batched get
+        self._errors = 0
 
     def registerPV(self, name, pv, hutch):
         self._hutch = hutch
@@ -20,21 +36,94 @@ class CustomCollector():
             pvs.append( pv%i )
         self._pvs[name] = pvs
 
+    def _allPvs(self):
+        return [pv for pvs in self._pvs.values() for pv in pvs]
+
+    def _update(self, pv, value):
+        if isinstance(value, Exception):
+            logging.debug('%s: %s' % (pv, value))
+            with self._lock:
+                self._errors += 1
+                self._cache.pop(pv, None)
+        else:
+            with self._lock:
+                self._cache[pv] = (value.raw.value, time.monotonic())
+
+    def poll(self):
+        pvs = self._allPvs()
+        t0 = time.monotonic()
+        values = self.pvactx.get(pvs, throw=False)
+        self._latency = time.monotonic()-t0
+        logging.debug('poll %d PVs in %f s' % (len(pvs), self._latency))
+        for pv, value in zip(pvs, values):
+            self._update(pv, value)
+
+    def _run(self):
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                logging.error('poll: %s' % e)
+            self._stop.wait(max(0., self._period-(time.monotonic()-t0)))
+
+    def start(self):
+        if self._monitor:
+            for pv in self._allPvs():
+                self._subs.append(self.pvactx.monitor(pv, lambda value, pv=pv: self._update(pv, value),
+                                                      notify_disconnect=True))
+        else:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for sub in self._subs:
+            sub.close()
+        self._subs = []
+
     def collect(self):
+        now = time.monotonic()
+        with self._lock:
+            cache = dict(self._cache)
+        staleness = 0.
+        nstale = 0
         for name,pvs in self._pvs.items():
             g = GaugeMetricFamily(name, documentation='', labels=['instrument','partition'])
-            values = self.pvactx.get(pvs)
-            logging.debug('collect %s: %s' % (pvs, str(values)))
             for i in range(8):
-                g.add_metric([self._hutch,str(i)], values[i].raw.value)
+                entry = cache.get(pvs[i])
+                if entry is None:
+                    nstale += 1
+                    continue
+                age = now-entry[1]
+                if age > self._maxAge and not self._monitor:
+                    nstale += 1
+                    continue
+                staleness = max(staleness, age)
+                g.add_metric([self._hutch,str(i)], entry[0])
             yield g
 
+        yield GaugeMetricFamily('epics_exporter_poll_seconds',
+                                'Duration of the last batched get of all PVs', value=self._latency)
+        yield GaugeMetricFamily('epics_exporter_staleness_seconds',
+                                'Age of the oldest PV value served', value=staleness)
+        yield GaugeMetricFamily('epics_exporter_stale_pvs',
+                                'PVs without a value newer than the staleness limit', value=nstale)
+        yield GaugeMetricFamily('epics_exporter_errors',
+                                'PV get/monitor errors', value=self._errors)
+
 def main():
     parser = argparse.ArgumentParser(prog=sys.argv[0], description='host PVs for XPM')
 
     parser.add_argument('-H', required=False, help='e.g. tst', metavar='HUTCH', default='tst')
     parser.add_argument('-P', required=True, help='e.g. DAQ:LAB2:XPM:2', metavar='PREFIX')
     parser.add_argument('N', help='e.g. DeadFrac', nargs='+', metavar='NAME')
+    parser.add_argument('--port', type=int, default=9200, help='http port (default 9200)')
+    parser.add_argument('--period', type=float, default=1.0, help='PV poll period in sec (default 1)')
+    parser.add_argument('--max-age', type=float, default=10.0, help='max age of served values in sec (default 10)')
+    parser.add_argument('--monitor', action='store_true', help='monitor PVs instead of polling')
     parser.add_argument('-v', '--verbose', action='store_true', help='be verbose')
 
     args = parser.parse_args()
@@ -42,15 +131,14 @@ def main():
         logging.basicConfig(level=logging.DEBUG)
 
     # Start up the server to expose the metrics.
-    c = CustomCollector()
-    REGISTRY.register(c)
+    c = CustomCollector(period=args.period, maxAge=args.max_age, monitor=args.monitor)
     for name in args.N:
         c.registerPV(name, args.P + ':PART:%d:' + name, args.H)
-    c.collect()
-    start_http_server(9200)
+    c.start()
+    REGISTRY.register(c)
+    start_http_server(args.port)
     while True:
         time.sleep(5)
 
 if __name__ == '__main__':
     main()
-
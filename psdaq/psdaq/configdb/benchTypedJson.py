@@ -0,0 +1,69 @@
+import time
+import copy
+import argparse
+import numpy as np
+from psdaq.configdb.typed_json import cdict, getType, getValue, updateValue, setValues, validate, _schema_cache
+
+#
+# Benchmark of the typed JSON accessors on an epix-like configuration with
+# thousands of register fields and a large pixel map.
+#
+
+def epix_config(nasics, nregs, pixels):
+    top = cdict()
+    top.setInfo('epix', 'tst_epix', None, 'serial1234', 'benchmark')
+    top.setAlg('config', [1,0,0])
+    top.define_enum('boolEnum', {'False': 0, 'True': 1})
+    top.define_enum('gainEnum', {'High': 0, 'Medium': 1, 'Low': 2, 'AutoHL': 3, 'AutoML': 4})
+    types = ['UINT8', 'UINT16', 'UINT32', 'INT32', 'DOUBLE']
+    names = []
+    for a in range(nasics):
+        for r in range(nregs):
+            name = 'expert.EpixHR.Hr10kTAsic%d.reg%03d' % (a, r)
+            if r % 10 == 9:
+                top.set(name, 1, 'boolEnum')
+            else:
+                top.set(name, r, types[r % len(types)])
+            names.append(name)
+        name = 'expert.EpixHR.Hr10kTAsic%d.gain' % a
+        top.set(name, 0, 'gainEnum')
+        names.append(name)
+    top.set('user.pixel_map', np.zeros(pixels, dtype=np.uint8))
+    return top.typed_json(), names
+
+def timeit(f, n=1):
+    t0 = time.perf_counter()
+    for i in range(n):
+        f()
+    return (time.perf_counter() - t0) / n
+
+def main():
+    parser = argparse.ArgumentParser(description='typed JSON accessor benchmark')
+    parser.add_argument('--asics', type=int, default=16, help='number of ASICs [16]')
+    parser.add_argument('--regs', type=int, default=200, help='registers per ASIC [200]')
+    parser.add_argument('--pixels', type=int, default=4*144*192, help='pixel map size [110592]')
+    args = parser.parse_args()
+
+    d, names = epix_config(args.asics, args.regs, args.pixels)
+    print('%d fields, pixel map of %d' % (len(names), args.pixels))
+
+    _schema_cache.clear()
+    print('%-34s %10.3f ms' % ('first getType (compiles schema)', 1e3 * timeit(lambda: getType(d, names[0]))))
+    print('%-34s %10.2f us' % ('getType per field', 1e6 * timeit(lambda: [getType(d, n) for n in names], 5) / len(names)))
+    print('%-34s %10.2f us' % ('getValue per field', 1e6 * timeit(lambda: [getValue(d, n) for n in names], 5) / len(names)))
+    strings = {n: str(getValue(d, n)) for n in names}
+    d1 = copy.deepcopy(d)
+    print('%-34s %10.2f us' % ('updateValue per field', 1e6 * timeit(lambda: [updateValue(d1, n, v) for n, v in strings.items()], 5) / len(names)))
+    d2 = copy.deepcopy(d)
+    print('%-34s %10.2f us' % ('setValues per field', 1e6 * timeit(lambda: setValues(d2, strings), 5) / len(names)))
+    assert d1 == d2
+
+    pixels = np.random.default_rng(0).integers(0, 4, args.pixels).astype(np.uint8)
+    text = ' '.join(str(v) for v in pixels)
+    print('%-34s %10.3f ms' % ('updateValue pixel map (string)', 1e3 * timeit(lambda: updateValue(d1, 'user.pixel_map', text))))
+    print('%-34s %10.3f ms' % ('setValues pixel map (ndarray)', 1e3 * timeit(lambda: setValues(d2, {'user.pixel_map': pixels}))))
+    assert d1 == d2
+    print('%-34s %10.3f ms' % ('validate whole config', 1e3 * timeit(lambda: validate(d2))))
+
+if __name__ == '__main__':
+    main()
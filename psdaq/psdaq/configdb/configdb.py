@@ -4,7 +4,40 @@ from krtc import KerberosTicket
 from urllib.parse import urlparse
 import json
 import logging
-from .typed_json import cdict
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .typed_json import cdict, project
+
+# Configurations already downloaded, shared by all configdb objects of the
+# process (get_config makes a new one for every Configure).  A configuration
+# is stored under the key of its alias, so it stays valid until the alias
+# is modified.  Entries are kept as json text and decoded on every hit, so
+# callers may modify what they get.
+_cache = OrderedDict()      # (prefix, hutch, key, device) -> json text
+_cache_lock = threading.Lock()
+_cache_size = int(os.environ.get('CONFIGDB_CACHE_SIZE', 256))
+
+def _cache_get(*index):
+    with _cache_lock:
+        text = _cache.get(index)
+        if text is None:
+            return None
+        _cache.move_to_end(index)
+    return json.loads(text)
+
+def _cache_put(config, *index):
+    text = json.dumps(config)
+    with _cache_lock:
+        _cache[index] = text
+        _cache.move_to_end(index)
+        while len(_cache) > _cache_size:
+            _cache.popitem(last=False)
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
 
 class JSONEncoder(json.JSONEncoder):
     def default(self, o):
@@ -45,37 +78,63 @@ class configdb(object):
                 if not xx['success']:
                     logging.error('%s' % xx['msg'])
 
-    # Return json response.
+    # Return http response.
     # Raise exception on error.
-    def _get_response(self, cmd, *, json=None):
+    def _get(self, cmd, *, json=None, stream=False):
         if 'ws-auth' in self.prefix:
             # basic authentication
             resp = requests.get(self.prefix + cmd,
                                 auth=HTTPBasicAuth(self.user, self.password),
                                 json=json,
+                                stream=stream,
                                 timeout=self.timeout)
         elif 'ws-kerb' in self.prefix:
             # kerberos authentication
             resp = requests.get(self.prefix + cmd,
                                 **{"headers": KerberosTicket('HTTP@' + self.host).getAuthHeaders()},
                                 json=json,
+                                stream=stream,
                                 timeout=self.timeout)
         else:
             # no authentication
             resp = requests.get(self.prefix + cmd,
                                 json=json,
+                                stream=stream,
                                 timeout=self.timeout)
         # raise exception if status is not ok
         resp.raise_for_status()
-        return resp.json()
+        return resp
+
+    # Return json response.
+    # Raise exception on error.
+    def _get_response(self, cmd, *, json=None):
+        return self._get(cmd, json=json).json()
+
+    # Return the current key of alias, or None if it can't be found.
+    def _current_key(self, alias, hutch):
+        try:
+            xx = self._get_response('get_key/' + hutch + '/?alias=%s' % alias)
+        except Exception as ex:
+            logging.debug('get_key %s: %s' % (alias, ex))
+            return None
+        if not xx['success'] or not isinstance(xx['value'], int):
+            return None
+        return xx['value']
 
     # Retrieve the configuration of the device with the specified alias.
     # This returns a dictionary where the keys are the collection names and the 
     # values are typed JSON objects representing the device configuration(s).
     # On error return an empty dictionary.
-    def get_configuration(self, alias, device, hutch=None):
+    # With cache, a configuration downloaded before for the current key of
+    # the alias is returned without downloading it again.
+    def get_configuration(self, alias, device, hutch=None, cache=True):
         if hutch is None:
             hutch = self.hutch
+        key = self._current_key(alias, hutch) if cache else None
+        if key is not None:
+            config = _cache_get(self.prefix, hutch, key, device)
+            if config is not None:
+                return config
         try:
             xx = self._get_response('get_configuration/' + hutch + '/' +
                                     alias + '/' + device + '/')
@@ -89,8 +148,78 @@ class configdb(object):
         if not xx['success']:
             logging.error('%s' % xx['msg'])
             return dict()
-        else:
-            return xx['value']
+        # The alias may have been modified since its key was read, in which
+        # case the entry is never looked up: keys only increase.
+        if key is not None:
+            _cache_put(xx['value'], self.prefix, hutch, key, device)
+        return xx['value']
+
+    # Retrieve the configurations of many devices in one request.
+    # pairs is a list of (alias, device); fields is an optional list of
+    # dot-separated names to return instead of whole configurations (see
+    # project).  Return a dictionary of the configurations by (alias, device),
+    # with an empty dictionary for those not found.
+    # The server streams one json line per configuration; when it doesn't
+    # support the request the configurations are retrieved one by one.
+    # Whole configurations are cached as in get_configuration.
+    def get_configurations(self, pairs, fields=None, hutch=None, cache=True):
+        if hutch is None:
+            hutch = self.hutch
+        pairs = [tuple(pair) for pair in pairs]
+        keys = {}
+        if cache:
+            for alias in dict.fromkeys(alias for alias, device in pairs):
+                keys[alias] = self._current_key(alias, hutch)
+        result = {}
+        missing = []
+        for alias, device in pairs:
+            config = None
+            if keys.get(alias) is not None:
+                config = _cache_get(self.prefix, hutch, keys[alias], device)
+            if config is None:
+                missing.append((alias, device))
+            else:
+                result[(alias, device)] = project(config, fields)
+        if missing:
+            for alias, device, config in self._fetch_configurations(missing, fields, hutch):
+                if fields is None and config and keys.get(alias) is not None:
+                    _cache_put(config, self.prefix, hutch, keys[alias], device)
+                result[(alias, device)] = project(config, fields)
+        return {pair: result.get(pair, dict()) for pair in pairs}
+
+    # Yield (alias, device, configuration) of pairs as they arrive.
+    def _fetch_configurations(self, pairs, fields, hutch):
+        body = {'pairs': [{'alias': alias, 'device': device} for alias, device in pairs],
+                'fields': fields}
+        try:
+            resp = self._get('get_configurations/' + hutch + '/', json=body, stream=True)
+        except requests.exceptions.HTTPError as ex:
+            if ex.response is None or ex.response.status_code != 404:
+                logging.error('Web server error: %s' % ex)
+                return
+            # older server: one request per configuration
+            with ThreadPoolExecutor(max_workers=min(8, len(pairs))) as pool:
+                configs = pool.map(lambda pair: self.get_configuration(*pair, hutch=hutch, cache=False),
+                                   pairs)
+                for (alias, device), config in zip(pairs, configs):
+                    yield alias, device, config
+            return
+        except requests.exceptions.RequestException as ex:
+            logging.error('Web server error: %s' % ex)
+            return
+        with resp:
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                try:
+                    xx = json.loads(line)
+                except ValueError as ex:
+                    logging.error('get_configurations: %s' % ex)
+                    return
+                if not xx['success']:
+                    logging.error('%s/%s: %s' % (xx.get('alias'), xx.get('device'), xx['msg']))
+                    continue
+                yield xx['alias'], xx['device'], xx['value']
 
     # Get the history of the device configuration for the variables 
     # in plist.  The variables are dot-separated names with the first
@@ -110,16 +239,12 @@ class configdb(object):
             logging.error('%s' % ex)
             xx = []
 
-        # try to clean up superfluous keys from serialization
+        # try to clean up superfluous keys from serialization (e.g. '_id')
         if 'value' in xx:
+            keep = set(plist)
             try:
-                for item in xx['value']:
-                    bad_keys = []
-                    for kk in item.keys():
-                        if not kk.isalnum():
-                            bad_keys += kk
-                    for bb in bad_keys:
-                        item.pop(bb, None)
+                xx['value'] = [{kk: vv for kk, vv in item.items() if kk.isalnum() or kk in keep}
+                               for item in xx['value']]
             except Exception:
                 pass
 
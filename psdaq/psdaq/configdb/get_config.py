@@ -42,6 +42,15 @@ def get_config_with_params(db_url, instrument, db_name, cfgtype, detname):
 
     return cfg_no_RO_names
 
+# configurations of many detectors (names with the segment) in one request
+def get_configs_with_params(db_url, instrument, db_name, cfgtype, detnames):
+    create = False
+    mycdb = cdb.configdb(db_url, instrument, create, db_name)
+    cfgs = mycdb.get_configurations([(cfgtype, detname) for detname in detnames])
+    for (alias, detname), cfg in cfgs.items():
+        if not cfg: raise ValueError('Config for instrument/detname %s/%s not found. dbase url: %s, db_name: %s, config_style: %s'%(instrument,detname,db_url,db_name,cfgtype))
+    return {detname: remove_read_only(cfg) for (alias, detname), cfg in cfgs.items()}
+
 def get_config_json(*args):
     return json.dumps(get_config(*args))
 
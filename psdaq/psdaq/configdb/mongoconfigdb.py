@@ -1,5 +1,5 @@
 from pymongo import *
-from .typed_json import cdict
+from .typed_json import cdict, project
 import datetime
 import time, re, sys
 
@@ -215,6 +215,52 @@ class configdb(object):
         #except:
         #    return None
 
+    # Retrieve the configurations of many devices with one query per
+    # collection.  pairs is a list of (key_or_alias, device) and fields an
+    # optional list of dot-separated names to return instead of whole
+    # configurations (see typed_json.project).  Yields
+    # (key_or_alias, device, configuration), with None for those not found.
+    def iter_configurations(self, pairs, fields=None, hutch=None):
+        if hutch is None:
+            hc = self.hutch_coll
+        else:
+            hc = self.cdb[hutch]
+        keys = {}
+        for key_or_alias, device in pairs:
+            if key_or_alias not in keys:
+                if isinstance(key_or_alias, str):
+                    try:
+                        keys[key_or_alias] = self.get_key(key_or_alias, hutch)
+                    except NameError:
+                        keys[key_or_alias] = None
+                else:
+                    keys[key_or_alias] = key_or_alias
+        entries = {c['key']: {l['device']: l['configs'][0] for l in c['devices']}
+                   for c in hc.find({'key': {'$in': list(set(keys.values()))}})}
+        cfgs = {}
+        for key_or_alias, device in pairs:
+            cfg = entries.get(keys[key_or_alias], {}).get(device)
+            if cfg is not None:
+                cfgs.setdefault(cfg['collection'], set()).add(cfg['_id'])
+        projection = None
+        if fields is not None:
+            # only the outermost of nested names, mongo refuses path collisions
+            outer = [f for f in fields
+                     if not any(f.startswith(g + '.') for g in fields if g != f)]
+            projection = {}
+            for f in outer + ['detType:RO', 'detName:RO', 'detId:RO', 'doc:RO', 'alg:RO', 'version:RO']:
+                projection['config.' + f] = 1
+                projection['config.:types:.' + f] = 1
+            projection['config.:types:.:enum:'] = 1
+        configs = {}
+        for cname, ids in cfgs.items():
+            for r in self.cdb[cname].find({'_id': {'$in': list(ids)}}, projection):
+                configs[r['_id']] = r['config']
+        for key_or_alias, device in pairs:
+            cfg = entries.get(keys[key_or_alias], {}).get(device)
+            config = None if cfg is None else configs.get(cfg['_id'])
+            yield key_or_alias, device, None if config is None else project(config, fields)
+
     # Return a list of all hutches.
     def get_hutches(self):
         return [v['hutch'] for v in self.cdb.counters.find()]
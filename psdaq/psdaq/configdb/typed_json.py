@@ -1,6 +1,8 @@
 import numpy as np
 import numbers
 import re
+from collections import OrderedDict
+from functools import lru_cache
 
 #
 # The goal here is to assist the writing of JSON files from python.  The 
@@ -86,6 +88,25 @@ import re
 #                1 if the path does not exist.
 #                2 if the type conversion failed
 #                3 if typed JSON dictionary is somehow malformed.
+#      setValues(dict, values)
+#          - Given a dictionary, set many elements at once.  values maps names
+#            to strings (as for updateValue), numbers, lists or numpy arrays,
+#            which are converted and range checked array-at-a-time.  Returns
+#            a dictionary of the names that were not set, mapped to the
+#            updateValue status.
+#      validate(dict, values=None)
+#          - Check values (a dictionary of names and values, as for
+#            setValues) or all values in the dictionary against its types.
+#            Returns a dictionary mapping the invalid names to an error string.
+#      project(dict, fields)
+#          - Return a typed JSON dictionary with only the values and
+#            subtrees named in the list fields, their types, and the
+#            detType/detName/detId/doc/alg fields.
+#
+# These all use a compiled form of the ":types:" dictionary (getSchema),
+# which maps the name path of each value to its type, enum and range.
+# Schemas are cached by the identity of the ":types:" dictionary, so the
+# types of a dictionary should not be modified after it was used here.
 
 typerange = {
     "UINT8"   : (0, 2**8 - 1), 
@@ -726,6 +747,189 @@ class cdict(object):
 #
 ########################################################################
 
+#
+# The types of a typed JSON dictionary, compiled into a table that maps the
+# name path (names only, no list indices) of each value to a Field.
+#
+class Field(object):
+    __slots__ = ('type', 'enum', 'shape', 'size', 'range', 'enumvalues', 'error')
+
+    def __init__(self, t, e):
+        if isinstance(t, list):
+            self.type  = t[0]
+            self.shape = tuple(t[1:])
+            self.size  = int(np.prod(self.shape))
+        else:
+            self.type  = t
+            self.shape = None
+            self.size  = None
+        self.error = None
+        self.enum  = None
+        self.range = None
+        self.enumvalues = None
+        try:
+            if self.type in typerange.keys():
+                self.range = typerange[self.type]
+            elif self.type in e.keys():
+                self.enum = e[self.type]
+                self.enumvalues = np.array(list(self.enum.values()), dtype=np.int64)
+            else:
+                raise KeyError
+        except (KeyError, TypeError):
+            self.error = "getType: Invalid %stype %s" % ("array " if self.shape is not None else "", t)
+
+    def getType(self):
+        if self.error is not None:
+            raise TypeError(self.error)
+        t = self.type if self.enum is None else self.enum
+        return t if self.shape is None else [t] + list(self.shape)
+
+    def convertString(self, v):
+        # As simpleConvert/convertValue
+        if self.error is not None:
+            raise TypeError("convertValue: %s is not a valid type specifier." % self.type)
+        if self.shape is None:
+            return self._convert1(v)
+        vs = v.split(' ')
+        if len(vs) != self.size:
+            raise TypeError("convertValue: value has %d elements, not %d!" % (len(vs), self.size))
+        return [self._convert1(vw) for vw in vs]
+
+    def _convert1(self, v):
+        if self.enum is not None:
+            r = self.enum.get(v)
+            if r is not None:
+                return r
+            if int(v) in self.enum.values():
+                return int(v)
+            raise TypeError("convertValue: %s is not a valid enum of %s" % (v, self.type))
+        elif self.type == 'CHARSTR':
+            return v
+        elif self.range is None:
+            return float(v)
+        v = int(v)
+        if v >= self.range[0] and v <= self.range[1]:
+            return v
+        raise ValueError("convertValue: %s is not in range of %s!" % (v, self.type))
+
+    def convert(self, value):
+        # Like convertString, but also for numbers, lists and numpy arrays,
+        # which are checked all at once.  Arrays are returned as flat lists.
+        if isinstance(value, str):
+            return self.convertString(value)
+        if self.error is not None:
+            raise TypeError("convertValue: %s is not a valid type specifier." % self.type)
+        a = np.asarray(value)
+        if self.shape is None:
+            if a.ndim != 0:
+                raise TypeError("convertValue: scalar expected, not %d elements!" % a.size)
+            return self._check(a.reshape(1)).tolist()[0]
+        if a.size != self.size:
+            raise TypeError("convertValue: value has %d elements, not %d!" % (a.size, self.size))
+        return self._check(a.ravel()).tolist()
+
+    def _check(self, a):
+        if self.type == 'CHARSTR':
+            return a.astype(str)
+        if a.dtype.kind in 'US':
+            if self.enum is not None:
+                a = np.array([self.enum[x] if x in self.enum else int(x) for x in a.tolist()], dtype=np.int64)
+            elif self.range is None:
+                a = a.astype(np.float64)
+            else:
+                a = np.array([int(x) for x in a.tolist()])
+        elif a.dtype.kind not in 'biuf':
+            raise TypeError("convertValue: cannot convert %s to %s" % (a.dtype, self.type))
+        if self.range is None and self.enum is None:
+            return a.astype(np.float64)
+        if a.dtype.kind == 'f':
+            if not np.all(np.floor(a) == a):
+                raise ValueError("convertValue: non-integer value for %s!" % self.type)
+        if self.enum is not None:
+            bad = ~np.isin(a, self.enumvalues)
+            if bad.any():
+                raise TypeError("convertValue: %s is not a valid enum of %s" % (a[bad][0], self.type))
+            return a.astype(np.int64)
+        if a.size and (int(a.min()) < self.range[0] or int(a.max()) > self.range[1]):
+            v = a.min() if int(a.min()) < self.range[0] else a.max()
+            raise ValueError("convertValue: %s is not in range of %s!" % (v, self.type))
+        return a.astype(np.uint64 if self.type == 'UINT64' else np.int64)
+
+class Schema(object):
+    def __init__(self, types):
+        self.types  = types
+        self.enums  = types.get(':enum:', {})
+        self.fields = {}
+        self.nodes  = set()
+        self._paths = {}            # name path with list indices -> Field
+        self._compile(types, ())
+
+    def _compile(self, t, path):
+        self.nodes.add(path)
+        for k, v in t.items():
+            if k == ':enum:' and path == ():
+                continue
+            if isinstance(v, dict):
+                self._compile(v, path + (k,))
+            else:
+                self.fields[path + (k,)] = Field(v, self.enums)
+
+    def field(self, path):
+        try:
+            return self._paths[path]
+        except KeyError:
+            f = self._paths[path] = self.fields.get(tuple(i for i in path if not isinstance(i, int)))
+            return f
+
+_schema_cache = OrderedDict()
+_schema_cache_size = 64
+
+def getSchema(types):
+    key = id(types)
+    entry = _schema_cache.get(key)
+    if entry is not None and entry.types is types:
+        _schema_cache.move_to_end(key)
+        return entry
+    entry = Schema(types)
+    _schema_cache[key] = entry
+    if len(_schema_cache) > _schema_cache_size:
+        _schema_cache.popitem(last=False)
+    return entry
+
+@lru_cache(maxsize=65536)
+def _splitname(name):
+    n = splitname(name)
+    return None if n is None else tuple(n)
+
+_missing = object()
+
+def _walk(v, n):
+    try:
+        for i in n:
+            v = v[i]
+    except Exception:
+        return _missing
+    return v
+
+#
+# Find the dictionary holding the ":types:" of name path n, either
+# typed_json itself or, for a dictionary of typed JSON dictionaries, the
+# one named by the first element of n.  Returns (dictionary, schema,
+# remaining path), (None, None, None) if there is no such element or
+# raises TypeError if it has no types.
+#
+def _locate(typed_json, n):
+    if ':types:' in typed_json:
+        return typed_json, getSchema(typed_json[':types:']), n
+    if len(n) == 0 or not isinstance(n[0], str) or n[0] not in typed_json:
+        return None, None, None
+    v = typed_json[n[0]]
+    if not isinstance(v, dict):
+        return None, None, None
+    if ':types:' not in v:
+        raise TypeError("getType: First argument should be a typed JSON dictionary!")
+    return v, getSchema(v[':types:']), n[1:]
+
 # A little helper function to pull out type information from a typed
 # JSON dictionary.  The second argument is either a fully dotted ('b.0.c')
 # or python-style ('b0.c') name.
@@ -739,47 +943,18 @@ class cdict(object):
 def getType(typed_json, name):
     if not isinstance(typed_json, dict):
         raise TypeError("getType: First argument should be a typed JSON dictionary!")
-    try:
-        t = typed_json[':types:']
-        try:
-            e = t[':enum:']
-        except:
-            e = {}
-    except:
-        t = None
-    v = typed_json
-    n = splitname(name)
-    for i in n:
-        try:
-            v = v[i]
-            if t is None:
-                if ':types:' not in v.keys():
-                    raise TypeError("getType: First argument should be a typed JSON dictionary!")
-                t = v[':types:']
-                try:
-                    e = t[':enum:']
-                except:
-                    e = {}
-            elif not isinstance(i, numbers.Number):
-                t = t[i]
-        except TypeError:
-            raise
-        except:
-            return None
-    if isinstance(t, list):
-        if t[0] in typerange.keys():
-            return t
-        if t[0] in e.keys():
-            t = list(t) # Make a copy!
-            t[0] = e[t[0]]
-            return t
-        raise TypeError("getType: Invalid array type %s" % t[0])
-    else:
-        if t in typerange.keys():
-            return t
-        if t in e.keys():
-            return e[t]
-        raise TypeError("getType: Invalid type %s" % t)
+    n = _splitname(name)
+    if n is None:
+        return None
+    v, schema, n = _locate(typed_json, n)
+    if v is None or _walk(v, n) is _missing:
+        return None
+    f = schema.field(n)
+    if f is None:
+        if tuple(i for i in n if not isinstance(i, int)) in schema.nodes:
+            raise TypeError("getType: %s is not a value" % name)
+        return None
+    return f.getType()
 
 #
 # Get the value from a typed JSON dictionary.
@@ -787,14 +962,11 @@ def getType(typed_json, name):
 def getValue(typed_json, name):
     if not isinstance(typed_json, dict):
         raise TypeError("getType: First argument should be a typed JSON dictionary!")
-    v = typed_json
-    n = splitname(name)
-    for i in n:
-        try:
-            v = v[i]
-        except:
-            return None
-    return v
+    n = _splitname(name)
+    if n is None:
+        return None
+    v = _walk(typed_json, n)
+    return None if v is _missing else v
 
 #
 # Convert a string, v, to a value of the specified simple type, t.  e is an
@@ -833,6 +1005,32 @@ def convertValue(v, t, e={}):
     else:
         raise TypeError("convertValue: type must be a str or list.")
 
+#
+# Find the parent dictionary and Field of name.  Returns (status, parent,
+# key, field) with the updateValue status.
+#
+def _lookup(typed_json, name):
+    if not isinstance(typed_json, dict):
+        return 3, None, None, None
+    n = _splitname(name)
+    if n is None or len(n) == 0:
+        return 1, None, None, None
+    try:
+        v, schema, n = _locate(typed_json, n)
+    except TypeError:
+        return 3, None, None, None
+    if v is None or len(n) == 0:
+        return 1, None, None, None
+    p = _walk(v, n[:-1])
+    f = schema.field(n)
+    if not isinstance(p, dict) or n[-1] not in p:
+        return 1, None, None, None
+    if f is None:
+        # a dictionary, not a value: conversion fails
+        nodes = tuple(i for i in n if not isinstance(i, int)) in schema.nodes
+        return 2 if nodes else 1, None, None, None
+    return 0, p, n[-1], f
+
 #
 # Store new values into a typed JSON dictionary.  The value here is always
 # a string.  If we have an array value, it will be a space-separated list
@@ -845,41 +1043,113 @@ def convertValue(v, t, e={}):
 #     =3 - invalid dictionary
 #
 def updateValue(typed_json, name, value):
-    if not isinstance(typed_json, dict):
-        return 3
+    status, p, k, f = _lookup(typed_json, name)
+    if status:
+        return status
     try:
-        t = typed_json[':types:']
-        try:
-            e = t[':enum:']
-        except:
-            e = {}
-    except:
-        t = None
-    v = typed_json
-    n = splitname(name)
-    ln = n[-1]
-    n = n[:-1]
-    for i in n:
-        try:
-            v = v[i]
-            if t is None:
-                if ':types:' not in v.keys():
-                    return 3
-                t = v[':types:']
-                try:
-                    e = t[':enum:']
-                except:
-                    e = {}
-            elif not isinstance(i, numbers.Number):
-                t = t[i]
-        except:
-            return 1
-    # t and v better be dictionaries with an entry ln!
-    if (not isinstance(v, dict) or not isinstance(t, dict) or 
-        ln not in v.keys() or ln not in t.keys()):
-        return 1
-    try:
-        v[ln] = convertValue(value, t[ln], e)
+        p[k] = f.convertString(value)
         return 0
     except:
         return 2
+
+#
+# Store many values.  Values are all converted before any is stored; the
+# names that failed are returned with their updateValue status.
+#
+def setValues(typed_json, values):
+    failed = {}
+    converted = []
+    for name, value in values.items():
+        status, p, k, f = _lookup(typed_json, name)
+        if status == 0:
+            try:
+                converted.append((p, k, f.convert(value)))
+                continue
+            except:
+                status = 2
+        failed[name] = status
+    for p, k, value in converted:
+        p[k] = value
+    return failed
+
+def _leaves(v, schema, n, prefix):
+    if isinstance(v, dict):
+        for k, vv in v.items():
+            if k != ':types:':
+                yield from _leaves(vv, schema, n + (k,), prefix)
+    elif isinstance(v, list) and (len(v) == 0 or isinstance(v[0], dict)):
+        for i, vv in enumerate(v):
+            yield from _leaves(vv, schema, n + (i,), prefix)
+    else:
+        yield namify(prefix + list(n)), schema.field(n), v
+
+#
+# Check values (names and values as for setValues) or all values of
+# typed_json against the types.  Returns {name: error string}.
+#
+def validate(typed_json, values=None):
+    errors = {}
+    if values is None:
+        if not isinstance(typed_json, dict):
+            return {'': 'Not a dictionary'}
+        if ':types:' in typed_json:
+            tops = [([], typed_json)]
+        else:
+            tops = [([k], v) for k, v in typed_json.items() if isinstance(v, dict)]
+        for prefix, v in tops:
+            if ':types:' not in v:
+                errors[namify(prefix)] = 'no types'
+                continue
+            schema = getSchema(v[':types:'])
+            for name, f, value in _leaves(v, schema, (), prefix):
+                if f is None:
+                    errors[name] = 'no type'
+                    continue
+                try:
+                    f.convert(value)
+                except Exception as e:
+                    errors[name] = str(e)
+        return errors
+    for name, value in values.items():
+        status, p, k, f = _lookup(typed_json, name)
+        if status:
+            errors[name] = {1: 'no such value', 2: 'not a value', 3: 'invalid dictionary'}[status]
+            continue
+        try:
+            f.convert(value)
+        except Exception as e:
+            errors[name] = str(e)
+    return errors
+
+# Information fields kept by a projection.
+_info_keys = ['detType:RO', 'detName:RO', 'detId:RO', 'doc:RO', 'alg:RO', 'version:RO']
+
+#
+# Return the part of the typed JSON config holding the dot-separated names
+# in fields (values or whole subtrees), with their types and the
+# information fields.  Unknown names are skipped.
+#
+def project(config, fields):
+    if fields is None or not config:
+        return config
+    types = config.get(':types:', {})
+    value = {k: config[k] for k in _info_keys if k in config}
+    vtype = {k: types[k] for k in _info_keys if k in types}
+    if ':enum:' in types:
+        vtype[':enum:'] = types[':enum:']
+    for field in fields:
+        names = field.split('.')
+        v, t = config, types
+        for name in names:
+            if not (isinstance(v, dict) and name in v and isinstance(t, dict) and name in t):
+                break
+            v, t = v[name], t[name]
+        else:
+            pv, pt = value, vtype
+            for name in names[:-1]:
+                pv = pv.setdefault(name, {})
+                pt = pt.setdefault(name, {})
+            pv[names[-1]] = v
+            pt[names[-1]] = t
+    value[':types:'] = vtype
+    return value
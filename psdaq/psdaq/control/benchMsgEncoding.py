@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of control message encodings
+
+Builds the messages of one pass through the transitions for a simulated
+partition (rollcall, alloc, connect, configure, beginrun, enable, ...)
+and measures, per transition and encoding, the bytes sent by the
+collection and all clients and the CPU time to encode and decode them.
+The status message published after each transition is measured in full
+and in delta form (platform only sent when it changed).
+"""
+
+import time
+import argparse
+import zmq.utils.jsonapi as json
+from psdaq.control.control import create_msg, encode_msg, decode_msg, encodings
+
+def simulated_platform(nnodes):
+    platform = {'drp': {}, 'teb': {}, 'meb': {}}
+    for i in range(nnodes):
+        level = 'drp' if i % 10 < 8 else ('teb' if i % 10 == 8 else 'meb')
+        id = hash('node%d' % i)
+        platform[level][id] = {
+            'proc_info': {'alias': '%s_%d' % (level, i), 'host': 'drp-srcf-cmp%03d' % (i % 200), 'pid': 10000 + i},
+            'active': 1,
+            'connect_info': {'nic_ip': '172.21.164.%d' % (i % 250), 'max_ev_size': 1 << 20,
+                             'buf_count': 4096, 'readout': i % 8},
+            'det_info': {'readout': 0}}
+    return platform
+
+def transition_msgs(platform):
+    """Returns list of (transition, [sent msgs], [reply msgs])."""
+    ids = [id for level in platform.values() for id in level]
+    msgs = []
+    rollcall = create_msg('rollcall', body={'encodings': encodings()})
+    replies = [create_msg('rollcall', rollcall['header']['msg_id'], id,
+                          body={level: {'proc_info': item['proc_info']}})
+               for level, items in platform.items() for id, item in items.items()]
+    msgs.append(('rollcall', [rollcall], replies))
+    alloc = create_msg('alloc', body={'ids': ids})
+    replies = [create_msg('alloc', alloc['header']['msg_id'], id,
+                          body={level: {'connect_info': item['connect_info']}})
+               for level, items in platform.items() for id, item in items.items()]
+    msgs.append(('alloc', [alloc], replies))
+    for key, body in (('connect', platform), ('configure', {'config_alias': 'BEAM'}),
+                      ('beginrun', {'run_info': {'experiment_name': 'tstx00117', 'run_number': 42}}),
+                      ('beginstep', {}), ('enable', {}), ('disable', {}), ('endstep', {}),
+                      ('endrun', {}), ('unconfigure', {}), ('disconnect', {})):
+        msg = create_msg(key, body=body)
+        replies = [create_msg('ok', msg['header']['msg_id'], id) for id in ids]
+        msgs.append((key, [msg], replies))
+    return msgs
+
+def measure(msgs, encoding, repeat):
+    nbytes = 0
+    t0 = time.process_time()
+    for i in range(repeat):
+        raws = [encode_msg(msg, encoding) for msg in msgs]
+        for raw in raws:
+            decode_msg(raw)
+    cpu = (time.process_time() - t0) / repeat
+    nbytes = sum(len(raw) for raw in raws)
+    return nbytes, cpu
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=500, help='number of nodes (default 500)')
+    parser.add_argument('-r', type=int, default=5, help='repetitions (default 5)')
+    args = parser.parse_args()
+
+    platform = simulated_platform(args.n)
+    print('%d nodes, encodings: %s' % (args.n, ', '.join(encodings())))
+    print('%-12s %-8s %12s %12s' % ('transition', 'encoding', 'bytes', 'cpu ms'))
+    totals = {}
+    for key, sent, replies in transition_msgs(platform):
+        for encoding in encodings():
+            nbytes, cpu = measure(sent + replies, encoding, args.r)
+            print('%-12s %-8s %12d %12.3f' % (key, encoding, nbytes, 1000 * cpu))
+            total = totals.setdefault(encoding, [0, 0.])
+            total[0] += nbytes
+            total[1] += cpu
+    for encoding, (nbytes, cpu) in totals.items():
+        print('%-12s %-8s %12d %12.3f' % ('total', encoding, nbytes, 1000 * cpu))
+
+    # status message published after each transition (JSON, to GUIs)
+    status = create_msg('status', body={'state': 'running', 'transition': 'enable', 'platform': platform,
+                                        'config_alias': 'BEAM', 'recording': False, 'bypass_activedet': False})
+    delta = create_msg('status', body={'state': 'running', 'transition': 'enable', 'delta': True,
+                                       'config_alias': 'BEAM', 'recording': False, 'bypass_activedet': False})
+    for name, msg in (('status', status), ('status delta', delta)):
+        nbytes, cpu = measure([msg], 'json', args.r)
+        print('%-12s %-8s %12d %12.3f' % (name, 'json', nbytes, 1000 * cpu))
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os
 import time
+import math
 import copy
 import socket
 from datetime import datetime, timezone, timedelta
@@ -15,6 +16,10 @@ from psalg.utils.syslog import SysLog
 import string
 from p4p.client.thread import Context
 from threading import Thread, Event
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 PORT_BASE = 29980
 POSIX_TIME_AT_EPICS_EPOCH = 631152000
@@ -518,6 +523,54 @@ def create_msg(key, msg_id=None, sender_id=None, body={}):
            'body': body}
     return msg
 
+#
+# Message encodings of the back end (collection <-> drp/teb/meb).
+# JSON is always supported.  The msgpack encoding is used when msgpack is
+# installed and every client announced it in its rollcall reply header
+# ('encodings' list).  Received messages are decoded by their first byte:
+# JSON objects start with '{' or whitespace, msgpack maps with 0x80 or above.
+#
+def encodings():
+    if msgpack is None:
+        return ['json']
+    return ['msgpack', 'json']
+
+def json_keys(obj):
+    """
+    Copy of obj with map keys converted to strings as JSON does
+    (e.g. the integer sender ids of the platform dict), so that both
+    encodings carry the same payload
+    """
+    if isinstance(obj, dict):
+        return {(k if isinstance(k, str) else json_key_str(k)): json_keys(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [json_keys(v) for v in obj]
+    return obj
+
+def json_key_str(key):
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    return str(key)
+
+def encode_msg(msg, encoding='json'):
+    if encoding == 'msgpack':
+        return msgpack.packb(json_keys(msg), use_bin_type=True)
+    return json.dumps(msg)
+
+def decode_msg(raw):
+    if raw[:1] >= b'\x80':
+        if msgpack is None:
+            raise ValueError('msgpack message received but msgpack is not installed')
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    return json.loads(raw)
+
+def recv_msg(socket, flags=0):
+    return decode_msg(socket.recv(flags=flags))
+
 def error_msg(message):
     body = {'err_info': message}
     return create_msg('error', body=body)
@@ -566,12 +619,12 @@ def wait_for_answers(socket, wait_time, msg_id):
     start = time.time()
     while socket.poll(remaining) == zmq.POLLIN:
         try:
-            msg = socket.recv_json()
+            msg = recv_msg(socket)
         except Exception as ex:
-            logging.error('recv_json(): %s' % ex)
+            logging.error('recv_msg(): %s' % ex)
             continue
         else:
-            logging.debug('recv_json(): %s' % msg)
+            logging.debug('recv_msg(): %s' % msg)
 
         # handle async reports
         if msg['header']['key'] in report_keys:
@@ -590,6 +643,96 @@ def wait_for_answers(socket, wait_time, msg_id):
         remaining = max(0, int(wait_time - 1000*(time.time() - start)))
 
 
+class ResponseCollector():
+    """
+    Collect the replies to one message from a set of ids
+
+    Replies are read as soon as the socket is readable (zmq.Poller), so
+    collection finishes when the last expected id replies.  Each id has
+    its own deadline (e.g. per level); an id is given up when its deadline
+    passes, and collection finishes when no id is left to wait for.
+    Parameters
+    ----------
+    socket: zmq socket
+    msg_id: expected msg_id of replies, or None for the msg_id of the first reply
+    ids: set of ids expected to reply
+    deadlines: dict of id to wait time in milliseconds
+    """
+    def __init__(self, socket, msg_id, ids, deadlines):
+        self.socket = socket
+        self.poller = zmq.Poller()
+        self.poller.register(socket, zmq.POLLIN)
+        self.msg_id = msg_id
+        self.missing = set(ids)
+        self.deadlines = deadlines
+        self.msgs = []
+        self.reports = []
+        self.latency = {}   # id: reply time in seconds
+        self.begin = time.monotonic()
+
+    def waiting(self, now):
+        elapsed = 1000 * (now - self.begin)
+        return {ii for ii in self.missing if self.deadlines[ii] > elapsed}
+
+    def handle(self, msg):
+        global report_keys
+        # handle async reports
+        if msg['header']['key'] in report_keys:
+            self.reports.append(msg)
+            return
+
+        # if msg_id is none take the msg_id of the first message as reference
+        if self.msg_id is None:
+            self.msg_id = msg['header']['msg_id']
+
+        sender_id = msg['header']['sender_id']
+        if msg['header']['msg_id'] != self.msg_id:
+            logging.error('unexpected msg_id: got %s but expected %s' %
+                          (msg['header']['msg_id'], self.msg_id))
+        elif sender_id in self.missing and sender_id in self.waiting(time.monotonic()):
+            self.msgs.append(msg)
+            self.missing.remove(sender_id)
+            self.latency[sender_id] = time.monotonic() - self.begin
+            logging.debug('ResponseCollector: removed %s from ids' % sender_id)
+        else:
+            logging.debug('ResponseCollector: %s not in ids' % sender_id)
+
+    def drain(self):
+        while True:
+            try:
+                msg = recv_msg(self.socket, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            except Exception as ex:
+                logging.error('recv_msg(): %s' % ex)
+                continue
+            logging.debug('recv_msg(): %s' % msg)
+            self.handle(msg)
+
+    def collect(self, progress=None):
+        """
+        Wait for replies, calling progress() about once per second
+        RETURNS: missing ids, replies, reports
+        """
+        next_progress = self.begin + 1.0
+        while True:
+            now = time.monotonic()
+            waiting = self.waiting(now)
+            if not waiting:
+                break
+            wake = self.begin + max(self.deadlines[ii] for ii in waiting) / 1000
+            if progress is not None:
+                wake = min(wake, next_progress)
+            if self.poller.poll(max(0, math.ceil(1000 * (wake - now)))):
+                self.drain()
+            if progress is not None and time.monotonic() >= next_progress:
+                progress()
+                next_progress += 1.0
+        for ii in self.missing:
+            logging.debug('id %s did not respond' % ii)
+        return self.missing, self.msgs, self.reports
+
+
 class CollectionManager():
     def __init__(self, args):
         self.platform = args.p
@@ -617,6 +760,17 @@ class CollectionManager():
         self.experiment_name = None
         self.rollcall_timeout = args.rollcall_timeout
         self.bypass_activedet = False
+        # per-level wait time limits in msec, e.g. {'teb': 5000}
+        self.level_wait = {}
+        for item in args.level_timeout:
+            level, msec = item.split('=')
+            self.level_wait[level] = int(msec)
+        # reply time of each id for the last transitions, e.g. {'configure': {id: sec}}
+        self.transition_times = {}
+        # negotiated at rollcall
+        self.back_encoding = 'json'
+        # platform dict of the last published status (JSON)
+        self.last_status_platform = None
 
         if args.r:
             # active detectors file from command line
@@ -857,33 +1011,43 @@ class CollectionManager():
         return
 
     #
-    # confirm_response -
+    # confirm_response - collect replies of ids to msg_id
+    #
+    # Each id waits at most wait_time msec, or the time set for its
+    # level in level_wait.  Reply times are kept in transition_times.
     #
     def confirm_response(self, socket, wait_time, msg_id, ids, *, progress_txt=None):
-        global report_keys
         logging.debug('confirm_response(): ids = %s' % ids)
-        msgs = []
-        reports = []
-        begin_time = datetime.now(timezone.utc)
-        end_time = begin_time + timedelta(milliseconds=wait_time)
-        while len(ids) > 0 and datetime.now(timezone.utc) < end_time:
-            for msg in wait_for_answers(socket, 1000, msg_id):
-                if msg['header']['key'] in report_keys:
-                    reports.append(msg)
-                elif msg['header']['sender_id'] in ids:
-                    msgs.append(msg)
-                    ids.remove(msg['header']['sender_id'])
-                    logging.debug('confirm_response(): removed %s from ids' % msg['header']['sender_id'])
-                else:
-                    logging.debug('confirm_response(): %s not in ids' % msg['header']['sender_id'])
-                if len(ids) == 0:
-                    break
-                if progress_txt is not None:
-                    self.progressReport(begin_time, end_time, progress_txt=progress_txt)
+        deadlines = {}
         for ii in ids:
-            logging.debug('id %s did not respond' % ii)
+            level = self.id_level(ii)
+            deadlines[ii] = min(wait_time, self.level_wait.get(level, wait_time))
+        begin_time = datetime.now(timezone.utc)
+        end_time = begin_time + timedelta(milliseconds=max(deadlines.values(), default=0))
+        progress = None
+        if progress_txt is not None:
+            progress = lambda: self.progressReport(begin_time, end_time, progress_txt=progress_txt)
+        collector = ResponseCollector(socket, msg_id, ids, deadlines)
+        missing, msgs, reports = collector.collect(progress)
+        if progress_txt is not None and collector.latency:
+            self.transition_times[progress_txt] = collector.latency
+            slowest = max(collector.latency, key=collector.latency.get)
+            logging.debug('%s: %d replies, slowest %s after %.3f s' %
+                          (progress_txt, len(collector.latency),
+                           (self.get_aliases([slowest]) or [slowest])[0], collector.latency[slowest]))
+        # the caller's set is updated, as before
+        ids.intersection_update(missing)
         return ids, msgs, reports
 
+    #
+    # id_level - return level (drp/teb/meb) of id, or None
+    #
+    def id_level(self, id):
+        for level, item in self.cmstate_levels().items():
+            if id in item:
+                return level
+        return None
+
     #
     # process_reports
     #
@@ -898,7 +1062,7 @@ class CollectionManager():
                 logging.error('process_reports() KeyError: %s' % ex)
 
     def service_status(self):
-        msg = self.back_pull.recv_json()
+        msg = recv_msg(self.back_pull)
         logging.debug('service_status() received msg \'%s\'' % msg)
         self.process_reports([msg])
 
@@ -1032,16 +1196,36 @@ class CollectionManager():
             # reply 'ok'
             self.front_rep.send_json(answer)
 
+    #
+    # send_back - send msg to drp/teb/meb clients in the negotiated encoding
+    #
+    def send_back(self, topic, msg):
+        self.back_pub.send_multipart([topic, encode_msg(msg, self.back_encoding)])
+
     def status_msg(self):
         body = {'state': self.state, 'transition': self.lastTransition,
                 'platform': self.cmstate_levels(),
                 'config_alias': str(self.config_alias), 'recording': self.recording, 'bypass_activedet': self.bypass_activedet}
         return create_msg('status', body=body)
 
+    #
+    # report_status - publish status
+    #
+    # The platform dict (the largest part) is only published when it changed
+    # since the last status message, otherwise the body has 'delta': True and
+    # no 'platform' key.  Full status is available with getstatus.
+    #
     def report_status(self):
         logging.debug('status: state=%s transition=%s config_alias=%s recording=%s bypass_activedet=%s' %
                       (self.state, self.lastTransition, self.config_alias, self.recording, self.bypass_activedet))
-        self.front_pub.send_json(self.status_msg())
+        msg = self.status_msg()
+        platform = json.dumps(msg['body']['platform'])
+        if platform == self.last_status_platform:
+            del msg['body']['platform']
+            msg['body']['delta'] = True
+        else:
+            self.last_status_platform = platform
+        self.front_pub.send_json(msg)
 
     # check_answers - report and count errors in answers list
     def check_answers(self, answers):
@@ -1076,7 +1260,7 @@ class CollectionManager():
         # select procs with active flag set
         ids = self.filter_active_set(self.ids)
         msg = create_msg('alloc', body={'ids': list(ids)})
-        self.back_pub.send_multipart([b'all', json.dumps(msg)])
+        self.send_back(b'all', msg)
 
         # make sure all the clients respond to alloc message with their connection info
         retlist, answers, reports = self.confirm_response(self.back_pull, 1000, msg['header']['msg_id'], ids)
@@ -1297,7 +1481,7 @@ class CollectionManager():
             # select procs with active flag set
             ids = self.filter_active_set(self.ids)
             msg = create_msg('connect', body=self.filter_active_dict(self.cmstate_levels()))
-            self.back_pub.send_multipart([b'partition', json.dumps(msg)])
+            self.send_back(b'partition', msg)
 
             retlist, answers, reports = self.confirm_response(self.back_pull, 10000, msg['header']['msg_id'], ids, progress_txt='connect')
             self.process_reports(reports)
@@ -1317,7 +1501,7 @@ class CollectionManager():
         # select procs with active flag set
         ids = self.filter_active_set(self.ids)
         msg = create_msg('disconnect')
-        self.back_pub.send_multipart([b'partition', json.dumps(msg)])
+        self.send_back(b'partition', msg)
 
         retlist, answers, reports = self.confirm_response(self.back_pull, 30000, msg['header']['msg_id'], ids, progress_txt='disconnect')
         self.process_reports(reports)
@@ -1456,52 +1640,103 @@ class CollectionManager():
         newfound_set = set()
         self.cmstate.clear()
         self.ids.clear()
-        msg = create_msg('rollcall')
+        # rollcall is always sent as JSON and announces the encodings
+        # understood here; clients answer with theirs in the header
+        self.back_encoding = 'json'
+        client_encodings = {}
+        msg = create_msg('rollcall', body={'encodings': encodings()})
         begin_time = datetime.now(timezone.utc)
         end_time = begin_time + timedelta(seconds=self.rollcall_timeout)
-        while datetime.now(timezone.utc) < end_time:
-            self.back_pub.send_multipart([b'all', json.dumps(msg)])
-            for answer in wait_for_answers(self.back_pull, 1000, msg['header']['msg_id']):
-                if answer['header']['key'] in report_keys:
-                    self.process_reports([answer])
-                    continue
-                for level, item in answer['body'].items():
-                    alias = item['proc_info']['alias']
-                    responder = level + '/' + alias
-                    if not self.bypass_activedet:
-                        if responder not in required_set:
-                            if responder not in newfound_set:
-                                logging.info('Received response from %s, it does not appear in active detectors file' % responder)
-                                newfound_set.add(responder)
-                            elif responder not in missing_set:
-                                # ignore duplicate response
-                                continue
-                    if level not in self.cmstate:
-                        self.cmstate[level] = {}
-                    id = answer['header']['sender_id']
-                    self.cmstate[level][id] = item
-                    if self.bypass_activedet:
-                        # active detectors file disabled: default to active=1
-                        self.cmstate[level][id]['active'] = 1
-                        if level == 'drp':
-                            self.cmstate[level][id]['det_info'] = {}
-                            self.cmstate[level][id]['det_info']['readout'] = self.platform
-                    elif responder in newfound_set:
-                        # new detector + active detectors file enabled: default to active=0
-                        self.cmstate[level][id]['active'] = 0
-                        if level == 'drp':
-                            self.cmstate[level][id]['det_info'] = {}
-                            self.cmstate[level][id]['det_info']['readout'] = self.platform
-                    else:
-                        # copy values from active detectors file
-                        self.cmstate[level][id]['active'] = json_data['activedet'][level][alias]['active']
-                        if level == 'drp':
-                            self.cmstate[level][id]['det_info'] = json_data['activedet'][level][alias]['det_info'].copy()
-                    self.ids.add(id)
+
+        def handle_answer(answer):
+            for level, item in answer['body'].items():
+                alias = item['proc_info']['alias']
+                responder = level + '/' + alias
+                if not self.bypass_activedet:
+                    if responder not in required_set:
+                        if responder not in newfound_set:
+                            logging.info('Received response from %s, it does not appear in active detectors file' % responder)
+                            newfound_set.add(responder)
+                        elif responder not in missing_set:
+                            # ignore duplicate response
+                            continue
+                if level not in self.cmstate:
+                    self.cmstate[level] = {}
+                id = answer['header']['sender_id']
+                client_encodings[id] = answer['header'].get('encodings', ['json'])
+                self.cmstate[level][id] = item
+                if self.bypass_activedet:
+                    # active detectors file disabled: default to active=1
+                    self.cmstate[level][id]['active'] = 1
+                    if level == 'drp':
+                        self.cmstate[level][id]['det_info'] = {}
+                        self.cmstate[level][id]['det_info']['readout'] = self.platform
+                elif responder in newfound_set:
+                    # new detector + active detectors file enabled: default to active=0
+                    self.cmstate[level][id]['active'] = 0
+                    if level == 'drp':
+                        self.cmstate[level][id]['det_info'] = {}
+                        self.cmstate[level][id]['det_info']['readout'] = self.platform
+                else:
+                    # copy values from active detectors file
+                    self.cmstate[level][id]['active'] = json_data['activedet'][level][alias]['active']
+                    if level == 'drp':
+                        self.cmstate[level][id]['det_info'] = json_data['activedet'][level][alias]['det_info'].copy()
+                self.ids.add(id)
             self.subtract_clients(missing_set)
-            if not missing_set:
+
+        # The rollcall is sent again (for clients that subscribed late) while
+        # required clients are missing, at growing intervals of 1, 2, 4 and
+        # 8 seconds.  Answers are collected during at least the first second,
+        # also when all required clients answered earlier, so that clients
+        # missing from the active detectors file are still found.
+        poller = zmq.Poller()
+        poller.register(self.back_pull, zmq.POLLIN)
+        begin = time.monotonic()
+        end = begin + self.rollcall_timeout
+        resend_interval = 1.0
+        next_send = begin
+        next_progress = begin + 1.0
+        while True:
+            now = time.monotonic()
+            if not required_set or not missing_set:
+                stop = begin + 1.0
+            else:
+                stop = end
+            if now >= stop:
                 break
-            self.progressReport(begin_time, end_time, progress_txt='rollcall')
+            if now >= next_send:
+                self.send_back(b'all', msg)
+                next_send = now + resend_interval
+                resend_interval = min(2 * resend_interval, 8.0)
+            if now >= next_progress:
+                self.progressReport(begin_time, end_time, progress_txt='rollcall')
+                next_progress += 1.0
+            wake = min(stop, next_send, next_progress)
+            if not poller.poll(max(0, math.ceil(1000 * (wake - now)))):
+                continue
+            while True:
+                try:
+                    answer = recv_msg(self.back_pull, flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                except Exception as ex:
+                    logging.error('recv_msg(): %s' % ex)
+                    continue
+                logging.debug('recv_msg(): %s' % answer)
+                if answer['header']['key'] in report_keys:
+                    self.process_reports([answer])
+                elif answer['header']['msg_id'] != msg['header']['msg_id']:
+                    logging.error('unexpected msg_id: got %s but expected %s' %
+                                  (answer['header']['msg_id'], msg['header']['msg_id']))
+                else:
+                    handle_answer(answer)
+
+        # use msgpack when all clients understand it
+        if self.ids and all('msgpack' in client_encodings[id] for id in self.ids) and \
+                'msgpack' in encodings():
+            self.back_encoding = 'msgpack'
+        logging.info('back end message encoding: %s' % self.back_encoding)
 
         for dup in self.check_for_dups():
             self.report_error('duplicate alias responded to rollcall: %s' % dup)
@@ -1684,7 +1919,7 @@ class CollectionManager():
             body['phase1Info'] = self.phase1Info[transition]
             logging.debug('condition_common(%s): body = %s' % (transition, body))
         msg = create_msg(transition, body=body)
-        self.back_pub.send_multipart([b'partition', json.dumps(msg)])
+        self.send_back(b'partition', msg)
         # now that the message has been sent, delete the phase1
         # info so we don't send stale information next time.
         self.phase1Info.pop(transition,None)
@@ -1843,7 +2078,7 @@ class CollectionManager():
         self.slow_update_enabled = False
 
         msg = create_msg('reset')
-        self.back_pub.send_multipart([b'all', json.dumps(msg)])
+        self.send_back(b'all', msg)
         self.lastTransition = 'reset'
         return True
 
@@ -1877,6 +2112,7 @@ def main():
     parser.add_argument('-S', metavar='SLOW_UPDATE_RATE', type=int, choices=(0, 1, 5, 10), help='slow update rate (Hz, default 0)')
     parser.add_argument('-T', type=int, metavar='P2_TIMEOUT', default=7500, help='phase 2 timeout msec (default 7500)')
     parser.add_argument('--rollcall_timeout', type=int, default=30, help='rollcall timeout sec (default 30)')
+    parser.add_argument('--level_timeout', metavar='LEVEL=MSEC', action='append', default=[], help='max reply time of a level (e.g. teb=5000)')
     parser.add_argument('-v', action='store_true', help='be verbose')
     parser.add_argument("--user", default="tstopr", help='HTTP authentication user')
     parser.add_argument("--password", default="pcds", help='HTTP authentication password')
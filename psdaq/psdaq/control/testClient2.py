@@ -9,7 +9,7 @@ import time
 import copy
 import socket
 import zmq
-from psdaq.control.control import back_pull_port, back_pub_port, create_msg
+from psdaq.control.control import back_pull_port, back_pub_port, create_msg, encodings, decode_msg
 import argparse
 import logging
 from psdaq.control.syslog import SysLog
@@ -61,9 +61,9 @@ class Client:
             else:
                 logging.debug('topic=<%s>' % topic)
                 try:
-                    msg = json.loads(rawmsg)
+                    msg = decode_msg(rawmsg)
                 except Exception as ex2:
-                    logging.error('json.loads() exception: %s' % ex2)
+                    logging.error('decode_msg() exception: %s' % ex2)
                 else:
                     key = msg['header']['key']
                     handle_request[key](msg)
@@ -76,6 +76,8 @@ class Client:
                         'host': self.hostname,
                         'pid': self.pid}}}
         reply = create_msg('rollcall', msg['header']['msg_id'], self.id, body=body)
+        # announce the message encodings understood by this client
+        reply['header']['encodings'] = encodings()
         self.push.send_json(reply)
 
     def handle_alloc(self, msg):
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Load test of transition handling
+
+Starts many simulated drp/teb/meb clients (threads) connected to the
+collection side over ipc:// sockets, then measures how long rollcall,
+configure and beginrun take until every client replied.
+"""
+
+import os
+import time
+import random
+import tempfile
+import threading
+import argparse
+import logging
+import zmq
+import zmq.utils.jsonapi as json
+from psdaq.control.control import ResponseCollector, create_msg
+
+class SimClient(threading.Thread):
+    def __init__(self, context, pub_addr, pull_addr, level, index, max_delay):
+        super().__init__(daemon=True)
+        self.level = level
+        self.alias = '%s_%d' % (level, index)
+        self.id = hash(self.alias)
+        self.max_delay = max_delay
+        self.sub = context.socket(zmq.SUB)
+        self.sub.connect(pub_addr)
+        self.sub.setsockopt(zmq.SUBSCRIBE, b'')
+        self.push = context.socket(zmq.PUSH)
+        self.push.connect(pull_addr)
+
+    def run(self):
+        while True:
+            try:
+                topic, rawmsg = self.sub.recv_multipart()
+            except zmq.ContextTerminated:
+                break
+            msg = json.loads(rawmsg)
+            key = msg['header']['key']
+            if key == 'exit':
+                break
+            if key == 'rollcall':
+                body = {self.level: {'proc_info': {'alias': self.alias, 'host': 'localhost', 'pid': os.getpid()}}}
+            else:
+                # simulated work
+                time.sleep(random.uniform(0, self.max_delay))
+                body = {}
+            self.push.send_json(create_msg(key, msg['header']['msg_id'], self.id, body=body))
+        self.sub.close(linger=0)
+        self.push.close(linger=0)
+
+def transition(pub, pull, key, ids, wait_time):
+    msg = create_msg(key)
+    begin = time.monotonic()
+    pub.send_multipart([b'partition', json.dumps(msg)])
+    collector = ResponseCollector(pull, msg['header']['msg_id'], ids, {ii: wait_time for ii in ids})
+    missing, msgs, reports = collector.collect()
+    elapsed = time.monotonic() - begin
+    latency = sorted(collector.latency.values())
+    if latency:
+        print('%-12s %6d replies %5d missing  total %8.3f s  median %8.3f s  max %8.3f s' %
+              (key, len(msgs), len(missing), elapsed, latency[len(latency) // 2], latency[-1]))
+    else:
+        print('%-12s no replies' % key)
+    return missing, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=300, help='number of clients (default 300)')
+    parser.add_argument('-d', type=float, default=0.05, help='max simulated work per transition in sec (default 0.05)')
+    parser.add_argument('-T', type=int, default=10000, help='timeout msec (default 10000)')
+    parser.add_argument('-v', action='store_true', help='be verbose')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.v else logging.WARNING)
+
+    tmpdir = tempfile.mkdtemp()
+    pub_addr = 'ipc://%s/back_pub' % tmpdir
+    pull_addr = 'ipc://%s/back_pull' % tmpdir
+    context = zmq.Context(1)
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    pub.bind(pub_addr)
+    pull = context.socket(zmq.PULL)
+    pull.bind(pull_addr)
+
+    levels = ['drp'] * 8 + ['teb', 'meb']
+    clients = [SimClient(context, pub_addr, pull_addr, levels[i % len(levels)], i, args.d) for i in range(args.n)]
+    for client in clients:
+        client.start()
+
+    # rollcall until all clients subscribed (slow joiners miss the first ones)
+    ids = {client.id for client in clients}
+    missing = set(ids)
+    begin = time.monotonic()
+    while missing and time.monotonic() - begin < args.T / 1000:
+        msg = create_msg('rollcall')
+        pub.send_multipart([b'all', json.dumps(msg)])
+        collector = ResponseCollector(pull, msg['header']['msg_id'], missing, {ii: 500 for ii in missing})
+        missing, msgs, reports = collector.collect()
+    print('%-12s %6d clients  %5d missing  total %8.3f s' % ('rollcall', args.n, len(missing), time.monotonic() - begin))
+
+    for key in ('configure', 'beginrun', 'endrun', 'unconfigure'):
+        transition(pub, pull, key, ids, args.T)
+
+    pub.send_multipart([b'all', json.dumps(create_msg('exit'))])
+    for client in clients:
+        client.join(1)
+    pub.close(linger=0)
+    pull.close(linger=0)
+    context.term()
+
+if __name__ == '__main__':
+    main()
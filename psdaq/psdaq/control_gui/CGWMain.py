@@ -354,7 +354,8 @@ class CGWMain(QWZMQListener) :
                     cp.s_state      = body['state']
                     cp.s_cfgtype    = body['config_alias'] # BEAM/NO BEAM
                     cp.s_recording  = body['recording']    # True/False
-                    cp.s_platform   = body.get('platform', None) # dict
+                    if not body.get('delta', False) : # platform is only sent when changed
+                        cp.s_platform = body.get('platform', None) # dict
 
                     #====
                     if wctrl is not None : wctrl.set_but_ctrls()
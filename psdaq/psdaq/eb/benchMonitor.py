@@ -0,0 +1,90 @@
+import argparse
+import threading
+import tempfile
+import time
+import zmq
+import numpy as np
+from psdaq.eb.monBuffer import MonCollector
+
+# Benchmark of the ebMonitor sample path: a local PUB socket publishes
+# (hostname, metrics) messages for many simulated event builders, the
+# MonCollector receives them, and once per tick the new and last bins of
+# each source are made as for the bokeh update.  Reports received/dropped
+# samples, the time to bin a tick and the number of values sent per tick
+# compared to streaming every raw sample.
+
+columns = ['EventCount', 'BatchCount', 'FreeBatchCnt', 'FreeEpochCnt', 'FreeEventCnt']
+
+def publish(context, address, nsources, rate, batch, duration, sent):
+    socket = context.socket(zmq.PUB)
+    socket.setsockopt(zmq.SNDHWM, 0)
+    socket.bind(address)
+    time.sleep(0.5)                     # let the subscriber connect
+    rng    = np.random.default_rng(0)
+    period = batch / rate
+    next_t = time.time()
+    end    = next_t + duration
+    while next_t < end:
+        now = time.time()
+        if now < next_t:
+            time.sleep(next_t - now)
+        for i in range(nsources):
+            times   = (next_t + np.arange(batch) / rate).tolist()
+            metrics = {'time': times}
+            for column in columns:
+                metrics[column] = rng.integers(0, 1000, batch).tolist()
+            socket.send_json(['drp-srcf-cmp%03d' % i, metrics])
+            sent[0] += batch
+        next_t += period
+    socket.close(linger=1000)
+
+def main():
+    parser = argparse.ArgumentParser(description='ebMonitor sample path benchmark')
+    parser.add_argument('-n', type=int,   default=100, help='number of sources [100]')
+    parser.add_argument('-r', type=float, default=100, help='samples/s per source [100]')
+    parser.add_argument('-b', type=int,   default=10,  help='samples per message [10]')
+    parser.add_argument('-t', type=float, default=10,  help='duration in seconds [10]')
+    parser.add_argument('--bins', type=int, default=400, help='bins per window [400]')
+    parser.add_argument('--window', type=float, default=300, help='visible window in seconds [300]')
+    args = parser.parse_args()
+
+    context   = zmq.Context()
+    address   = 'ipc://%s/ebmon' % tempfile.mkdtemp()
+    sent      = [0]
+    publisher = threading.Thread(target=publish, args=(context, address, args.n, args.r, args.b, args.t, sent))
+    publisher.start()
+    collector = MonCollector(context, address, columns, capacity=int(args.r * args.window))
+
+    # as ebMonitor's update(): new bins are streamed, the last one patched
+    ticks   = []
+    lastBin = {}
+    prev    = 0
+    while publisher.is_alive():
+        time.sleep(1)
+        t0    = time.perf_counter()
+        known = all(hostname in lastBin for hostname in collector.sources())
+        since = min(lastBin.values()) if lastBin and known else None
+        data  = collector.binned(args.window * 1000, args.bins, since)
+        nsent = 0
+        for hostname, binned in data.items():
+            t = binned['time']
+            i = np.searchsorted(t, lastBin[hostname]) if hostname in lastBin else 0
+            nsent += len(t) - i
+            if len(t):
+                lastBin[hostname] = t[-1]
+        ticks.append((time.perf_counter() - t0,
+                      nsent * (1 + 3 * len(columns)),
+                      (collector.received - prev) * (1 + len(columns))))
+        prev = collector.received
+    time.sleep(0.5)
+    collector.stop()
+    context.term()
+
+    dt, binned, raw = np.array(ticks).T
+    print('sources %d  rate %g/s  sent %d  received %d  dropped %.2f%%' %
+          (args.n, args.r, sent[0], collector.received, 100. * (sent[0] - collector.received) / max(sent[0], 1)))
+    print('bin time per tick: mean %.2f ms  max %.2f ms' % (1e3 * dt.mean(), 1e3 * dt.max()))
+    print('values per tick:   binned %d  raw stream %d' % (binned.mean(), raw.mean()))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import zmq
 import time
 import itertools
+import numpy as np
 from functools import partial
 from bokeh.plotting import figure
 from bokeh.layouts import gridplot
@@ -11,6 +12,7 @@ from bokeh.models.ranges import DataRange1d
 from bokeh.models import ColumnDataSource, DatetimeTickFormatter, Legend, LegendItem
 from bokeh.application.handlers.function import FunctionHandler
 from bokeh.application.handlers.handler import Handler
+from psdaq.eb.monBuffer import MonCollector
 
 '''
 class MyHandler(Handler):
@@ -23,14 +25,13 @@ class MyHandler(Handler):
 '''
 
 
-def make_document(context, doc):
+metrics = ['EventCount', 'BatchCount', 'FreeBatchCnt', 'FreeEpochCnt', 'FreeEventCnt']
+window  = 5*60*1000                     # visible time range, ms
+nbins   = 400                           # ~ one bin per pixel
+
+def make_document(collector, doc):
     print('make document')
 
-    socket = context.socket(zmq.SUB)
-    socket.connect('tcp://psdev7b:55562')
-    socket.setsockopt(zmq.SUBSCRIBE, b'')
-    poller = zmq.Poller()
-    poller.register(socket, zmq.POLLIN)
     sources = {}
     figures = []
     columns = []
@@ -88,19 +89,23 @@ def make_document(context, doc):
     doc.add_root(layout)
     doc.title = 'Event Builder monitor'
 
+    lastBin = {}                        # time of the last bin sent, by host
+
     def update():
-        while True:
-            socks = dict(poller.poll(timeout=0))
-            if not socks:
-                break
-            hostname, metrics = socket.recv_json()
-            #print(hostname, metrics)
+        # Samples are received by the collector thread.  Only min/max/mean
+        # bins are sent: new bins are streamed and the last (still filling)
+        # bin is patched, all sources combined into one update
+        known = all(hostname in lastBin for hostname in collector.sources())
+        since = min(lastBin.values()) if lastBin and known else None
+        data  = collector.binned(window, nbins, since)
+        doc.hold('combine')
+        for hostname, binned in data.items():
             if hostname not in sources:
-                data = {'time': [], 'EventCount': [], 'BatchCount': [],
-                                    'FreeBatchCnt': [], 'FreeEpochCnt': [], 'FreeEventCnt': []}
-                source = ColumnDataSource(data=data)
+                source = ColumnDataSource(data=binned)
                 color  = next(color_cycle)
                 for i in range(len(figures)):
+                    figures[i].varea(x='time', y1=columns[i]+'_min', y2=columns[i]+'_max', source=source,
+                                     fill_alpha=0.2, color=color)
                     line = figures[i].line(x='time', y=columns[i], source=source,
                                            line_width=1, color=color)
                     #if i == 0:
@@ -108,15 +113,27 @@ def make_document(context, doc):
                 figleg.line(x=0, y=0, line_width=2, color=color, legend=hostname)
                 sources[hostname] = source
                 print('new host', hostname)
-            # shift timestamp from UTC to current timezone and convert to milliseconds
-            metrics['time'] = [(t - time.altzone)*1000 for t in metrics['time']]
-            sources[hostname].stream(metrics)
+            elif hostname not in lastBin:
+                sources[hostname].data = binned
+            else:
+                source = sources[hostname]
+                i = np.searchsorted(binned['time'], lastBin[hostname])
+                if i < len(binned['time']) and binned['time'][i] == lastBin[hostname]:
+                    last = len(source.data['time']) - 1
+                    source.patch({key: [(last, value[i])] for key, value in binned.items()})
+                    i += 1
+                if i < len(binned['time']):
+                    source.stream({key: value[i:] for key, value in binned.items()}, rollover=nbins)
+            if len(binned['time']):
+                lastBin[hostname] = binned['time'][-1]
+        doc.unhold()
 
     doc.add_periodic_callback(update, 1000)
 
 
-context = zmq.Context()
-apps    = {'/': Application(FunctionHandler(partial(make_document, context)))}
+context   = zmq.Context()
+collector = MonCollector(context, 'tcp://psdev7b:55562', metrics)
+apps      = {'/': Application(FunctionHandler(partial(make_document, collector)))}
 
 server  = Server(apps, port=50007, allow_websocket_origin=['pslogin7c:50007'])
 server.start()
@@ -0,0 +1,146 @@
+import zmq
+import time
+import threading
+import numpy as np
+
+class RingBuffer(object):
+    '''Last capacity samples (time + one value per column) of one source'''
+
+    def __init__(self, columns, capacity=4096):
+        self.columns = columns
+        self._data   = np.full((capacity, 1 + len(columns)), np.nan)
+        self._head   = 0                # next row written
+        self._count  = 0
+
+    def __len__(self):
+        return self._count
+
+    def extend(self, times, metrics):
+        n = len(times)
+        if n == 0:
+            return
+        block = np.full((n, self._data.shape[1]), np.nan)
+        block[:, 0] = times
+        for j, column in enumerate(self.columns):
+            if column in metrics:
+                block[:, 1 + j] = metrics[column]
+        capacity = len(self._data)
+        if n > capacity:
+            block = block[-capacity:]
+            n     = capacity
+        rows = (self._head + np.arange(n)) % capacity
+        self._data[rows] = block
+        self._head  = (self._head + n) % capacity
+        self._count = min(self._count + n, capacity)
+
+    def samples(self, since=None):
+        '''Time ordered copy of the buffered samples (from time since)'''
+        if self._count < len(self._data):
+            parts = [self._data[:self._count]]
+        else:
+            parts = [self._data[self._head:], self._data[:self._head]]
+        if since is not None:
+            parts = [part[np.searchsorted(part[:, 0], since):] for part in parts]
+        return np.concatenate(parts)
+
+    def last(self):
+        '''Time of the latest sample'''
+        return self._data[(self._head - 1) % len(self._data), 0]
+
+    def bins(self, width, first, nbins):
+        return binSamples(self.samples(), self.columns, width, first, nbins)
+
+def binSamples(data, columns, width, first, nbins):
+    '''min/max/mean of each column of time ordered samples in bins
+    [i*width, (i+1)*width) for i in first..first+nbins-1
+
+    Only bins with samples are returned; 'time' is the bin center, so the
+    same bin has the same time in every call.
+    '''
+    t      = data[:, 0]
+    edges  = np.searchsorted(t, width * np.arange(first, first + nbins + 1))
+    counts = np.diff(edges)
+    full   = counts > 0
+    starts = edges[:-1][full]
+    result = {'time': width * (first + np.nonzero(full)[0] + 0.5)}
+    if len(starts) == 0:
+        for column in columns:
+            result[column] = result[column + '_min'] = result[column + '_max'] = np.empty(0)
+        return result
+    values = data[edges[0]:edges[-1], 1:]
+    starts = starts - edges[0]
+    sums   = np.add.reduceat(values, starts)
+    mins   = np.minimum.reduceat(values, starts)
+    maxs   = np.maximum.reduceat(values, starts)
+    means  = sums / counts[full][:, None]
+    for j, column in enumerate(columns):
+        result[column]          = means[:, j]
+        result[column + '_min'] = mins[:, j]
+        result[column + '_max'] = maxs[:, j]
+    return result
+
+class MonCollector(object):
+    '''Receives (hostname, metrics) samples of all sources on a background
+    thread into one RingBuffer per source'''
+
+    def __init__(self, context, address, columns, capacity=4096):
+        self.columns  = columns
+        self.capacity = capacity
+        self.received = 0               # samples
+        self.messages = 0
+        self._buffers = {}
+        self._lock    = threading.Lock()
+        self._socket  = context.socket(zmq.SUB)
+        self._socket.connect(address)
+        self._socket.setsockopt(zmq.SUBSCRIBE, b'')
+        self._running = True
+        self._thread  = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        poller = zmq.Poller()
+        poller.register(self._socket, zmq.POLLIN)
+        while self._running:
+            if not poller.poll(timeout=100):
+                continue
+            while True:
+                try:
+                    hostname, metrics = self._socket.recv_json(flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+                # shift timestamp from UTC to current timezone and convert to milliseconds
+                times = (np.asarray(metrics['time'], dtype=np.float64) - time.altzone) * 1000
+                with self._lock:
+                    buffer = self._buffers.get(hostname)
+                    if buffer is None:
+                        buffer = self._buffers[hostname] = RingBuffer(self.columns, self.capacity)
+                    buffer.extend(times, metrics)
+                    self.received += len(times)
+                    self.messages += 1
+        self._socket.close(linger=0)
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def sources(self):
+        with self._lock:
+            return list(self._buffers)
+
+    def binned(self, window, nbins, since=None):
+        '''Bins of the last window (ms) of every source, on common bin
+        edges ending after the latest sample of any source.  With since,
+        only bins ending after since (ms) are made.'''
+        with self._lock:
+            buffers = [(hostname, buffer) for hostname, buffer in self._buffers.items() if len(buffer)]
+            last    = max((buffer.last() for hostname, buffer in buffers), default=None)
+            if last is None:
+                return {}
+            width = window / nbins
+            end   = int(np.floor(last / width)) + 1
+            first = end - nbins
+            if since is not None:
+                first = max(first, int(np.floor(since / width)))
+            samples = {hostname: buffer.samples(first * width) for hostname, buffer in buffers}
+        return {hostname: binSamples(data, self.columns, width, first, end - first)
+                for hostname, data in samples.items()}
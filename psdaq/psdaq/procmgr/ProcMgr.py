@@ -11,9 +11,27 @@ import io
 from platform import node, python_version
 from getpass import getuser
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 uniqueid_maxlen = 30
 rcFileDefault = '/etc/procmgrd.conf'
+# max number of procServ telnet sessions handled at the same time
+maxWorkersDefault = int(os.environ.get('PROCMGR_MAX_WORKERS', '32'))
+
+#
+# parallelMap
+#
+# Calls func(item) for each item in a thread pool of at most max_workers
+# threads.
+#
+# RETURNS: List of results, in the order of items.
+#
+def parallelMap(func, items, max_workers=maxWorkersDefault):
+    items = list(items)
+    if len(items) < 2 or max_workers < 2:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
 
 #
 # printError
@@ -319,7 +337,8 @@ class ProcMgr:
 
     valid_flag_list = ['X', 'x', 'k', 's', 'u', 'p'] 
 
-    def __init__(self, configfilename, platform, Xterm_list=[], xterm_list=[], procmgr_macro={}, baseport=29000):
+    def __init__(self, configfilename, platform, Xterm_list=[], xterm_list=[], procmgr_macro={}, baseport=29000, max_workers=maxWorkersDefault):
+        self.max_workers = max_workers
         self.pid = self.STRING_NOPID
         self.ppid = self.STRING_NOPID
         self.getid = None
@@ -354,6 +373,9 @@ class ProcMgr:
         # create list for detecting duplicate ids
         dup_list = list()
 
+        # create list of procServ entries to be probed
+        probelist = list()
+
         if (platform == -1):
             print('*** ERR: platform not specified')
             return
@@ -563,54 +585,72 @@ class ProcMgr:
               else:
                   remotePorts.add(tmpport)
 
-          self.pid = b"-"
-          self.ppid = b"-"
-          self.getid = b"-"
-          # open a connection to the control port (procServ)
+          # open a connection to the control port (procServ) later,
+          # all entries at the same time
           telnethost = self.host
           if telnethost == 'localhost':
               telnethost = self.procmgr_macro.get('HOST', 'localhost')
-          try:
-              self.telnet.open(telnethost, self.ctrlport)
-          except:
-              # telnet failed
-              self.tmpstatus = self.STATUS_NOCONNECT
-              # TODO ping each host first, as telnet could fail due to an error
-          else:
-              # telnet succeeded: gather status from procServ banner
-              try: 
-                ok = self.readLogPortBanner()
-              except EOFError:
-                print('EOFError in readLogPortBanner') 
-                ok = False
-              except:
-                ok = False
-              if not ok:
-                  # reading procServ banner failed
-                  print("*** ERR: failed to read procServ banner for \'%s\' on host %s" \
-                          % (self.uniqueid, self.host))
-              # close connection to the logging port (procServ)
-              self.telnet.close()
-
-          if self.getid.endswith(b".log"):
+          probelist.append([telnethost, self.ctrlport, self.uniqueid, self.host, \
+              self.cmd, self.flags, self.conda, self.env, self.rtprio])
+
+        # gather status from procServ banners
+        results = parallelMap(self.probe, [item[0:3] for item in probelist], self.max_workers)
+
+        for item, result in zip(probelist, results):
+          telnethost, ctrlport, uniqueid, host, cmd, flags, conda, env, rtprio = item
+          tmpstatus, pid, ppid, getid = result
+
+          if getid.endswith(b".log"):
             # '/reg/lab2/home/caf/2012/03/29_16:27:22_localhost:helloX.log' -> 'helloX'
-            gotid = self.getid[0:-4].split(b":")[-1]
+            gotid = getid[0:-4].split(b":")[-1]
           else:
-            gotid = self.getid
+            gotid = getid
 
-          if ((self.tmpstatus != self.STATUS_NOCONNECT) and \
-              (self.tmpstatus != self.STATUS_ERROR) and \
-              (gotid != bytes(self.uniqueid, 'utf-8')) and \
-              (not gotid.endswith(bytes(self.uniqueid+".log", 'utf-8')))):
+          if ((tmpstatus != self.STATUS_NOCONNECT) and \
+              (tmpstatus != self.STATUS_ERROR) and \
+              (gotid != bytes(uniqueid, 'utf-8')) and \
+              (not gotid.endswith(bytes(uniqueid+".log", 'utf-8')))):
               print("*** ERR: found %r, expected %r on host %s port %s" % \
-                  (gotid, self.uniqueid, self.host, self.ctrlport))
+                  (gotid, uniqueid, host, ctrlport))
           else:
               # add an entry to the dictionary
-              key = makekey(self.host, self.uniqueid)
+              key = makekey(host, uniqueid)
               self.d[key] = \
-                [ self.tmpstatus, self.pid, self.cmd, self.ctrlport, self.ppid, self.flags, self.getid, self.conda, self.env, self.rtprio]
+                [ tmpstatus, pid, cmd, ctrlport, ppid, flags, getid, conda, env, rtprio]
                 # DICT_STATUS  DICT_PID  DICT_CMD  DICT_CTRL      DICT_PPID  DICT_FLAGS  DICT_GETID DICT_CONDA DICT_ENV DICT_RTPRIO
 
+    #
+    # probe - read the banner of a procServ control port
+    #
+    # RETURNS: status, pid, ppid, getid
+    #
+    def probe(self, args):
+        telnethost, ctrlport, uniqueid = args
+        connection = telnetlib.Telnet()
+        try:
+            connection.open(telnethost, ctrlport)
+        except:
+            # telnet failed
+            # TODO ping each host first, as telnet could fail due to an error
+            return self.STATUS_NOCONNECT, b"-", b"-", b"-"
+        # telnet succeeded: gather status from procServ banner
+        try:
+            result = self.readLogPortBanner(connection, uniqueid)
+        except EOFError:
+            print('EOFError in readLogPortBanner')
+            result = None
+        except:
+            result = None
+        if result is None:
+            # reading procServ banner failed
+            print("*** ERR: failed to read procServ banner for \'%s\' on host %s" \
+                    % (uniqueid, telnethost))
+            # set the ID so the error output includes name instead of '-'
+            result = self.STATUS_ERROR, b"-", b"-", bytes(uniqueid, 'utf-8')
+        # close connection to the logging port (procServ)
+        connection.close()
+        return result
+
     def spawnXterm(self, name, host, port, large=False):
         if large:
             args = [self.PATH_XTERM, "-bg", "midnightblue", "-fg", "white", "-fa", "18", "-T", name, \
@@ -685,24 +725,23 @@ class ProcMgr:
             print('spawnLogfile: process \'%s\' neither RUNNING nor SHUTDOWN' % uniqueid)
         return rv
 
-    def readLogPortBanner(self):
-        response = self.telnet.read_until(self.MSG_BANNER_END, 1)
+    def readLogPortBanner(self, connection, uniqueid):
+        response = connection.read_until(self.MSG_BANNER_END, 1)
         if not response.count(self.MSG_BANNER_END):
-            print('readLogPortBanner: banner not found in response: '+response)
-            self.tmpstatus = self.STATUS_ERROR
+            print('readLogPortBanner: banner not found in response: %r' % response)
             # when reading banner fails, set the ID so the error output includes name instead of '-'
-            self.getid = self.uniqueid
-            return 0
+            return self.STATUS_ERROR, b"-", b"-", bytes(uniqueid, 'utf-8')
+        pid = b"-"
         if re.search(b'SHUT DOWN', response):
-            self.tmpstatus = self.STATUS_SHUTDOWN
-            self.ppid = re.search(b'@@@ procServ server PID: ([0-9]*)', response).group(1)
-            self.getid = re.search(b'@@@ Child \"(.*)\" start', response).group(1)
+            tmpstatus = self.STATUS_SHUTDOWN
+            ppid = re.search(b'@@@ procServ server PID: ([0-9]*)', response).group(1)
+            getid = re.search(b'@@@ Child \"(.*)\" start', response).group(1)
         else:
-            self.tmpstatus = self.STATUS_RUNNING
-            self.pid = re.search(b'@@@ Child \"(.*)\" PID: ([0-9]*)', response).group(2)
-            self.getid = re.search(b'@@@ Child \"(.*)\" PID: ([0-9]*)', response).group(1)
-            self.ppid = re.search(b'@@@ procServ server PID: ([0-9]*)', response).group(1)
-        return 1
+            tmpstatus = self.STATUS_RUNNING
+            pid = re.search(b'@@@ Child \"(.*)\" PID: ([0-9]*)', response).group(2)
+            getid = re.search(b'@@@ Child \"(.*)\" PID: ([0-9]*)', response).group(1)
+            ppid = re.search(b'@@@ procServ server PID: ([0-9]*)', response).group(1)
+        return tmpstatus, pid, ppid, getid
 
     #
     # show - call status() with an empty id_list
@@ -832,10 +871,11 @@ class ProcMgr:
         connected = False
         telnetCount = 0
         host = key2host(key)
+        connection = telnetlib.Telnet()
         while (not connected) and (telnetCount < 2):
             telnetCount += 1
             try:
-                self.telnet.open(host, value[self.DICT_CTRL])
+                connection.open(host, value[self.DICT_CTRL])
             except:
                 sleep(.25)
             else:
@@ -843,7 +883,7 @@ class ProcMgr:
 
         if connected:
             # close telnet connection
-            self.telnet.close()
+            connection.close()
 
         if verbose:
             print(' --- checkConnection(key=%s) returning %s ---' % (key, connected))
@@ -929,6 +969,17 @@ class ProcMgr:
             logpath = '%s/%s' % (logpathbase, time.strftime('%Y/%m'))
             time_string = time.strftime('%d_%H:%M:%S')
 
+        # double check (all at the same time) to see if SHUTDOWN
+        # processes are actually NOCONNECT
+        checklist = [[key, value] for key, value in self.d.items() \
+            if (len(id_list) == 0 or key2uniqueid(key) in id_list) and \
+               value[self.DICT_STATUS] == self.STATUS_SHUTDOWN]
+        connected = parallelMap(lambda item: self.checkConnection(item[0], item[1], verbose), \
+            checklist, self.max_workers)
+        for (key, value), ok in zip(checklist, connected):
+            if not ok:
+                value[self.DICT_STATUS] = self.STATUS_NOCONNECT
+
         # create a dictionary mapping hosts to a set of start commands
         startdict = dict()
         for key, value in self.d.items():
@@ -938,11 +989,6 @@ class ProcMgr:
                 if key2uniqueid(key) not in id_list:
                     continue
 
-            if value[self.DICT_STATUS] == self.STATUS_SHUTDOWN:
-                # double check to see if process is actually NOCONNECT
-                if not self.checkConnection(key, value, verbose):
-                    value[self.DICT_STATUS] = self.STATUS_NOCONNECT
-
             if value[self.DICT_STATUS] == self.STATUS_NOCONNECT:
                 logfile = ''
                 starthost = key2host(key)
@@ -1055,90 +1101,9 @@ class ProcMgr:
                     started_count += 1
 
         # now use the newly created dictionary to run start command(s)
-        # on each host
-
-        for host, value in startdict.items():
-
-            if (host == 'localhost'):
-                # process list of commands
-                while len(value) > 0:
-                    # send command
-                    args, key = value.pop()
-                    if verbose:
-                        print('Run locally: %s' % args)
-
-                    yy = Popen(args, stdout=DEVNULL, stderr=DEVNULL, shell=True)
-                    yy.wait()
-                    if (yy.returncode != 0):
-                        printError(yy.returncode, args)
-                    else:
-                        self.setStatus([key], self.STATUS_RUNNING)
-                        started_count += 1
-            else:
-                # open a connection to the procmgr control port (procServ)
-                try:
-                    self.telnet.open(host, self.EXECMGRCTRL)
-                except:
-                    # telnet failed
-                    print('*** ERR: telnet to procmgr (%s port %d) failed' % \
-                            (host, self.EXECMGRCTRL))
-                    print('>>> Please start the procServ process on host %s!' % host)
-                else:
-                    # telnet succeeded
-
-                    # send ^U followed by carriage return to safely reach the prompt
-                    self.telnet.write(b"\x15\x0d");
-
-                    # wait for prompt (procServ)
-                    try:
-                        response = self.telnet.read_until(self.MSG_PROMPT, 2)
-                    except EOFError:
-                        response = ""
-                    if not response.count(self.MSG_PROMPT):
-                        print('*** ERR: no prompt at %s port %s' % \
-                            (key2host(key), self.EXECMGRCTRL))
-
-                    # process list of commands
-                    while len(value) > 0:
-
-                        nextcmd, nextkey = value.pop()
-                        args = nextcmd
-
-                        if verbose:
-                            print('Run on %s: %s' % (host, nextcmd))
-
-                        if 'TESTRELDIR' in os.environ:
-                          # set env var on remote host using subshell
-                          nextcmd = '(setenv TESTRELDIR %s; %s; echo "[return=$?]")' % (os.environ['TESTRELDIR'], nextcmd)
-                        else:
-                          nextcmd = '%s; echo "[return=$?]"' % nextcmd
-
-                        # send command
-                        self.telnet.write(bytes('%s\n' % nextcmd, 'utf-8'))
-                        # wait for prompt
-                        try:
-                          response = self.telnet.read_until(self.MSG_PROMPT, 2)
-                        except EOFError:
-                          response = ""
-                        # search for error code after "return="
-                        m = re.search(b'(?<=return=)\d+', response)
-                        if m is not None:
-                            printError(int(m.group(0)), args)
-
-                        if not response.count(self.MSG_PROMPT):
-                            print('*** ERR: no prompt at %s port %s' % \
-                                (host, self.EXECMGRCTRL))
-                        else:
-                            #
-                            # If X flag is set, procServ --wait is used so
-                            # the next state is actually STATUS_SHUTDOWN.
-                            # It will be STATUS_RUNNING after restart, below.
-                            #
-                            self.setStatus([nextkey], self.STATUS_RUNNING)
-                            started_count += 1
-
-                    # close telnet connection
-                    self.telnet.close()
+        # on each host (all hosts at the same time)
+        started_count += sum(parallelMap(lambda item: self.startOnHost(item[0], item[1], verbose), \
+            list(startdict.items()), self.max_workers))
 
         if len(xlist) > 0 or len(Xlist) > 0:
           # is xterm available?
@@ -1171,6 +1136,99 @@ class ProcMgr:
 
         return rv
 
+    #
+    # startOnHost - run list of start commands on a host
+    #
+    # RETURNS: Number of successful start commands.
+    #
+    def startOnHost(self, host, value, verbose=0):
+        started_count = 0
+
+        if (host == 'localhost'):
+            # process list of commands
+            while len(value) > 0:
+                # send command
+                args, key = value.pop()
+                if verbose:
+                    print('Run locally: %s' % args)
+
+                yy = Popen(args, stdout=DEVNULL, stderr=DEVNULL, shell=True)
+                yy.wait()
+                if (yy.returncode != 0):
+                    printError(yy.returncode, args)
+                else:
+                    self.setStatus([key], self.STATUS_RUNNING)
+                    started_count += 1
+            return started_count
+
+        # open a connection to the procmgr control port (procServ)
+        connection = telnetlib.Telnet()
+        try:
+            connection.open(host, self.EXECMGRCTRL)
+        except:
+            # telnet failed
+            print('*** ERR: telnet to procmgr (%s port %d) failed' % \
+                    (host, self.EXECMGRCTRL))
+            print('>>> Please start the procServ process on host %s!' % host)
+            return started_count
+
+        # telnet succeeded
+
+        # send ^U followed by carriage return to safely reach the prompt
+        connection.write(b"\x15\x0d");
+
+        # wait for prompt (procServ)
+        try:
+            response = connection.read_until(self.MSG_PROMPT, 2)
+        except EOFError:
+            response = b""
+        if not response.count(self.MSG_PROMPT):
+            print('*** ERR: no prompt at %s port %s' % \
+                (host, self.EXECMGRCTRL))
+
+        # process list of commands
+        while len(value) > 0:
+
+            nextcmd, nextkey = value.pop()
+            args = nextcmd
+
+            if verbose:
+                print('Run on %s: %s' % (host, nextcmd))
+
+            if 'TESTRELDIR' in os.environ:
+              # set env var on remote host using subshell
+              nextcmd = '(setenv TESTRELDIR %s; %s; echo "[return=$?]")' % (os.environ['TESTRELDIR'], nextcmd)
+            else:
+              nextcmd = '%s; echo "[return=$?]"' % nextcmd
+
+            # send command
+            connection.write(bytes('%s\n' % nextcmd, 'utf-8'))
+            # wait for prompt
+            try:
+              response = connection.read_until(self.MSG_PROMPT, 2)
+            except EOFError:
+              response = b""
+            # search for error code after "return="
+            m = re.search(b'(?<=return=)\d+', response)
+            if m is not None:
+                printError(int(m.group(0)), args)
+
+            if not response.count(self.MSG_PROMPT):
+                print('*** ERR: no prompt at %s port %s' % \
+                    (host, self.EXECMGRCTRL))
+            else:
+                #
+                # If X flag is set, procServ --wait is used so
+                # the next state is actually STATUS_SHUTDOWN.
+                # It will be STATUS_RUNNING after restart, below.
+                #
+                self.setStatus([nextkey], self.STATUS_RUNNING)
+                started_count += 1
+
+        # close telnet connection
+        connection.close()
+        return started_count
+
     #
     # isEmpty
     #
@@ -1186,8 +1244,9 @@ class ProcMgr:
 
         telnetdict = dict()
 
-        # open telnet connections
-        for key, value in stopdict.items():
+        # open telnet connections (all at the same time)
+        def openConnection(item):
+            key, value = item
             connected = False
             telnetCount = 0
             host = key2host(key)
@@ -1205,9 +1264,14 @@ class ProcMgr:
                     connected = True
 
             if connected:
+                return connection
+            print('*** ERR: telnet to %s port %r failed' % (host, value[self.DICT_CTRL]))
+            return None
+
+        connections = parallelMap(openConnection, list(stopdict.items()), self.max_workers)
+        for key, connection in zip(stopdict, connections):
+            if connection is not None:
                 telnetdict[key] = connection
-            else:
-                print('*** ERR: telnet to %s port %r failed' % (host, value[self.DICT_CTRL]), end=' ')
 
         # send ^C to selected connections
         for key, connection in telnetdict.items():
@@ -1258,53 +1322,49 @@ class ProcMgr:
                     self.setStatus([key], self.STATUS_SHUTDOWN)
 
         # send ^X to connections where status is not SHUTDOWN
-        retrylist = []
-        for key, connection in telnetdict.items():
-            if (self.d[key][self.DICT_STATUS] == self.STATUS_SHUTDOWN):
-                continue    # skip
-            if verbose:
-                progressMessage('sending ^X to %r (%s port %s)' % (key, key2host(key), stopdict[key][self.DICT_CTRL]))
+        # (all at the same time, each waits up to 1 second)
+        def killClient(key):
             try:
                 # 0x18 = ^X
                 telnetdict[key].write(b"\x18");
                 # wait for KILLED message
-                response = telnetdict[key].read_until(self.MSG_KILLED, 1)
+                return telnetdict[key].read_until(self.MSG_KILLED, 1), None
             except:
-                response = '(exception)'
+                return b'(exception)', sys.exc_info()[1]
+
+        killlist = [key for key in telnetdict \
+            if self.d[key][self.DICT_STATUS] != self.STATUS_SHUTDOWN]
+        retrylist = []
+        for key, (response, exc) in zip(killlist, parallelMap(killClient, killlist, self.max_workers)):
+            if verbose:
+                progressMessage('sending ^X to %r (%s port %s)' % (key, key2host(key), stopdict[key][self.DICT_CTRL]))
+            if exc is not None:
                 rv = 1
                 if verbose:
                     print('FAILED')
                 retrylist.append(key)
-                print('*** ERR: Exception while killing %r client: %r' % (key, sys.exc_info()[1]))
-            else:
-                if response.count(b"Restarting"):
-                    retrylist.append(key)
-                    if verbose:
-                        print('FAILED')
-                elif verbose:
-                    print('done')
+                print('*** ERR: Exception while killing %r client: %r' % (key, exc))
+            elif response.count(b"Restarting"):
+                retrylist.append(key)
+                if verbose:
+                    print('FAILED')
+            elif verbose:
+                print('done')
 
         # Retry: send ^X to connections for which first attempt failed
-        for key in retrylist:
+        for key, (response, exc) in zip(retrylist, parallelMap(killClient, retrylist, self.max_workers)):
             if verbose:
                 progressMessage('retry sending ^X to %r (%s port %s)' % (key, key2host(key), stopdict[key][self.DICT_CTRL]))
-            try:
-                # 0x18 = ^X
-                telnetdict[key].write(b"\x18");
-                # wait for KILLED message
-                response = telnetdict[key].read_until(self.MSG_KILLED, 1)
-            except:
-                response = '(exception)'
+            if exc is not None:
                 rv = 1
                 if verbose:
                     print('FAILED')
-                print('*** ERR: Exception while killing %r client: %r' % (key, sys.exc_info()[1]))
-            else:
-                if verbose:
-                    if response.count(b"Restarting"):
-                        print('FAILED')
-                    else:
-                        print('done')
+                print('*** ERR: Exception while killing %r client: %r' % (key, exc))
+            elif verbose:
+                if response.count(b"Restarting"):
+                    print('FAILED')
+                else:
+                    print('done')
 
         # send ^Q to all connections
         for key, connection in telnetdict.items():
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the pvstats update against simulated XPM registers
+
+Runs PVStats.update() register by register (legacy) and from a snapshot
+with change-only posting, and reports update time, time the register
+lock is held, register reads and PV posts per update.
+"""
+
+import time
+import argparse
+from threading import Lock
+from p4p.server import StaticProvider
+from p4p.server.thread import SharedPV
+import psdaq.pyxpm.pvstats as pvstats
+from psdaq.pyxpm.simxpm import SimXpm
+
+class CountingSharedPV(SharedPV):
+    posts = 0
+    def post(self, value, **kws):
+        CountingSharedPV.posts += 1
+        super().post(value, **kws)
+
+class TimedLock(object):
+    def __init__(self):
+        self._lock = Lock()
+        self.held  = 0.
+
+    def acquire(self):
+        self._lock.acquire()
+        self._t0 = time.perf_counter()
+
+    def release(self):
+        self.held += time.perf_counter()-self._t0
+        self._lock.release()
+
+def run(snapshot, args):
+    xpm  = SimXpm(latency=args.latency*1.e-6)
+    lock = TimedLock()
+    pvstats.SharedPV = CountingSharedPV
+    stats = pvstats.PVStats(StaticProvider('bench'), lock, 'DAQ:SIM:XPM:0', xpm, snapshot=snapshot)
+    for g in stats._groups[:2]:
+        g._master = 1
+
+    elapsed = 0.
+    lock.held = 0.
+    CountingSharedPV.posts = 0
+    xpm.stats.reads = 0
+    for i in range(args.n):
+        xpm.advance(args.dt)
+        t0 = time.perf_counter()
+        stats.update()
+        elapsed += time.perf_counter()-t0
+    n = args.n
+    print('%-10s %10.2f %10.2f %10.1f %10.1f %10.1f' %
+          ('snapshot' if snapshot else 'legacy', 1.e3*elapsed/n, 1.e3*lock.held/n,
+           xpm.stats.reads/n, CountingSharedPV.posts/n, n/elapsed))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20, help='number of updates (default 20)')
+    parser.add_argument('--dt', type=float, default=1.0, help='simulated seconds between updates (default 1)')
+    parser.add_argument('--latency', type=float, default=100., help='register read latency in usec (default 100)')
+    args = parser.parse_args()
+
+    print('%-10s %10s %10s %10s %10s %10s' % ('mode', 'update ms', 'lock ms', 'reads', 'posts', 'updates/s'))
+    run(False, args)
+    run(True , args)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ from p4p.nt import NTScalar
 from p4p.nt import NTTable
 from p4p.server.thread import SharedPV
 from psdaq.pyxpm.pvhandler import *
+from psdaq.pyxpm.snapshot import XpmSnapshot, ChangePoster
 
 provider = None
 lock     = None
@@ -104,6 +105,23 @@ class LinkStatus(object):
         self._pv_rxIsXpm      = addPVI('LinkRxIsXpm')
         self._pv_remoteLinkId = addPVI('RemoteLinkId')
 
+        #  snapshot value key -> PV
+        self._pvs = {'txResetDone' : self._pv_txResetDone,
+                     'txReady'     : self._pv_txReady,
+                     'rxResetDone' : self._pv_rxResetDone,
+                     'rxReady'     : self._pv_rxReady,
+                     'rxIsXpm'     : self._pv_rxIsXpm,
+                     'rxRcv'       : self._pv_rxRcv,
+                     'remoteLinkId': self._pv_remoteLinkId}
+        if i!=16:
+            self._pvs['rxErr'] = self._pv_rxErr
+
+    def post(self, poster, timev, v):
+        i = self._idx
+        if v['valid'][i]:
+            for key,pv in self._pvs.items():
+                poster.post(pv, v[key][i], timev)
+
     def update(self):
 
         def updatePv(pv,v):
@@ -213,6 +231,17 @@ class AmcPLLStatus(object):
         self._pv_los    = addPVI('PLL_LOS')
         self._pv_losCnt = addPVI('PLL_LOSCNT')
 
+        self._pvs = {'lol'   : self._pv_lol,
+                     'lolCnt': self._pv_lolCnt,
+                     'los'   : self._pv_los,
+                     'losCnt': self._pv_losCnt}
+
+    def post(self, poster, timev, v):
+        i = self._idx
+        if v['valid'][i]:
+            for key,pv in self._pvs.items():
+                poster.post(pv, v[key][i], timev)
+
     def update(self):
 
         def updatePv(pv,v):
@@ -321,6 +350,25 @@ class GroupStats(object):
 
         self._pv_deadFLink = addPV(name+':DeadFLnk','af',[0.]*32)
 
+        self._pvs = {'runTime'  : self._pv_runTime,
+                     'msgDelay' : self._pv_msgDelay,
+                     'l0InpRate': self._pv_l0InpRate,
+                     'l0AccRate': self._pv_l0AccRate,
+                     'numL0Inp' : self._pv_numL0Inp,
+                     'numL0Inh' : self._pv_numL0Inh,
+                     'numL0Acc' : self._pv_numL0Acc,
+                     'deadFrac' : self._pv_deadFrac}
+
+    def post(self, poster, timev, v):
+        i = self._group
+        if self._master and v['l0Valid'][i]:
+            for key,pv in self._pvs.items():
+                poster.post(pv, v[key][i], timev)
+            if v['l0Ena'][i]:
+                poster.post(self._pv_deadTime, v['deadTime'][i], timev)
+        if v['inhValid'][i]:
+            poster.post(self._pv_deadFLink, v['deadFLink'][i], timev)
+
     def update(self):
 
         def updatePv(pv,v):
@@ -414,7 +462,10 @@ class PVMmcmPhaseLock(object):
         
 
 class PVStats(object):
-    def __init__(self, p, m, name, xpm):
+    #  snapshot: read all link, PLL and group registers in one pass
+    #            and post only the PVs that changed (refresh: repost
+    #            unchanged PVs every refresh updates, 0 = never)
+    def __init__(self, p, m, name, xpm, snapshot=True, refresh=0):
         global provider
         provider = p
         global lock
@@ -444,6 +495,11 @@ class PVStats(object):
         self.paddr   = addPV(name+':PAddr'  ,'I',self._app.paddr.get())
         self.fwbuild = addPV(name+':FwBuild','s',self._xpm.AxiVersion.BuildStamp.get())
 
+        self._snapshot = None
+        if snapshot:
+            self._poster   = ChangePoster(refresh)
+            self._snapshot = XpmSnapshot(self._app,len(self._links),len(self._amcPll),len(self._groups)).read(lock)
+
 #        self._mmcm = []
 #        for i,m in enumerate(xpm.mmcms):
 #            self._mmcm.append(PVMmcmPhaseLock(name+':XTPG:MMCM%d'%i,m))
@@ -451,14 +507,36 @@ class PVStats(object):
     def init(self):
         pass
 
+    def updateSnapshot(self):
+        prev = self._snapshot
+        #  l0Stats only for the groups this XPM is master of
+        masters = [g._group for g in self._groups if g._master]
+        snap = prev.copy().read(lock, masters)
+        timev = divmod(snap.timeval, 1.0e9)
+
+        v = snap.linkValues(prev)
+        for l in self._links:
+            l.post(self._poster, timev, v)
+        v = snap.pllValues()
+        for p in self._amcPll:
+            p.post(self._poster, timev, v)
+        v = snap.groupValues(prev)
+        for g in self._groups:
+            g.post(self._poster, timev, v)
+
+        self._snapshot = snap
+
     def update(self):
         try:
-            for i in range(32):
-                self._links[i].update()
-            for i in range(2):
-                self._amcPll[i].update()
-            for i in range(8):
-                self._groups[i].update()
+            if self._snapshot is not None:
+                self.updateSnapshot()
+            else:
+                for i in range(32):
+                    self._links[i].update()
+                for i in range(2):
+                    self._amcPll[i].update()
+                for i in range(8):
+                    self._groups[i].update()
 
             self._usTiming.update()
             self._cuTiming.update()
@@ -46,6 +46,7 @@ def main():
     parser.add_argument('-P', required=True, help='e.g. DAQ:LAB2:XPM:1', metavar='PREFIX')
     parser.add_argument('-v', '--verbose', action='store_true', help='be verbose')
     parser.add_argument('--ip', type=str, required=True, help="IP address" )
+    parser.add_argument('--nosnapshot', action='store_true', help='read and post statistics register by register')
     parser.add_argument('--db', type=str, default=None, help="save/restore db, for example [https://pswww.slac.stanford.edu/ws-auth/devconfigdb/ws/,configDB,LAB2,PROD]")
 
     args = parser.parse_args()
@@ -78,7 +79,7 @@ def main():
 
     lock = Lock()
 
-    pvstats = PVStats(provider, lock, args.P, xpm)
+    pvstats = PVStats(provider, lock, args.P, xpm, snapshot=not args.nosnapshot)
     pvctrls = PVCtrls(provider, lock, name=args.P, ip=args.ip, xpm=xpm, stats=pvstats._groups, db=args.db)
     pvxtpg  = PVXTpg(provider, lock, args.P, xpm, xpm.mmcmParms, cuMode='xtpg' in xpm.AxiVersion.ImageName.get())
 
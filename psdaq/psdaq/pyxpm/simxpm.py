@@ -0,0 +1,151 @@
+import time
+import numpy as np
+
+#
+#  Simulated XPM registers, enough of the pyrogue tree for PVStats.
+#  Counters advance on advance(); every get() may sleep latency seconds
+#  to stand in for a register transaction.
+#
+
+class SimStats(object):
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.reads   = 0
+
+class SimVariable(object):
+    def __init__(self, stats, value=0):
+        self._stats = stats
+        self.value  = value
+
+    def get(self):
+        self._stats.reads += 1
+        if self._stats.latency:
+            time.sleep(self._stats.latency)
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+class SimIndexed(SimVariable):
+    #  register array selected by another register (app.link, app.amc, ...)
+    def __init__(self, stats, select, values):
+        super().__init__(stats)
+        self._select = select
+        self.values  = values
+
+    def get(self):
+        self.value = self.values[self._select.value]
+        v = super().get()
+        return int(v) if isinstance(v,np.integer) else v
+
+class SimDevice(object):
+    #  any register not defined explicitly reads as a constant
+    def __init__(self, stats):
+        self._stats = stats
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        v = SimVariable(self._stats)
+        setattr(self,name,v)
+        return v
+
+def packCounters(counters, nbits):
+    v = 0
+    for i,c in enumerate(counters):
+        v |= int(c)<<(nbits*i)
+    return v
+
+class SimXpmApp(SimDevice):
+    def __init__(self, stats, nlinks=32, npll=2, ngroups=8, seed=0):
+        super().__init__(stats)
+        self._rng    = np.random.default_rng(seed)
+        self.link      = SimVariable(stats)
+        self.amc       = SimVariable(stats)
+        self.partition = SimVariable(stats)
+        self.paddr     = SimVariable(stats,0xff00)
+        for i in range(4):
+            setattr(self,'monClk_%d'%i,SimVariable(stats,int(185.7e6)))
+
+        #  links 0..nlinks/2 are up, the rest never change
+        self._linkUp  = np.arange(nlinks) < nlinks//2
+        status = np.where(self._linkUp, 0x1f<<16, 0).astype(np.uint32)
+        self.dsLinkStatus = SimIndexed(stats, self.link, status)
+        self.dsLinkRxCnt  = SimIndexed(stats, self.link, np.zeros(nlinks,dtype=np.uint32))
+        self.remId        = SimIndexed(stats, self.link, np.where(self._linkUp, 0xfb000000+np.arange(nlinks), 0))
+
+        self.amcPLL = SimDevice(stats)
+        for name in ('lol','lolCnt','los','losCnt'):
+            setattr(self.amcPLL, name, SimIndexed(stats, self.amc, [0]*npll))
+
+        #  l0 counters of each group, groups 0 and 1 are running
+        self._running = np.arange(ngroups) < 2
+        self._l0      = np.zeros((ngroups,5),dtype=np.uint64)
+        self._inhTm   = np.zeros((ngroups,32),dtype=np.uint32)
+        self.l0Stats  = SimIndexed(stats, self.partition, [0]*ngroups)
+        self.l0Delay  = SimIndexed(stats, self.partition, [90]*ngroups)
+        self.inhEvCnt = SimIndexed(stats, self.partition, [0]*ngroups)
+        self.inhTmCnt = SimIndexed(stats, self.partition, [0]*ngroups)
+        self._pack()
+
+    def _pack(self):
+        self.l0Stats .values = [packCounters(c,64) for c in self._l0]
+        self.inhTmCnt.values = [packCounters(c,32) for c in self._inhTm]
+
+    def advance(self, dt=1.0):
+        nfid = int(dt*929e3)
+        nup  = self._linkUp.sum()
+        rx   = self.dsLinkRxCnt.values
+        rx[self._linkUp] += np.uint32(nfid//10)
+        #  occasional receive errors
+        err  = (self._rng.random(len(rx)) < 0.05) & self._linkUp
+        st   = self.dsLinkStatus.values
+        st[err] = (st[err]&0xffff0000) | ((st[err]+1)&0xffff)
+
+        run = self._running
+        nl0 = self._rng.integers(int(0.9*nfid)//10, nfid//10+1, size=run.sum()).astype(np.uint64)
+        inh = self._rng.integers(0, nfid//100+1, size=run.sum()).astype(np.uint64)
+        self._l0[run,0] += np.uint64(nfid)
+        self._l0[run,1] += inh
+        self._l0[run,2] += nl0
+        self._l0[run,3] += nl0//np.uint64(100)
+        self._l0[run,4] += nl0-nl0//np.uint64(100)
+        self._inhTm[run,:nup] += self._rng.integers(0, nfid//1000+1, size=(run.sum(),nup)).astype(np.uint32)
+        self._pack()
+
+    def l0EnaCnt(self, l0Stats):
+        return (l0Stats>>0)&((1<<64)-1)
+
+    def l0InhCnt(self, l0Stats):
+        return (l0Stats>>64)&((1<<64)-1)
+
+    def numL0(self, l0Stats):
+        return (l0Stats>>128)&((1<<64)-1)
+
+    def numL0Inh(self, l0Stats):
+        return (l0Stats>>192)&((1<<64)-1)
+
+    def numL0Acc(self, l0Stats):
+        return (l0Stats>>256)&((1<<64)-1)
+
+class SimCuGenerator(SimDevice):
+    def timeStampSec(self):
+        return self.timeStamp.get()>>32
+
+class SimPhase(SimDevice):
+    def phase(self):
+        return 0.
+
+class SimXpm(object):
+    def __init__(self, latency=0, seed=0):
+        self.stats       = SimStats(latency)
+        self.XpmApp      = SimXpmApp(self.stats, seed=seed)
+        self.UsTiming    = SimDevice(self.stats)
+        self.CuTiming    = SimDevice(self.stats)
+        self.CuGenerator = SimCuGenerator(self.stats)
+        self.CuToScPhase = SimPhase(self.stats)
+        self.AxiVersion  = SimDevice(self.stats)
+        self.AxiVersion.BuildStamp.value = 'simxpm'
+
+    def advance(self, dt=1.0):
+        self.XpmApp.advance(dt)
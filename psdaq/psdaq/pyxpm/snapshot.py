@@ -0,0 +1,158 @@
+import time
+import numpy as np
+
+FID_PERIOD    = 1400e-6/1300.
+FID_PERIOD_NS = 1400e3 /1300.
+
+#  Raw register values of one update pass.  Indexed registers (selected
+#  by app.link, app.amc, app.partition) are read back to back while the
+#  lock is held; everything else is computed afterwards on whole arrays.
+linkDtype  = np.dtype([('status','<u4'),('rxCnt','<u4'),('remId','<u4'),('valid','u1')])
+pllDtype   = np.dtype([('lol','<u4'),('lolCnt','<u4'),('los','<u4'),('losCnt','<u4'),('valid','u1')])
+#  l0Stats = (l0Ena, l0Inh, numL0, numL0Inh, numL0Acc), see XpmApp.l0EnaCnt...
+groupDtype = np.dtype([('l0Stats','<u8',(5,)),('l0Delay','<u4'),('inhTm','<u4',(32,)),
+                       ('l0Valid','u1'),('inhValid','u1')])
+
+def toArray(v, nbytes, dtype):
+    return np.frombuffer(v.to_bytes(nbytes,'little'),dtype=dtype)
+
+class XpmSnapshot(object):
+    def __init__(self, app, nlinks=32, npll=2, ngroups=8):
+        self._app    = app
+        self.links   = np.zeros(nlinks , dtype=linkDtype)
+        self.plls    = np.zeros(npll   , dtype=pllDtype)
+        self.groups  = np.zeros(ngroups, dtype=groupDtype)
+        self.timeval = 0.
+        self.lockTime= 0.
+
+    def copy(self):
+        s = XpmSnapshot.__new__(XpmSnapshot)
+        s.__dict__.update(self.__dict__)
+        s.links  = self.links .copy()
+        s.plls   = self.plls  .copy()
+        s.groups = self.groups.copy()
+        return s
+
+    def read(self, lock, l0groups=None):
+        #  Registers that fail to read keep their previous value and
+        #  their row is marked invalid (nothing posted for it).
+        #  l0Stats is only read for the groups in l0groups (all if None).
+        app = self._app
+        links, plls, groups = self.links, self.plls, self.groups
+        lock.acquire()
+        t0 = time.perf_counter()
+        try:
+            self.timeval = float(time.time_ns())
+            for i in range(len(links)):
+                app.link.set(i)
+                status = app.dsLinkStatus.get()
+                rxCnt  = app.dsLinkRxCnt .get()
+                remId  = app.remId       .get()
+                row = links[i]
+                row['valid'] = status is not None and rxCnt is not None and remId is not None
+                if row['valid']:
+                    row['status'], row['rxCnt'], row['remId'] = status, rxCnt, remId
+
+            pll = app.amcPLL
+            for i in range(len(plls)):
+                app.amc.set(i)
+                v = (pll.lol.get(), pll.lolCnt.get(), pll.los.get(), pll.losCnt.get())
+                row = plls[i]
+                row['valid'] = None not in v
+                if row['valid']:
+                    row['lol'], row['lolCnt'], row['los'], row['losCnt'] = v
+
+            for i in range(len(groups)):
+                app.partition.set(i)
+                row = groups[i]
+                row['l0Valid'] = False
+                if l0groups is None or i in l0groups:
+                    l0Stats = app.l0Stats.get()
+                    l0Delay = app.l0Delay.get()
+                    if l0Stats is not None and l0Delay is not None:
+                        row['l0Stats'] = toArray(l0Stats,40,'<u8')
+                        row['l0Delay'] = l0Delay
+                        row['l0Valid'] = True
+                inhTm = app.inhTmCnt.get()
+                row['inhValid'] = inhTm is not None
+                if row['inhValid']:
+                    row['inhTm'] = toArray(inhTm,128,'<u4')
+        finally:
+            self.lockTime = time.perf_counter()-t0
+            lock.release()
+        return self
+
+    def linkValues(self, prev):
+        #  PV values of all links, keyed like LinkStatus PVs
+        status = self.links['status']
+        v = {'txResetDone' : (status>>16)&1,
+             'txReady'     : (status>>17)&1,
+             'rxResetDone' : (status>>18)&1,
+             'rxReady'     : (status>>19)&1,
+             'rxIsXpm'     : (status>>20)&1,
+             'rxErr'       : (status&0xffff).astype(np.int64)-(prev.links['status']&0xffff),
+             'rxRcv'       : (self.links['rxCnt']-prev.links['rxCnt']).astype(np.int64),
+             'remoteLinkId': self.links['remId']}
+        v = {key:value.tolist() for key,value in v.items()}
+        v['valid'] = self.links['valid'].astype(bool).tolist()
+        return v
+
+    def pllValues(self):
+        v = {key:self.plls[key].tolist() for key in ('lol','lolCnt','los','losCnt')}
+        v['valid'] = self.plls['valid'].astype(bool).tolist()
+        return v
+
+    def groupValues(self, prev):
+        #  Rates of all groups at once.  Counter differences are taken
+        #  modulo the register width, like the hardware counters wrap.
+        cur = self.groups['l0Stats']
+        d   = (cur - prev.groups['l0Stats']).astype(np.int64)
+        dL0Ena, dL0Inh, dnumL0, dnumL0Inh, dnumL0Acc = d.T
+        dt  = dL0Ena*FID_PERIOD
+        ena = dL0Ena != 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            l0InpRate = np.where(ena, dnumL0/dt, 0.)
+            l0AccRate = np.where(ena, dnumL0Acc/dt, 0.)
+            deadTime  = np.where(ena, dL0Inh/dL0Ena, 0.)
+            deadFrac  = np.where(dnumL0 != 0, dnumL0Inh/dnumL0, 0.)
+        nfid = (self.timeval - prev.timeval)/FID_PERIOD_NS
+        dinh = (self.groups['inhTm'] - prev.groups['inhTm']).astype(np.float64)
+        deadFLink = dinh/nfid if nfid > 0 else np.zeros_like(dinh)
+        v = {'runTime'  : cur[:,0]*FID_PERIOD,
+             'msgDelay' : self.groups['l0Delay'],
+             'l0InpRate': l0InpRate,
+             'l0AccRate': l0AccRate,
+             'numL0Inp' : cur[:,2],
+             'numL0Inh' : cur[:,3],
+             'numL0Acc' : cur[:,4],
+             'deadFrac' : deadFrac,
+             'deadTime' : deadTime,
+             'deadFLink': deadFLink}
+        v = {key:value.tolist() for key,value in v.items()}
+        v['l0Valid' ] = self.groups['l0Valid' ].astype(bool).tolist()
+        v['l0Ena'   ] = ena.tolist()
+        v['inhValid'] = self.groups['inhValid'].astype(bool).tolist()
+        return v
+
+class ChangePoster(object):
+    #  Posts a PV only when its value changed, or when it was not posted
+    #  for refresh updates (0 = never repost an unchanged value)
+    def __init__(self, refresh=0):
+        self._refresh = refresh
+        self._last    = {}
+        self.posts    = 0
+        self.skipped  = 0
+
+    def post(self, pv, v, timev):
+        key  = id(pv)
+        last = self._last.get(key)
+        if last is not None and last[0] == v and (self._refresh==0 or last[1] < self._refresh):
+            last[1] += 1
+            self.skipped += 1
+            return
+        self._last[key] = [v,1]
+        value = pv.current()
+        value['value'] = v
+        value['timeStamp.secondsPastEpoch'], value['timeStamp.nanoseconds'] = timev
+        pv.post(value)
+        self.posts += 1
@@ -2,9 +2,9 @@ import pyqtgraph as pg
 import numpy
 import argparse
 import psdaq.seq.seq
+from psdaq.seq.seqsim import Engine, run_reference, compile_events
 
 f=None
-verbose=False
 
 class bcolors:
     HEADER = '\033[95m'
@@ -16,21 +16,6 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
-class Engine(object):
-
-    def __init__(self, acmode=False):
-        self.request = 0
-        self.instr   = 0
-        self.frame   = -1  # 1MHz timeslot
-        self.acframe = -1  # 360Hz timeslot
-        self.acmode  = acmode
-        self.modes   = 0
-        self.ccnt    = [0]*4
-        self.done    = False
-
-    def frame_number(self):
-        return int(self.acframe) if self.acmode else int(self.frame)
-
 class SeqUser:
     def __init__(self, start=0, stop=200, acmode=False):
         global f
@@ -52,30 +37,11 @@ class SeqUser:
         self.xdata = []
         self.ydata = []
 
-    def execute(self, title, instrset, descset):
-
-        x = 0
-
-        engine  = Engine(self.acmode)
-        while engine.frame_number() < self.stop and not engine.done:
-
-            frame   = engine.frame_number()
-            request = int(engine.request)
+    def execute(self, title, instrset, descset, reference=False):
 
-            instrset[engine.instr].execute(engine)
-            if engine.frame_number() != frame:
-                if verbose:
-                    print('frame: {}  instr {}  request {:x}'.format
-                          (frame,engine.instr,request))
-                if frame < self.start:
-                    continue
-                if request != 0:
-                    for i in range(16):
-                        if (request&(1<<i)):
-                            self.xdata.append(frame)
-                            self.ydata.append(i)
-                frame   = engine.frame_number()
-                request = int(engine.request)
+        simulate = run_reference if reference else compile_events
+        table    = simulate(instrset, self.start, self.stop, self.acmode)
+        self.xdata, self.ydata = table.bits()
 
         self.plot.setData(self.xdata,self.ydata)
 
@@ -90,7 +56,7 @@ class SeqUser:
 
         self.app.processEvents()
 
-        if engine.modes == 3:
+        if table.modes == 3:
             print(bcolors.WARNING + "Found both fixed-rate-sync and ac-rate-sync instructions." + bcolors.ENDC)
 
         input(bcolors.OKGREEN+'Press ENTER to exit'+bcolors.ENDC)
@@ -101,6 +67,7 @@ def main():
     parser.add_argument("--start", default=  0, type=int, help="beginning timeslot")
     parser.add_argument("--stop" , default=200, type=int, help="ending timeslot")
     parser.add_argument("--mode" , default='CW', help="timeslot mode [CW,AC]")
+    parser.add_argument("--reference", action='store_true', help="execute one instruction at a time")
     args = parser.parse_args()
     
     config = {'title':'TITLE', 'descset':None, 'instrset':None}
@@ -108,7 +75,7 @@ def main():
     exec(compile(open(args.seq).read(), args.seq, 'exec'), {}, config)
 
     seq = SeqUser(start=args.start,stop=args.stop,acmode=(args.mode=='AC'))
-    seq.execute(config['title'],config['instrset'],config['descset'])
+    seq.execute(config['title'],config['instrset'],config['descset'],args.reference)
 
 if __name__ == 'main':
     main()
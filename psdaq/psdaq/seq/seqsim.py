@@ -0,0 +1,245 @@
+import math
+import numpy
+from psdaq.seq.seq import *
+
+#
+#  Simulation of sequence programs (instrset lists of seq.py instructions).
+#
+#  run_reference(instrset, start, stop, acmode) executes the program one
+#  instruction at a time with each instruction's execute(engine), as the
+#  sequence engine does.
+#
+#  compile_events(instrset, start, stop, acmode) gives the same event table
+#  with loops unrolled: when a backward branch finds the program in the same
+#  state as on an earlier pass (same counters, request and frame phase of the
+#  sync instructions the loop can reach) the events of the passes in between
+#  are repeated with numpy for the remaining counts of the loop, or up to
+#  stop for unconditional branches.  ACRateSync checkpoints are computed in
+#  closed form instead of stepping through the 360Hz timeslots.
+#
+#  The event table lists each timeslot (frame) in [start, stop) that ends
+#  with a nonzero request.
+#
+
+verbose = False
+
+class Engine(object):
+
+    def __init__(self, acmode=False):
+        self.request = 0
+        self.instr   = 0
+        self.frame   = -1  # 1MHz timeslot
+        self.acframe = -1  # 360Hz timeslot
+        self.acmode  = acmode
+        self.modes   = 0
+        self.ccnt    = [0]*4
+        self.done    = False
+
+    def frame_number(self):
+        return int(self.acframe) if self.acmode else int(self.frame)
+
+class EventTable(object):
+
+    def __init__(self, frames, requests, modes, done, stalled=False):
+        self.frames   = frames      # timeslot of each event
+        self.requests = requests    # request word at the end of the timeslot
+        self.modes    = modes       # 1: fixed rate syncs, 2: AC rate syncs
+        self.done     = done        # the program ended (branch to self)
+        self.stalled  = stalled     # the program loops without advancing
+
+    def __len__(self):
+        return len(self.frames)
+
+    #  (timeslot, bit) of each request bit set, as plotted by seqplot
+    def bits(self, nbits=16):
+        bits = (self.requests[:,None] >> numpy.arange(nbits)) & 1
+        frame, bit = numpy.nonzero(bits)
+        return self.frames[frame], bit
+
+def run_reference(instrset, start=0, stop=200, acmode=False):
+    frames   = []
+    requests = []
+    engine   = Engine(acmode)
+    while engine.frame_number() < stop and not engine.done:
+
+        frame   = engine.frame_number()
+        request = int(engine.request)
+
+        instrset[engine.instr].execute(engine)
+        if engine.frame_number() != frame:
+            if verbose:
+                print('frame: {}  instr {}  request {:x}'.format
+                      (frame,engine.instr,request))
+            if frame < start:
+                continue
+            if request != 0:
+                frames  .append(frame)
+                requests.append(request)
+
+    return EventTable(numpy.array(frames, dtype=numpy.int64),
+                      numpy.array(requests, dtype=numpy.int64),
+                      engine.modes, engine.done)
+
+#  ACRateSync.execute in closed form: the occ'th next timeslot in the mask
+#  of the first second of each interval
+def _ac_sync(engine, instr):
+    intv  = ACIntvs[instr.args[2]]
+    slots = [ts for ts in range(6) if (instr.args[1]>>ts)&1]
+    occ   = instr.args[3]
+    if occ > 0:
+        if not slots:
+            raise ValueError('ACRateSync with an empty timeslot mask never completes')
+        period = 6*intv
+        # slots up to and including the current frame
+        a     = engine.acframe
+        count = (a//period)*len(slots) + len([ts for ts in slots if ts <= a%period])
+        n     = count + occ - 1
+        engine.acframe = period*(n//len(slots)) + slots[n%len(slots)]
+    engine.instr  += 1
+    engine.request = 0
+    engine.modes  |= 2
+
+#  Instructions reached from line before coming back to branch
+def _reach(instrset, line, branch):
+    seen = set()
+    todo = [line]
+    while todo:
+        i = todo.pop()
+        if i in seen or i == branch or i >= len(instrset):
+            continue
+        seen.add(i)
+        instr = instrset[i]
+        if isinstance(instr, Branch):
+            todo.append(instr.address())
+            if len(instr.args) > 2:
+                todo.append(i+1)
+        else:
+            todo.append(i+1)
+    return [instrset[i] for i in seen]
+
+class _Events(object):
+
+    def __init__(self):
+        self.count   = 0
+        self._chunks = []     # (first index, frames, requests)
+        self._frames = []
+        self._requests = []
+
+    def append(self, frame, request):
+        self._frames  .append(frame)
+        self._requests.append(request)
+        self.count += 1
+
+    def _flush(self):
+        if self._frames:
+            self._chunks.append((self.count-len(self._frames),
+                                 numpy.array(self._frames, dtype=numpy.int64),
+                                 numpy.array(self._requests, dtype=numpy.int64)))
+            self._frames   = []
+            self._requests = []
+
+    def extend(self, frames, requests):
+        self._flush()
+        if len(frames):
+            self._chunks.append((self.count, frames, requests))
+            self.count += len(frames)
+
+    #  Events from index on
+    def tail(self, index):
+        self._flush()
+        frames   = []
+        requests = []
+        for first, f, r in reversed(self._chunks):
+            if first+len(f) <= index:
+                break
+            frames  .append(f[max(index-first,0):])
+            requests.append(r[max(index-first,0):])
+        if not frames:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64)
+        return numpy.concatenate(frames[::-1]), numpy.concatenate(requests[::-1])
+
+def compile_events(instrset, start=0, stop=200, acmode=False):
+    engine  = Engine(acmode)
+    events  = _Events()
+    known   = all(type(instr) in (FixedRateSync, ACRateSync, Branch, BeamRequest, ControlRequest)
+                  for instr in instrset)
+    phases  = {}    # branch -> (fixed rate period, AC rate period) of the loop
+    markers = {}    # branch -> {state: (events, frame, acframe, passes, branches)}
+    passes  = {}    # branch -> backward branches taken since the loop was entered
+    nexec   = [0]*4 # conditional branches executed on each counter
+    stalled = False
+
+    while engine.frame_number() < stop and not engine.done:
+
+        b       = engine.instr
+        instr   = instrset[b]
+        frame   = engine.frame_number()
+        request = int(engine.request)
+
+        if known and isinstance(instr, Branch) and instr.address() != b:
+            if len(instr.args) > 2:
+                counter, value = instr.args[2], instr.args[3]
+                ccnt = engine.ccnt[counter]
+                remaining = value-ccnt if ccnt <= value else None
+            else:
+                counter, remaining = None, None
+            if remaining == 0:
+                # loop ends
+                markers.pop(b, None)
+                passes .pop(b, None)
+            else:
+                if b not in phases:
+                    reach = _reach(instrset, instr.address(), b)
+                    phases[b] = (math.lcm(1, *[FixedIntvs[i.args[1]] for i in reach
+                                               if isinstance(i, FixedRateSync)]),
+                                 6*math.lcm(1, *[ACIntvs[i.args[2]] for i in reach
+                                                 if isinstance(i, ACRateSync)]))
+                fixedp, acp = phases[b]
+                state = (engine.frame % fixedp, engine.acframe % acp, request,
+                         tuple(c for i, c in enumerate(engine.ccnt) if i != counter))
+                npass = passes.get(b, 0)
+                marks = markers.setdefault(b, {})
+                mark  = marks.get(state)
+                if mark is not None and (counter is None or nexec[counter]-mark[4] == npass-mark[3]):
+                    # the passes since mark repeat for the rest of the loop
+                    first, mframe, macframe, mpass, mexec = mark
+                    period = npass-mpass
+                    dframe, dacframe = engine.frame-mframe, engine.acframe-macframe
+                    dnumber = dacframe if acmode else dframe
+                    if dnumber > 0:
+                        repeat = -((frame-stop)//dnumber)   # to reach stop
+                        if remaining is not None:
+                            repeat = min(repeat, remaining//period)
+                    elif remaining is None:
+                        stalled = True
+                        break
+                    else:
+                        repeat = remaining//period
+                    if repeat > 0:
+                        f, r = events.tail(first)
+                        shift = dnumber*numpy.arange(1, repeat+1, dtype=numpy.int64)
+                        events.extend((f[None,:]+shift[:,None]).ravel(), numpy.tile(r, repeat))
+                        engine.frame   += repeat*dframe
+                        engine.acframe += repeat*dacframe
+                        if counter is not None:
+                            engine.ccnt[counter] += repeat*period
+                            nexec[counter]       += repeat*period
+                        markers.pop(b)
+                        passes .pop(b)
+                        continue
+                marks[state] = (events.count, engine.frame, engine.acframe, npass,
+                                nexec[counter] if counter is not None else 0)
+                passes[b] = npass+1
+
+        if isinstance(instr, ACRateSync):
+            _ac_sync(engine, instr)
+        else:
+            instr.execute(engine)
+            if isinstance(instr, Branch) and len(instr.args) > 2:
+                nexec[instr.args[2]] += 1
+        if engine.frame_number() != frame and request != 0:
+            events.append(frame, request)
+
+    f, r = events.tail(0)
+    keep = (f >= start) & (f < stop)
+    return EventTable(f[keep], r[keep], engine.modes, engine.done, stalled)
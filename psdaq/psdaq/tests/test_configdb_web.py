@@ -0,0 +1,129 @@
+import json
+import threading
+import mongomock
+import pytest
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import make_server
+import psdaq.configdb.mongoconfigdb as mcdb
+import psdaq.configdb.configdb as cdb
+from psdaq.configdb.typed_json import cdict
+
+# Stand-in for the configdb web service: the endpoints used by the client
+# over a mongoconfigdb on mongomock, counting the requests it serves.
+def make_app(mdb, batch=True):
+    app = Flask('configdb')
+    app.counts = {}
+    app.batch = batch
+
+    @app.before_request
+    def count():
+        name = request.path.split('/')[3]
+        app.counts[name] = app.counts.get(name, 0) + 1
+
+    @app.route('/ws/configDB/get_key/<hutch>/')
+    def get_key(hutch):
+        try:
+            return jsonify(success=True, value=mdb.get_key(request.args.get('alias'), hutch))
+        except NameError as ex:
+            return jsonify(success=False, msg=str(ex))
+
+    @app.route('/ws/configDB/get_configuration/<hutch>/<alias>/<device>/')
+    def get_configuration(hutch, alias, device):
+        try:
+            return jsonify(success=True, value=mdb.get_configuration(alias, device, hutch))
+        except Exception as ex:
+            return jsonify(success=False, msg=str(ex))
+
+    if batch:
+        @app.route('/ws/configDB/get_configurations/<hutch>/')
+        def get_configurations(hutch):
+            body = request.get_json()
+            pairs = [(p['alias'], p['device']) for p in body['pairs']]
+            def lines():
+                for alias, device, config in mdb.iter_configurations(pairs, body['fields'], hutch):
+                    if config is None:
+                        xx = {'success': False, 'alias': alias, 'device': device, 'msg': 'not found'}
+                    else:
+                        xx = {'success': True, 'alias': alias, 'device': device, 'value': config}
+                    yield json.dumps(xx) + '\n'
+            return Response(lines(), mimetype='application/x-ndjson')
+
+    @app.route('/ws/configDB/get_history/<hutch>/<alias>/<device>/')
+    def get_history(hutch, alias, device):
+        plist = json.loads(request.get_json())
+        value = mdb.get_history(alias, device, plist, hutch)
+        for i, d in enumerate(value):
+            d['_id'] = i        # as leaked by the serialization
+            d['date'] = str(d['date'])
+        return jsonify(success=True, value=value)
+
+    return app
+
+def jungfrau(name, c):
+    j = cdict()
+    j.set("c", c)
+    j.set("user.gain", 3)
+    j.set("user.e", [3, 6.5, 9.4], "DOUBLE")
+    j.setInfo(detType="jungfrau", detName=name)
+    return j
+
+@pytest.fixture(params=[True, False], ids=['batch', 'single'])
+def server(request, monkeypatch):
+    monkeypatch.setattr(mcdb, 'MongoClient', mongomock.MongoClient)
+    mdb = mcdb.configdb('localhost', 'tst', create=True, root='configDB')
+    mdb.add_alias("BEAM")
+    mdb.add_device_config("jungfrau")
+    for i in range(4):
+        mdb.modify_device("BEAM", jungfrau("jungfrau_%d" % i, 10 * i))
+    app = make_app(mdb, batch=request.param)
+    srv = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.start()
+    cdb.clear_cache()
+    try:
+        yield mdb, app, cdb.configdb('http://127.0.0.1:%d/ws' % srv.server_port, 'tst', root='configDB')
+    finally:
+        srv.shutdown()
+        thread.join()
+        mdb.client.drop_database('configDB')
+
+def test_get_configurations(server):
+    mdb, app, c = server
+    pairs = [("BEAM", "jungfrau_%d" % i) for i in range(4)] + [("BEAM", "nosuch")]
+    cfgs = c.get_configurations(pairs)
+    assert [cfgs[p]['c'] for p in pairs[:4]] == [0, 10, 20, 30]
+    assert cfgs[("BEAM", "nosuch")] == {}
+    assert app.counts['get_key'] == 1
+    if app.batch:
+        assert app.counts['get_configurations'] == 1
+        assert 'get_configuration' not in app.counts
+    else:
+        assert app.counts['get_configuration'] == 5
+
+    # cached by key: only the key is asked again
+    app.counts.clear()
+    cfgs[pairs[0]]['c'] = -1
+    assert c.get_configuration("BEAM", "jungfrau_0")['c'] == 0
+    assert c.get_configurations(pairs[:4])[pairs[1]]['c'] == 10
+    assert app.counts == {'get_key': 2}
+
+    # a modified alias has a new key
+    mdb.modify_device("BEAM", jungfrau("jungfrau_1", 11))
+    assert c.get_configurations(pairs[:4])[pairs[1]]['c'] == 11
+    assert app.counts['get_key'] == 3
+    assert app.counts.get('get_configuration', 0) == (0 if app.batch else 4)
+
+def test_fields(server):
+    mdb, app, c = server
+    cfgs = c.get_configurations([("BEAM", "jungfrau_2")], fields=['user.gain', 'nosuch'])
+    cfg = cfgs[("BEAM", "jungfrau_2")]
+    assert cfg['user'] == {'gain': 3} and 'c' not in cfg
+    assert cfg[':types:']['user'] == {'gain': 'INT32'}
+    assert cfg['detName:RO'] == 'jungfrau_2'
+
+def test_get_history(server):
+    mdb, app, c = server
+    mdb.modify_device("BEAM", jungfrau("jungfrau_0", 5))
+    h = c.get_history("BEAM", "jungfrau_0", ["c", "user.gain"])['value']
+    assert h[0]['c'] == 0 and h[-1]['c'] == 5
+    assert all(set(d) == {'date', 'key', 'c', 'user.gain'} for d in h)
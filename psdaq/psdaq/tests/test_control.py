@@ -0,0 +1,151 @@
+import json
+import time
+import threading
+import zmq
+import pytest
+
+from psdaq.control.control import CollectionManager, ResponseCollector, create_msg, \
+                                  encode_msg, decode_msg, encodings
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    yield context
+    context.destroy(linger=0)
+
+def rollcall_reply(msg, id, level, alias):
+    reply = create_msg('rollcall', msg['header']['msg_id'], id,
+                       body={level: {'proc_info': {'alias': alias, 'host': 'localhost', 'pid': id}}})
+    reply['header']['encodings'] = ['json']
+    return reply
+
+def test_response_collector(context):
+    pull = context.socket(zmq.PULL)
+    pull.bind('inproc://collector')
+    push = context.socket(zmq.PUSH)
+    push.connect('inproc://collector')
+
+    msg = create_msg('configure')
+    push.send_json(create_msg('ok', msg['header']['msg_id'], 1))
+    push.send_json(create_msg('ok', 'stale', 2))            # reply to an earlier message
+    push.send_json(create_msg('fileReport', sender_id=2, body={'path': '/tmp/x.xtc2'}))
+    push.send_json(create_msg('ok', msg['header']['msg_id'], 2))
+    push.send_json(create_msg('ok', msg['header']['msg_id'], 9)) # not asked
+    begin = time.monotonic()
+    collector = ResponseCollector(pull, msg['header']['msg_id'], {1, 2, 3}, {1: 5000, 2: 5000, 3: 200})
+    missing, msgs, reports = collector.collect()
+    # id 3 is given up after its own deadline, not the longest one
+    assert time.monotonic() - begin < 2.0
+    assert missing == {3}
+    assert [reply['header']['sender_id'] for reply in msgs] == [1, 2]
+    assert [report['header']['key'] for report in reports] == ['fileReport']
+    assert set(collector.latency) == {1, 2}
+    push.close(linger=0)
+    pull.close(linger=0)
+
+class RollcallClients(object):
+    """ Clients answering the rollcall: each (delay, id, level, alias)
+    replies delay seconds after the first rollcall is sent. """
+    def __init__(self, context, addr, clients):
+        self.context = context
+        self.addr = addr
+        self.clients = clients
+        self.nsent = 0
+
+    def send_back(self, topic, msg):
+        self.nsent += 1
+        if self.nsent > 1: return
+        for delay, id, level, alias in self.clients:
+            threading.Timer(delay, self.reply, args=(rollcall_reply(msg, id, level, alias),)).start()
+
+    def reply(self, msg):
+        push = self.context.socket(zmq.PUSH)
+        push.connect(self.addr)
+        push.send_json(msg)
+        push.close(linger=1000)
+
+def collection_manager(context, clients, activedet=None, tmp_path=None):
+    cm = CollectionManager.__new__(CollectionManager)
+    cm.back_pull = context.socket(zmq.PULL)
+    cm.back_pull.bind('inproc://back_pull')
+    cm.rollcall_clients = RollcallClients(context, 'inproc://back_pull', clients)
+    cm.send_back = cm.rollcall_clients.send_back
+    cm.progressReport = lambda begin_time, end_time, progress_txt: None
+    cm.errors = []
+    cm.report_error = cm.errors.append
+    cm.level_keys = {'drp', 'teb', 'meb', 'control'}
+    cm.cmstate = {}
+    cm.ids = set()
+    cm.platform = 0
+    cm.rollcall_timeout = 30
+    cm.xpm_master = cm.pv_base = cm.cfg_dbase = cm.instrument = cm.alias = None
+    cm.bypass_activedet = activedet is None
+    cm.activedetfilename = None
+    if activedet is not None:
+        cm.activedetfilename = str(tmp_path / 'activedet.json')
+        with open(cm.activedetfilename, 'w') as f:
+            json.dump({'activedet': activedet}, f)
+    return cm
+
+def test_rollcall(context, tmp_path):
+    activedet = {'drp': {'cam_0': {'active': 1, 'det_info': {'readout': 0}}}}
+    # cam_1 (not in the active detectors file) answers after the required cam_0
+    cm = collection_manager(context, [(0.0, 10, 'drp', 'cam_0'), (0.3, 11, 'drp', 'cam_1')],
+                            activedet, tmp_path)
+    begin = time.monotonic()
+    assert cm.condition_rollcall()
+    elapsed = time.monotonic() - begin
+    # all required clients answered: answers are still collected for 1 s
+    assert 1.0 <= elapsed < 2.0
+    assert cm.ids == {10, 11}
+    assert cm.cmstate['drp'][10]['active'] == 1
+    assert cm.cmstate['drp'][11]['active'] == 0
+    assert cm.rollcall_clients.nsent == 1
+    assert cm.errors == []
+    cm.back_pull.close(linger=0)
+
+def test_rollcall_resend(context, tmp_path):
+    activedet = {'drp': {'cam_0': {'active': 1, 'det_info': {'readout': 0}},
+                         'cam_1': {'active': 1, 'det_info': {'readout': 0}}}}
+    # the required cam_1 answers late: the rollcall is sent again meanwhile
+    cm = collection_manager(context, [(0.0, 10, 'drp', 'cam_0'), (1.5, 11, 'drp', 'cam_1')],
+                            activedet, tmp_path)
+    begin = time.monotonic()
+    assert cm.condition_rollcall()
+    assert 1.5 <= time.monotonic() - begin < 3.0
+    assert cm.ids == {10, 11}
+    assert cm.rollcall_clients.nsent == 2
+    cm.back_pull.close(linger=0)
+
+def test_rollcall_bypass(context):
+    cm = collection_manager(context, [(0.0, 10, 'drp', 'cam_0'), (0.5, 11, 'teb', 'teb0')])
+    assert cm.condition_rollcall()
+    assert cm.ids == {10, 11}
+    assert cm.cmstate['teb'][11]['active'] == 1
+    assert cm.cmstate['drp'][10]['det_info'] == {'readout': 0}
+    cm.back_pull.close(linger=0)
+
+@pytest.mark.skipif('msgpack' not in encodings(), reason="msgpack not installed")
+def test_encode_msg(context):
+    # connect body built from the platform of a rollcall, keyed by integer sender ids
+    cm = collection_manager(context, [(0.0, 10, 'drp', 'cam_0'), (0.0, 11, 'drp', 'cam_1'),
+                                      (0.0, -12, 'teb', 'teb0')])
+    assert cm.condition_rollcall()
+    cm.back_pull.close(linger=0)
+    for level, item in cm.cmstate_levels().items():
+        for id in item:
+            item[id]['connect_info'] = {'nic_ip': '172.21.164.%d' % abs(id), 'max_ev_size': 1 << 20}
+    cm.cmstate['drp'][11]['active'] = 0
+    msg = create_msg('connect', body=cm.filter_active_dict(cm.cmstate_levels()))
+
+    from_json = decode_msg(encode_msg(msg, 'json'))
+    from_msgpack = decode_msg(encode_msg(msg, 'msgpack'))
+    assert from_msgpack == from_json
+    assert set(from_msgpack['body']['drp']) == {'10'}
+    assert set(from_msgpack['body']['teb']) == {'-12'}
+    assert from_msgpack['body']['control']['0']['proc_info']['alias'] is None
+    # the message itself is not changed
+    assert set(msg['body']['drp']) == {10}
+
+    msg = create_msg('test', body={1.5: [(1, 2)], True: None, None: {2: 'x'}})
+    assert decode_msg(encode_msg(msg, 'msgpack')) == decode_msg(encode_msg(msg, 'json'))
@@ -0,0 +1,59 @@
+from p4p.nt import NTScalar
+from p4p.server import Server, StaticProvider
+from p4p.server.thread import SharedPV
+from p4p.client.thread import Context
+from psdaq.cas.epics_exporter import CustomCollector
+import time
+
+class handler(object):
+    def put(self, pv, op):
+        pv.post(op.value())
+        op.done()
+
+def samples(collector):
+    d = {}
+    for metric in collector.collect():
+        for s in metric.samples:
+            d[(s.name, s.labels.get('partition'))] = s.value
+    return d
+
+def _run(monitor):
+    provider = StaticProvider('test_epics_exporter')
+    pvs = []
+    for i in range(8):
+        pv = SharedPV(initial=NTScalar('f').wrap(0.1*i), handler=handler())
+        provider.add('TST:XPM:PART:%d:DeadFrac'%i, pv)
+        pvs.append(pv)
+
+    with Server(providers=[provider], isolate=True) as server:
+        with Context('pva', conf=server.conf(), useenv=False) as ctx:
+            c = CustomCollector(period=0.1, maxAge=0.5, monitor=monitor, ctx=ctx)
+            c.registerPV('DeadFrac', 'TST:XPM:PART:%d:DeadFrac', 'tst')
+            c.start()
+            try:
+                time.sleep(0.5)
+                d = samples(c)
+                for i in range(8):
+                    assert abs(d[('DeadFrac',str(i))]-0.1*i) < 1e-6
+                assert d[('epics_exporter_stale_pvs',None)] == 0
+
+                # changes are served without a get per scrape
+                pvs[3].post(0.75)
+                time.sleep(0.3)
+                assert abs(samples(c)[('DeadFrac','3')]-0.75) < 1e-6
+
+                if not monitor:
+                    # values older than maxAge are dropped
+                    c.stop()
+                    time.sleep(0.6)
+                    d = samples(c)
+                    assert ('DeadFrac','0') not in d
+                    assert d[('epics_exporter_stale_pvs',None)] == 8
+            finally:
+                c.stop()
+
+def test_epics_exporter_poll():
+    _run(monitor=False)
+
+def test_epics_exporter_monitor():
+    _run(monitor=True)
@@ -0,0 +1,20 @@
+from psdaq.eb.monBuffer import RingBuffer
+import numpy as np
+
+def test_ring_bins():
+    columns = ['EventCount', 'FreeEventCnt']
+    ring = RingBuffer(columns, capacity=10)
+    ring.extend(np.arange(7.), {'EventCount': np.arange(7.)})
+    ring.extend(np.arange(7., 15.), {'EventCount': np.arange(7., 15.), 'FreeEventCnt': np.ones(8)})
+    assert len(ring) == 10
+    assert list(ring.samples()[:, 0]) == list(np.arange(5., 15.))
+    assert list(ring.samples(12.)[:, 0]) == [12., 13., 14.]
+    assert ring.last() == 14.
+
+    # bins [3,6) [6,9) [9,12) [12,15) [15,18), the first holds 5 only
+    binned = ring.bins(3., 1, 5)
+    assert list(binned['time']) == [4.5, 7.5, 10.5, 13.5]
+    assert list(binned['EventCount']) == [5., 7., 10., 13.]
+    assert list(binned['EventCount_min']) == [5., 6., 9., 12.]
+    assert list(binned['EventCount_max']) == [5., 8., 11., 14.]
+    assert np.isnan(binned['FreeEventCnt'][1]) and binned['FreeEventCnt'][2] == 1.
@@ -0,0 +1,72 @@
+from psdaq.procmgr.ProcMgr import ProcMgr
+import socket, threading, time
+
+class fake_procserv(object):
+    """procServ look-alike: sends its banner after a delay, answers ^X and ^Q."""
+    def __init__(self, uniqueid, delay):
+        self.uniqueid = uniqueid
+        self.delay = delay
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('localhost', 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        self.killed = False
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        time.sleep(self.delay)
+        banner = '@@@ procServ server PID: 100\r\n' \
+                 '@@@ Child "%s" PID: 200\r\n' \
+                 '@@@ procServ server started at: now\r\n' % self.uniqueid
+        conn.sendall(banner.encode())
+        while True:
+            data = conn.recv(16)
+            if not data or b'\x11' in data:
+                break
+            if b'\x18' in data:
+                self.killed = True
+                time.sleep(self.delay)
+                conn.sendall(b'@@@ Got a kill command\r\n@@@ process was killed\r\n')
+        conn.close()
+
+    def close(self):
+        self.sock.close()
+
+def test_procmgr_concurrent(tmp_path):
+    delay = 0.5
+    servers = [fake_procserv('proc%d' % i, delay) for i in range(8)]
+    config = tmp_path / 'test.cnf'
+    config.write_text('procmgr_config = [\n' + \
+        ''.join("  {id:'%s', port:'%d', cmd:'sleep 100'},\n" % (srv.uniqueid, srv.port) \
+                for srv in servers) + ']\n')
+    try:
+        t0 = time.time()
+        mgr = ProcMgr(str(config), 0, procmgr_macro={'HOST': 'localhost'})
+        # banners are read at the same time, not one after another
+        assert time.time() - t0 < len(servers) * delay / 2
+        assert mgr.getProcessCounts()[0] == len(servers)
+        for value in mgr.d.values():
+            assert value[ProcMgr.DICT_STATUS] == ProcMgr.STATUS_RUNNING
+
+        t0 = time.time()
+        mgr.stop([srv.uniqueid for srv in servers], sigdelay=0)
+        assert time.time() - t0 < len(servers) * delay / 2
+        assert all(srv.killed for srv in servers)
+        for value in mgr.d.values():
+            assert value[ProcMgr.DICT_STATUS] == ProcMgr.STATUS_NOCONNECT
+    finally:
+        for srv in servers:
+            srv.close()
+
+if __name__ == "__main__":
+    import pathlib, tempfile
+    test_procmgr_concurrent(pathlib.Path(tempfile.mkdtemp()))
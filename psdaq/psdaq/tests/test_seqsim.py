@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from psdaq.seq.seq import *
+from psdaq.seq.seqsim import Engine, run_reference, compile_events, _ac_sync
+
+# Random sequence programs: nested counted loops of requests and syncs,
+# ending in a branch to the start or to self.  Every loop advances time,
+# so the reference engine reaches stop.
+def random_program(rng, acmode):
+    instrset = []
+
+    def sync(advance):
+        occ = int(rng.integers(1 if advance else 0, 4))
+        if acmode:
+            return ACRateSync(timeslotm=int(rng.integers(1, 64)), marker=int(rng.integers(0, 3)), occ=occ)
+        return FixedRateSync(marker=int(rng.integers(0, 4)), occ=occ)
+
+    def block(depth):
+        for i in range(int(rng.integers(1, 4))):
+            choice = rng.integers(0, 4)
+            if choice == 0:
+                instrset.append(ControlRequest(int(rng.integers(0, 1<<16))))
+            elif choice == 1:
+                instrset.append(BeamRequest(int(rng.integers(0, 4))))
+            elif choice == 2 or depth == 3:
+                instrset.append(sync(False))
+            else:
+                line = len(instrset)
+                block(depth+1)
+                instrset.append(sync(True))
+                # mostly a counter per depth, sometimes shared with an outer loop
+                counter = depth if rng.random() < 0.8 else int(rng.integers(0, 4))
+                instrset.append(Branch.conditional(line=line, counter=counter,
+                                                   value=int(rng.integers(0, 7))))
+
+    block(0)
+    instrset.append(sync(True))
+    if rng.random() < 0.8:
+        instrset.append(Branch.unconditional(line=int(rng.integers(0, len(instrset)))))
+    else:
+        instrset.append(Branch.unconditional(line=len(instrset)))
+    return instrset
+
+@pytest.mark.parametrize('acmode', [False, True], ids=['CW', 'AC'])
+def test_random_programs(acmode):
+    rng = np.random.default_rng(7)
+    for i in range(300):
+        instrset = random_program(rng, acmode)
+        start = int(rng.integers(0, 200))
+        stop  = start + int(rng.integers(1, 3000))
+        ref = run_reference(instrset, start, stop, acmode)
+        cmp = compile_events(instrset, start, stop, acmode)
+        assert np.array_equal(ref.frames, cmp.frames), [x.print_() for x in instrset]
+        assert np.array_equal(ref.requests, cmp.requests)
+        assert (ref.modes, ref.done) == (cmp.modes, cmp.done)
+
+def test_ac_sync():
+    rng = np.random.default_rng(3)
+    for i in range(500):
+        instr = ACRateSync(timeslotm=int(rng.integers(1, 64)), marker=int(rng.integers(0, 6)),
+                           occ=int(rng.integers(0, 4)))
+        ref = Engine(acmode=True)
+        ref.acframe = int(rng.integers(-1, 2000))
+        cmp = Engine(acmode=True)
+        cmp.acframe = ref.acframe
+        instr.execute(ref)
+        _ac_sync(cmp, instr)
+        assert vars(ref) == vars(cmp)
+
+def test_long_program():
+    # 10k.py: 90 timeslot pattern repeated 10000 times per second
+    instrset = [FixedRateSync(marker=6, occ=1)]
+    for i in range(90):
+        instrset.append(ControlRequest(i+1))
+        instrset.append(FixedRateSync(marker=0, occ=1))
+    instrset.append(Branch.conditional(line=1, counter=0, value=99))
+    instrset.append(Branch.conditional(line=1, counter=1, value=99))
+    instrset.append(Branch.unconditional(line=0))
+    table = compile_events(instrset, 0, 3*910000)
+    assert len(table) == 3*900000
+    assert table.frames[0] == 0 and table.requests[0] == 1
+    assert table.frames[-1] == 2*910000+899999 and table.requests[-1] == 90
+    ref = run_reference(instrset, 0, 20000)
+    assert np.array_equal(ref.frames, table.frames[:len(ref)])
+    assert np.array_equal(ref.requests, table.requests[:len(ref)])
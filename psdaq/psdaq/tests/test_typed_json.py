@@ -0,0 +1,46 @@
+from psdaq.configdb.typed_json import cdict, getType, getValue, updateValue, setValues, validate
+import numpy as np
+
+def make_config():
+    top = cdict()
+    top.setInfo('hsd', 'tsthsd', None, 'serial1234', 'No comment')
+    top.setAlg('config', [2,0,0])
+    top.define_enum('dataModeEnum', {'Data': -1, 'Ramp': 0, 'Spike11': 1})
+    top.set('user.raw.gate_ns', 200, 'UINT32')
+    top.set('user.fex.ymin', 2000, 'UINT16')
+    top.set('expert.dataMode', 0, 'dataModeEnum')
+    top.set('expert.map', np.zeros((2,3), dtype=np.uint8))
+    return top.typed_json()
+
+def test_accessors():
+    d = make_config()
+    for c in (d, {'hsd': d}):
+        prefix = '' if c is d else 'hsd.'
+        assert getType(c, prefix+'user.raw.gate_ns') == 'UINT32'
+        assert getType(c, prefix+'expert.dataMode') == {'Data': -1, 'Ramp': 0, 'Spike11': 1}
+        assert getType(c, prefix+'expert.map') == ['UINT8', 2, 3]
+        assert getType(c, prefix+'user.nope') is None
+        assert updateValue(c, prefix+'user.fex.ymin', '70000') == 2
+        assert updateValue(c, prefix+'expert.dataMode', 'Spike11') == 0
+        assert getValue(c, prefix+'expert.dataMode') == 1
+        assert updateValue(c, prefix+'expert.map', '1 2 3 4 5 6') == 0
+        assert updateValue(c, prefix+'user.nope', '1') == 1
+
+def test_set_values():
+    d = make_config()
+    failed = setValues(d, {'expert.map'      : np.arange(6).reshape(2,3),
+                           'user.raw.gate_ns': 400,
+                           'user.fex.ymin'   : np.int64(-1),
+                           'expert.dataMode' : 'Ramp',
+                           'user.nope'       : 1})
+    assert failed == {'user.fex.ymin': 2, 'user.nope': 1}
+    assert getValue(d, 'expert.map') == [0, 1, 2, 3, 4, 5]
+    assert getValue(d, 'user.raw.gate_ns') == 400
+    assert getValue(d, 'user.fex.ymin') == 2000
+    assert getValue(d, 'expert.dataMode') == 0
+
+    assert validate(d) == {}
+    errors = validate(d, {'expert.map': np.full(6, 256), 'expert.dataMode': [5], 'user.raw.gate_ns': 1})
+    assert set(errors) == {'expert.map', 'expert.dataMode'}
+    d['user']['fex']['ymin'] = 1 << 20
+    assert list(validate(d)) == ['user.fex.ymin']
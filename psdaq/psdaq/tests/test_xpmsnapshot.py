@@ -0,0 +1,41 @@
+from psdaq.pyxpm.snapshot import XpmSnapshot, ChangePoster, FID_PERIOD
+from psdaq.pyxpm.simxpm import SimXpm
+from threading import Lock
+
+class fake_pv(object):
+    def __init__(self):
+        self.value = {'value': None}
+        self.posts = 0
+    def current(self):
+        return dict(self.value)
+    def post(self, value):
+        self.value = value
+        self.posts += 1
+
+def test_snapshot_rates():
+    xpm = SimXpm(seed=1)
+    app = xpm.XpmApp
+    prev = XpmSnapshot(app).read(Lock())
+    xpm.advance(1.0)
+    snap = prev.copy().read(Lock(), [0])
+
+    links = snap.linkValues(prev)
+    assert links['rxRcv'][0] == 92900 and links['rxRcv'][31] == 0
+    assert links['txReady'][0] == 1 and links['txReady'][31] == 0
+
+    groups = snap.groupValues(prev)
+    app.partition.set(0)
+    l0Stats = app.l0Stats.get()
+    dt = app.l0EnaCnt(l0Stats)*FID_PERIOD
+    assert groups['l0InpRate'][0] == app.numL0(l0Stats)/dt
+    assert groups['deadFrac'][0] == app.numL0Inh(l0Stats)/app.numL0(l0Stats)
+    # l0Stats of group 1 not read, so no change
+    assert groups['l0InpRate'][1] == 0 and not groups['l0Valid'][1]
+
+def test_change_poster():
+    pv = fake_pv()
+    poster = ChangePoster(refresh=3)
+    for v in (1, 1, 1, 1, 2, [0.,1.], [0.,1.]):
+        poster.post(pv, v, (0,0))
+    # 1 reposted after 3 unchanged updates
+    assert pv.posts == 4 and poster.skipped == 3